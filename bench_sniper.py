@@ -0,0 +1,793 @@
+#!/usr/bin/env python3
+"""
+Sniper Bot 热路径微基准
+离线运行，不访问网络，不需要 .env:
+
+    python bench_sniper.py                    # 运行并与基准线对比，变慢超过容差时退出码为 1
+    python bench_sniper.py --save-baseline    # 运行并保存为新的基准线
+
+第一部分对比新旧实现，签名本身 (SDK sign_order) 在新旧路径中相同，不计入对比
+第二部分是每次轮询/每笔交易都会执行的函数，结果与基准线 (bench_baseline.json) 对比
+基准线与机器和 Python 版本相关，换机器后先用 --save-baseline 重新生成
+第三部分用 tracemalloc 测量一次空闲轮询的内存分配，超出预算时退出码同样为 1
+
+    python bench_sniper.py --rate-backend redis://127.0.0.1:6379/0   # 只测共享限速后端
+
+多个进程同时争用同一账号的额度，检查占用总数恰好等于限制，并输出吞吐和往返延迟
+
+    python bench_sniper.py --check-redis      # 不需要 Redis 服务器: 用本地替身检查 RESP 客户端和 Lua 脚本
+
+替身在本进程内监听随机端口，检查认证/选库失败后重连、NOSCRIPT 回退，与 SQLite 后端对比 Lua 脚本的窗口判断，
+再做一次多进程争用检查；
+执行 Lua 需要 fakeredis 和 lupa (pip install "fakeredis[lua]")，未安装时只做协议部分的检查
+"""
+
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import sniper_bot as sb
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def bench(fn: Callable[[], object], number: int = 2000, repeat: int = 5) -> float:
+    """返回单次调用耗时 (微秒)，取 repeat 轮中最快的一轮"""
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+# 交易所下单响应样本 (用于解码对比)
+SAMPLE_ORDER_RESPONSE = json.dumps({
+    "id": "1681462770114201704120370000",
+    "account": "0x4638e3041366aa71720be63e32e53e1223316c7f0d56f7aa617542ed1e7512",
+    "market": "BTC-USD-PERP",
+    "side": "BUY",
+    "type": "LIMIT",
+    "size": "0.00090",
+    "remaining_size": "0.00090",
+    "price": "89500.5",
+    "status": "NEW",
+    "created_at": 1681462770114,
+    "last_updated_at": 1681462770114,
+    "timestamp": 1681462770114,
+    "client_id": "sniper_23456789_1681462770114_252aa50e2ac7",
+    "instruction": "GTC",
+    "flags": ["INTERACTIVE"],
+    "seq_no": 1681462770114,
+    "avg_fill_price": "",
+    "cancel_reason": "",
+}).encode()
+
+
+def order_payload_cases() -> List[Tuple[str, Callable[[], object], Callable[[], object]]]:
+    """下单载荷: Order + dump_to_dict + json.dumps  vs  Order + 模板 + json_dumps"""
+    try:
+        from paradex_py.common.order import Order, OrderSide, OrderType
+    except ImportError:
+        print("跳过下单载荷基准: 未安装 paradex-py")
+        return []
+
+    market, size, price, signature = "BTC-USD-PERP", "0.0009", "89500.5", '["0x1","0x2"]'
+    template = sb.OrderTemplate(market, "LIMIT", "BUY", "GTC", False)
+
+    def build_order() -> "Order":
+        return Order(
+            market=market,
+            order_type=OrderType.Limit,
+            order_side=OrderSide.Buy,
+            size=Decimal(size),
+            limit_price=Decimal(price),
+            client_id="sniper_23456789_1681462770114_252aa50e2ac7",
+            instruction="GTC",
+            signature_timestamp=1681462770114,
+        )
+
+    def legacy() -> bytes:
+        order = build_order()
+        order.signature = signature
+        return json.dumps(order.dump_to_dict()).encode()
+
+    def current() -> bytes:
+        order = build_order()
+        payload = template.build(size, price, order.client_id, signature, order.signature_timestamp)
+        return sb.json_dumps(payload)
+
+    return [("下单载荷编码", legacy, current)]
+
+
+def response_decode_cases() -> List[Tuple[str, Callable[[], object], Callable[[], object]]]:
+    """响应解码: 标准库 json.loads  vs  json_loads"""
+    return [(
+        "下单响应解码",
+        lambda: json.loads(SAMPLE_ORDER_RESPONSE),
+        lambda: sb.json_loads(SAMPLE_ORDER_RESPONSE),
+    )]
+
+
+# =============================================================================
+# 热路径基准
+# =============================================================================
+
+class _DiscardWrites:
+    """替代后台写线程: 保存状态只计事件循环上生成快照的开销，落盘本来就在后台线程"""
+
+    def submit_write(self, filepath: str, data: Any, error_msg: str = ""):
+        pass
+
+    def submit_call(self, func, *args, error_msg: str = ""):
+        pass
+
+
+def full_day_trades(now_ms: int, count: int = 999) -> List[int]:
+    """接近日限制的交易记录，均匀分布在过去 23 小时内 (小时/分钟/秒窗口都未满)"""
+    start = now_ms - 23 * 3600000
+    step = (23 * 3600000 - 60000) // count
+    return [start + i * step for i in range(count)]
+
+
+def make_accounts(count: int) -> List[sb.AccountInfo]:
+    return [sb.AccountInfo(l2_private_key="0x1", l2_address=f"0x{i + 1:x}", name=f"bench#{i + 1}") for i in range(count)]
+
+
+def make_bot(workdir: str, account_manager: Optional[sb.AccountManager] = None) -> sb.SniperBot:
+    return sb.SniperBot(
+        None, sb.TradingConfig(), account_manager,
+        state_file=os.path.join(workdir, "sniper_state.json"),
+        ledger_file=os.path.join(workdir, "ledger.json"),
+        exposure_file=os.path.join(workdir, "exposure.json"),
+        history_file="",
+    )
+
+
+def rate_limit_cases(workdir: str) -> List[Tuple[str, Callable[[], object], int]]:
+    """限速检查: 每次轮询都执行"""
+    now_ms = int(time.time() * 1000)
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    single = make_bot(workdir)
+    single.rate_state = sb.RateLimitState(today, full_day_trades(now_ms))
+
+    manager = sb.AccountManager(make_accounts(10), state_file=os.path.join(workdir, "account_states.json"))
+    manager.rate_states[manager.current_index] = sb.RateLimitState(today, full_day_trades(now_ms))
+    multi = make_bot(workdir, manager)
+
+    return [
+        ("_can_trade 单账号 999 笔", single._can_trade, 20000),
+        ("_can_trade 多账号 999 笔", multi._can_trade, 20000),
+    ]
+
+
+def account_switch_cases(workdir: str) -> List[Tuple[str, Callable[[], object], int]]:
+    """账号切换: 每个账号 100 笔较早的交易，均可立即切换"""
+    now_ms = int(time.time() * 1000)
+    today = datetime.now().strftime("%Y-%m-%d")
+    cases = []
+    for count in (10, 100, 1000):
+        manager = sb.AccountManager(make_accounts(count), state_file=os.path.join(workdir, "account_states.json"))
+        for i in range(count):
+            manager.rate_states[i] = sb.RateLimitState(today, [now_ms - 7200000 - (i * 100 + k) * 1000 for k in range(100)][::-1])
+        manager._rebuild_schedule()
+        cases.append((f"切换账号 x{count}", manager.switch_to_next_available_account, 5000))
+    return cases
+
+
+def entry_rule_cases() -> List[Tuple[str, Callable[[], object], int]]:
+    """开仓条件: run_cycle 中的点差 + 厚度判断"""
+    spec = sb.MarketSpec("BTC-USD-PERP", "0.1", "0.00001", "10")
+    rule = sb.EntryRule(spec, 0.004, 600)
+    bbo = sb.BBO(spec, 895005, 895006, 50000, 50000)
+
+    def evaluate() -> bool:
+        return rule.spread.allows(bbo) and rule.depth_ok(bbo)
+
+    return [("开仓条件 点差+厚度", evaluate, 50000)]
+
+
+def make_signing_client() -> Optional[sb.ParadexInteractiveClient]:
+    """签名用的客户端；SDK 未安装或离线无法初始化时返回 None"""
+    if sb.ParadexSubkey is None:
+        print("跳过签名基准: 未安装 paradex-py")
+        return None
+    try:
+        return sb.ParadexInteractiveClient(
+            l2_private_key="0x" + "1" * 63,
+            l2_address="0x" + "2" * 63,
+            environment="testnet",
+        )
+    except Exception as e:
+        print(f"跳过签名基准: 无法初始化 SDK ({e.__class__.__name__})")
+        return None
+
+
+def order_sign_cases() -> List[Tuple[str, Callable[[], object], int]]:
+    """下单: 构建 Order + sign_order + 载荷编码"""
+    client = make_signing_client()
+    if client is None:
+        return []
+    from paradex_py.common.order import Order, OrderSide, OrderType
+
+    account = client.paradex.account
+
+    def sdk_path() -> bytes:
+        order = Order(
+            market="BTC-USD-PERP",
+            order_type=OrderType.Limit,
+            order_side=OrderSide.Buy,
+            size=Decimal("0.0009"),
+            limit_price=Decimal("89500.5"),
+            client_id="sniper_23456789_1681462770114_252aa50e2ac7",
+            instruction="GTC",
+            signature_timestamp=1681462770114,
+        )
+        order.signature = account.sign_order(order)
+        return json.dumps(order.dump_to_dict()).encode()
+
+    def current_path() -> bytes:
+        payload = client._build_signed_payload(
+            "BTC-USD-PERP", "LIMIT", "BUY", "0.0009", "89500.5", "GTC", False, "sniper"
+        )
+        return sb.json_dumps(payload)
+
+    return [
+        ("下单 构建+签名+dump_to_dict", sdk_path, 200),
+        ("下单 构建+签名+模板", current_path, 200),
+    ]
+
+
+def jwt_cases() -> List[Tuple[str, Callable[[], object], int]]:
+    """JWT 解析: 每次认证后执行"""
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    header = {"alg": "ES256", "typ": "JWT"}
+    payload = {"exp": 1893456000, "iat": 1893452400, "sub": "0x" + "a" * 63, "token_usage": "interactive", "type": "auth"}
+    token = ".".join([b64(json.dumps(header).encode()), b64(json.dumps(payload).encode()), b64(b"sig" * 20)])
+    return [("JWT 解析", lambda: sb.decode_jwt_payload(token), 20000)]
+
+
+def save_state_cases(workdir: str) -> List[Tuple[str, Callable[[], object], int]]:
+    """保存状态: 每笔交易后执行 (只计事件循环上的快照开销)"""
+    now_ms = int(time.time() * 1000)
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    bot = make_bot(workdir)
+    bot.rate_state = sb.RateLimitState(today, full_day_trades(now_ms))
+
+    manager = sb.AccountManager(make_accounts(1000), state_file=os.path.join(workdir, "account_states.json"))
+    for i in range(1000):
+        manager.rate_states[i] = sb.RateLimitState(today, full_day_trades(now_ms, 100))
+
+    return [
+        ("保存状态 单账号", bot._save_state, 2000),
+        ("保存账号状态 x1000", manager.save_state, 50),
+    ]
+
+
+def hot_path_cases(workdir: str) -> List[Tuple[str, Callable[[], object], int]]:
+    return (
+        rate_limit_cases(workdir)
+        + account_switch_cases(workdir)
+        + entry_rule_cases()
+        + order_sign_cases()
+        + jwt_cases()
+        + save_state_cases(workdir)
+    )
+
+
+# =============================================================================
+# 空闲轮询内存分配
+# =============================================================================
+
+# 一次空闲轮询 (限速检查 + 取行情 + 点差不满足) 的内存预算
+IDLE_POLL_PEAK_BUDGET = 6144     # 单次轮询期间的峰值分配 (字节)
+IDLE_POLL_RETAINED_BUDGET = 16   # 平均每次轮询残留的内存 (字节)，持续增长说明有泄漏
+IDLE_POLL_GC_BUDGET = 0.5        # 平均每次轮询残留的 GC 跟踪对象 (引用环，只能靠 GC 回收)
+
+
+class _IdleClient:
+    """空闲轮询用的客户端: 每次 REST 返回新的 BBO (缓存不生效)，点差始终不满足开仓条件"""
+
+    l2_address = "0xidle"
+    get_bbo = sb.ParadexInteractiveClient.get_bbo
+
+    def __init__(self, spec: sb.MarketSpec):
+        self.spec = spec
+        self.market_data = sb.MarketDataManager(None, cache_ttl_ms=0)
+
+    async def ensure_authenticated(self) -> bool:
+        return True
+
+    async def get_market_spec(self, market: str) -> sb.MarketSpec:
+        return self.spec
+
+    async def fetch_bbo_rest(self, market: str, spec: sb.MarketSpec) -> sb.BBO:
+        return sb.BBO(spec, 895000, 895080, 50000, 50000, time.time() * 1000)
+
+
+async def measure_idle_poll(workdir: str, polls: int = 500, warmup: int = 1200) -> Dict[str, float]:
+    """
+    空闲轮询的内存分配: 追踪开启 (不采样)，先预热到指标样本窗口填满，
+    再逐次测量峰值分配，最后统计残留内存和 GC 跟踪对象
+    """
+    spec = sb.MarketSpec("BTC-USD-PERP", "0.1", "0.0001", "10")
+    bot = sb.SniperBot(
+        _IdleClient(spec), sb.TradingConfig(),
+        state_file=os.path.join(workdir, "sniper_state.json"),
+        ledger_file=os.path.join(workdir, "ledger.json"),
+        exposure_file=os.path.join(workdir, "exposure.json"),
+        history_file=os.path.join(workdir, "history.db"),
+    )
+    sb.tracer.configure(os.path.join(workdir, "traces.jsonl"), sample_rate=0)
+    try:
+        for _ in range(warmup):
+            await bot.run_cycle()
+
+        gc.collect()
+        gc.disable()
+        tracemalloc.start()
+        try:
+            gc_start = gc.get_count()[0]
+            start = tracemalloc.get_traced_memory()[0]
+            peak_total = 0
+            for _ in range(polls):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await bot.run_cycle()
+                peak_total += tracemalloc.get_traced_memory()[1] - before
+            retained = tracemalloc.get_traced_memory()[0] - start
+            gc_objects = gc.get_count()[0] - gc_start
+        finally:
+            tracemalloc.stop()
+            gc.enable()
+    finally:
+        sb.tracer.configure("")
+
+    return {
+        "peak_bytes": peak_total / polls,
+        "retained_bytes": retained / polls,
+        "gc_objects": gc_objects / polls,
+    }
+
+
+def check_idle_poll(workdir: str) -> List[str]:
+    """测量空闲轮询的内存分配，返回超出预算的项"""
+    result = asyncio.run(measure_idle_poll(workdir))
+    budgets = [
+        ("峰值分配 (字节/次)", result["peak_bytes"], IDLE_POLL_PEAK_BUDGET),
+        ("残留内存 (字节/次)", result["retained_bytes"], IDLE_POLL_RETAINED_BUDGET),
+        ("残留 GC 对象 (个/次)", result["gc_objects"], IDLE_POLL_GC_BUDGET),
+    ]
+    over = []
+    print(f"{'空闲轮询':<24} {'预算':>12} {'当前':>12}")
+    for name, value, budget in budgets:
+        flag = ""
+        if value > budget:
+            flag = "  <-- 超出预算"
+            over.append(f"{name}: {value:.2f} > {budget}")
+        print(f"{name:<24} {budget:>12} {value:>12.2f}{flag}")
+    return over
+
+
+# =============================================================================
+# 共享限速后端: 多进程争用同一账号的额度
+# =============================================================================
+
+def _contend_rate_backend(spec: str, key: str, attempts: int, limit: int, now_ms: int) -> Tuple[int, float]:
+    """一个进程连续 reserve attempts 次 (时间不动，窗口不滑动)，返回 (占用成功次数, 平均往返 us)"""
+    async def run() -> Tuple[int, float]:
+        backend = sb.create_rate_backend(spec)
+        admitted = 0
+        started = time.perf_counter()
+        try:
+            for i in range(attempts):
+                ok, _, _, _ = await backend.reserve(key, f"{os.getpid()}-{i}", now_ms, now_ms, (limit,) * 4)
+                admitted += ok
+        finally:
+            await backend.close()
+        return admitted, (time.perf_counter() - started) / attempts * 1e6
+
+    return asyncio.run(run())
+
+
+def check_rate_backend(spec: str, processes: int, attempts: int) -> bool:
+    """多个进程同时争用一半的额度，占用总数必须恰好等于限制"""
+    limit = processes * attempts // 2
+    key = f"bench-{uuid.uuid4().hex[:8]}"
+    now_ms = int(time.time() * 1000)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [
+            pool.submit(_contend_rate_backend, spec, key, attempts, limit, now_ms)
+            for _ in range(processes)
+        ]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    admitted = sum(r[0] for r in results)
+    total = processes * attempts
+    print(f"共享限速后端: {spec}")
+    print(f"  {processes} 个进程 x {attempts} 次, 限制 {limit}")
+    print(f"  占用 {admitted} 次 ({'正确' if admitted == limit else '错误'})")
+    print(f"  吞吐 {total / elapsed:.0f} 次/秒, 平均往返 {sum(r[1] for r in results) / processes:.1f} us")
+    return admitted == limit
+
+
+# =============================================================================
+# Redis 协议替身 (不需要 Redis 服务器检查 RESP 客户端和 Lua 脚本)
+# =============================================================================
+
+class RespStandIn:
+    """
+    极简 Redis 协议替身，在后台线程的事件循环里监听 127.0.0.1 的随机端口
+      - AUTH (requirepass)、SELECT (库 0-15)、PING 由替身自己处理，fail_auth 次 AUTH 先返回错误 (模拟瞬时故障)
+      - 其余命令交给 fakeredis 执行 (安装 lupa 时 EVAL/EVALSHA 运行真实的 Lua 脚本)
+    只用于 --check-redis，不是完整的 Redis 实现
+    """
+
+    def __init__(self, password: str = "", fail_auth: int = 0):
+        try:
+            import fakeredis
+        except ImportError:
+            fakeredis = None
+        self._fakeredis = fakeredis
+        self._server = fakeredis.FakeServer() if fakeredis else None
+        self._store_lock = threading.Lock()
+        self.password = password
+        self.fail_auth = fail_auth
+        self.commands: Dict[str, int] = {}
+        self.port = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="resp-standin", daemon=True)
+
+    @property
+    def has_store(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> str:
+        self._thread.start()
+        self._ready.wait()
+        return f"redis://127.0.0.1:{self.port}"
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        server.close()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        state = {"authed": not self.password, "db": 0}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    size = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+                writer.write(self._encode(self._dispatch(state, args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, state: Dict[str, Any], args: List[bytes]) -> Any:
+        command = args[0].decode().upper()
+        self.commands[command] = self.commands.get(command, 0) + 1
+        if command == "AUTH":
+            if self.fail_auth > 0:
+                self.fail_auth -= 1
+                return sb.RedisError("ERR 替身: 模拟的认证故障")
+            if args[-1].decode() != self.password:
+                return sb.RedisError("WRONGPASS invalid username-password pair")
+            state["authed"] = True
+            return "OK"
+        if not state["authed"]:
+            return sb.RedisError("NOAUTH Authentication required.")
+        if command == "PING":
+            return "PONG"
+        if command == "SELECT":
+            db = int(args[1])
+            if not 0 <= db < 16:
+                return sb.RedisError("ERR DB index is out of range")
+            state["db"] = db
+            return "OK"
+        if self._server is None:
+            return sb.RedisError(f"ERR 替身: 未安装 fakeredis，不支持 {command}")
+        import redis
+        client = self._fakeredis.FakeRedis(server=self._server, db=state["db"])
+        try:
+            with self._store_lock:
+                return client.execute_command(*args)
+        except redis.exceptions.NoScriptError as e:
+            return sb.RedisError(f"NOSCRIPT {e}")
+        except redis.ResponseError as e:
+            return sb.RedisError(f"ERR {e}")
+
+    def keys(self, db: int) -> List[bytes]:
+        if self._server is None:
+            return []
+        with self._store_lock:
+            return self._fakeredis.FakeRedis(server=self._server, db=db).keys()
+
+    @classmethod
+    def _encode(cls, value: Any) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, sb.RedisError):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, (list, tuple)):
+            return b"*%d\r\n" % len(value) + b"".join(cls._encode(v) for v in value)
+        data = value if isinstance(value, bytes) else str(value).encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+async def _rate_decisions(backend: sb.RateBackend, key: str, now_ms: int) -> List[sb.RateDecision]:
+    """一组固定的 reserve / release / record 序列，覆盖四个窗口和 headroom"""
+    limits = (3, 5, 7, 9)
+    day_start_ms = now_ms - 3000000
+    decisions = [
+        await backend.reserve(key, f"m{i}", now_ms + i * 400, day_start_ms, limits)
+        for i in range(10)
+    ]
+    await backend.release(key, "m0")
+    await backend.record(key, "close", now_ms + 4000)
+    decisions.append(await backend.reserve(key, "x", now_ms + 61000, day_start_ms, limits, 1))
+    decisions.append(await backend.reserve(key, "y", now_ms + 3700000, day_start_ms, limits))
+    return [(bool(ok), window, tuple(counts), retry_at) for ok, window, counts, retry_at in decisions]
+
+
+async def check_redis_client(processes: int, attempts: int) -> List[str]:
+    """用替身检查 RESP 客户端和 Lua 脚本，再让多个进程经替身争用同一账号的额度，返回失败项"""
+    failures = []
+    standin = RespStandIn(password="pw", fail_auth=1)
+    url = standin.start()
+    port = url.rsplit(":", 1)[1]
+
+    async def expect_error(backend: sb.RedisRateBackend, what: str, connect_error: bool = True) -> bool:
+        """connect_error: 错误发生在连接阶段 (认证、选库)，出错后连接必须丢弃"""
+        try:
+            await backend.call("PING")
+        except sb.RedisError:
+            if connect_error and backend._writer is not None:
+                failures.append(f"{what}: 出错后连接没有丢弃")
+            return True
+        failures.append(f"{what}: 没有报错")
+        return False
+
+    try:
+        # 认证瞬时失败: 连接丢弃，下次调用重新连接并认证
+        backend = sb.RedisRateBackend(f"redis://:pw@127.0.0.1:{port}/0")
+        await expect_error(backend, "认证失败")
+        try:
+            await backend.call("PING")
+        except sb.RedisError as e:
+            failures.append(f"认证失败后没有重新认证: {e}")
+        await backend.close()
+
+        # 选库失败: 每次调用都报错，不会落到 0 号库
+        backend = sb.RedisRateBackend(f"redis://:pw@127.0.0.1:{port}/99")
+        await expect_error(backend, "选库失败")
+        await expect_error(backend, "选库失败 (第二次)")
+        await backend.close()
+
+        # 密码错误 / 未认证
+        backend = sb.RedisRateBackend(f"redis://:wrong@127.0.0.1:{port}/0")
+        await expect_error(backend, "密码错误")
+        await backend.close()
+        backend = sb.RedisRateBackend(f"redis://127.0.0.1:{port}/0")
+        await expect_error(backend, "未认证", connect_error=False)
+        await backend.close()
+
+        if not standin.has_store:
+            print("跳过 Lua 脚本检查: 未安装 fakeredis (pip install \"fakeredis[lua]\")")
+            return failures
+
+        # Lua 脚本与 SQLite 后端的窗口判断一致；第一次 EVALSHA 得到 NOSCRIPT 后回退 EVAL
+        now_ms = int(time.time() * 1000)
+        backend = sb.RedisRateBackend(f"redis://:pw@127.0.0.1:{port}/3")
+        try:
+            redis_decisions = await _rate_decisions(backend, "check", now_ms)
+        except sb.RedisError as e:
+            failures.append(f"Lua 脚本执行失败 (需要 lupa): {e}")
+            return failures
+        finally:
+            await backend.close()
+        with tempfile.TemporaryDirectory() as workdir:
+            sqlite_backend = sb.SqliteRateBackend(os.path.join(workdir, "rate.db"))
+            sqlite_decisions = await _rate_decisions(sqlite_backend, "check", now_ms)
+            await sqlite_backend.close()
+        for i, (a, b) in enumerate(zip(redis_decisions, sqlite_decisions)):
+            if a != b:
+                failures.append(f"第 {i + 1} 次判断不一致: redis {a} / sqlite {b}")
+        if standin.commands.get("EVAL", 0) != 2:
+            failures.append(f"EVAL 次数 {standin.commands.get('EVAL', 0)} (应只在每个脚本首次使用时回退一次)")
+        if not standin.keys(3) or standin.keys(0):
+            failures.append("数据没有写入 URL 指定的库")
+        print(f"Lua 脚本: {len(redis_decisions)} 次判断与 SQLite 后端一致，命令 {dict(sorted(standin.commands.items()))}")
+
+        if not check_rate_backend(f"redis://:pw@127.0.0.1:{port}/4", processes, attempts):
+            failures.append("多进程争用: 占用总数不等于限制")
+    finally:
+        standin.stop()
+    return failures
+
+
+# =============================================================================
+# 基准线
+# =============================================================================
+
+def environment_info() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "json_backend": sb.JSON_BACKEND,
+    }
+
+
+def load_baseline(filepath: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(filepath) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(filepath: str, results: Dict[str, float]):
+    data = {
+        "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": environment_info(),
+        "results_us": {name: round(us, 3) for name, us in results.items()},
+    }
+    with open(filepath, "w") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"基准线已保存: {filepath}")
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """与基准线对比，返回变慢超过容差的用例"""
+    env = environment_info()
+    if baseline.get("environment") != env:
+        print(f"注意: 基准线环境 {baseline.get('environment')} 与当前 {env} 不同，对比仅供参考")
+
+    base_results = baseline.get("results_us", {})
+    regressions = []
+    print(f"{'用例':<28} {'基准 (us)':>12} {'当前 (us)':>12} {'比值':>8}")
+    for name, us in results.items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<28} {'-':>12} {us:>12.2f} {'无基准':>8}")
+            continue
+        ratio = us / base if base else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  <-- 回归"
+            regressions.append(f"{name}: {base:.2f}us -> {us:.2f}us ({ratio:.2f}x)")
+        print(f"{name:<28} {base:>12.2f} {us:>12.2f} {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sniper Bot 热路径微基准")
+    parser.add_argument("--save-baseline", action="store_true", help="保存本次结果为基准线")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基准线文件")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="允许变慢的比例 (默认 0.5 即 1.5 倍)")
+    parser.add_argument("--rate-backend", help="只测共享限速后端，如 sqlite:/tmp/rate.db 或 redis://127.0.0.1:6379/0")
+    parser.add_argument("--processes", type=int, default=8, help="争用额度的进程数")
+    parser.add_argument("--attempts", type=int, default=500, help="每个进程的 reserve 次数")
+    parser.add_argument("--check-redis", action="store_true", help="用本地替身检查 Redis 限速后端 (不需要 Redis 服务器)")
+    args = parser.parse_args()
+
+    # 账号切换等路径会打 INFO 日志，基准中只保留警告
+    sb.log.setLevel(logging.WARNING)
+
+    if args.rate_backend:
+        return 0 if check_rate_backend(args.rate_backend, args.processes, args.attempts) else 1
+
+    if args.check_redis:
+        failures = asyncio.run(check_redis_client(args.processes, args.attempts))
+        for line in failures:
+            print(f"  失败: {line}")
+        print("Redis 限速后端检查" + ("失败" if failures else "通过"))
+        return 1 if failures else 0
+
+    print(f"JSON 后端: {sb.JSON_BACKEND}")
+    print(f"{'基准':<16} {'之前 (us)':>12} {'之后 (us)':>12} {'加速':>8}")
+
+    totals: Dict[str, float] = {"before": 0.0, "after": 0.0}
+    for name, before_fn, after_fn in order_payload_cases() + response_decode_cases():
+        before = bench(before_fn)
+        after = bench(after_fn)
+        totals["before"] += before
+        totals["after"] += after
+        print(f"{name:<16} {before:>12.2f} {after:>12.2f} {before / after:>7.2f}x")
+
+    print(f"{'每单合计':<16} {totals['before']:>12.2f} {totals['after']:>12.2f}")
+    print()
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    base_results = baseline.get("results_us", {}) if baseline else {}
+
+    results: Dict[str, float] = {}
+    blocking = sb.blocking
+    sb.blocking = _DiscardWrites()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, fn, number in hot_path_cases(workdir):
+                results[name] = bench(fn, number=number)
+                # 超出容差时重测两次取最快，排除偶发的调度抖动
+                for _ in range(2):
+                    base = base_results.get(name)
+                    if base is None or results[name] <= base * (1 + args.tolerance):
+                        break
+                    results[name] = min(results[name], bench(fn, number=number))
+            over_budget = check_idle_poll(workdir)
+            print()
+    finally:
+        sb.blocking = blocking
+
+    if over_budget:
+        print("空闲轮询内存分配超出预算:")
+        for line in over_budget:
+            print(f"  {line}")
+        print()
+
+    if args.save_baseline:
+        for name, us in results.items():
+            print(f"{name:<28} {us:>12.2f}")
+        save_baseline(args.baseline, results)
+        return 1 if over_budget else 0
+
+    if baseline is None:
+        for name, us in results.items():
+            print(f"{name:<28} {us:>12.2f}")
+        print(f"没有基准线 ({args.baseline})，使用 --save-baseline 生成")
+        return 1 if over_budget else 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print()
+        print(f"性能回归 (超过基准 {1 + args.tolerance:.2f} 倍):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Sniper Bot 交易历史报表
+读取机器人写入的交易历史库 (HISTORY_DB，默认 history.db)，按滑动时间窗口汇总，可以在机器人运行时执行:
+
+    python report_sniper.py                          # 最近 24 小时
+    python report_sniper.py --hours 168 --market ETH-USD-PERP
+    python report_sniper.py --account 0x1234... --hours 1
+
+输出: 机会命中率和各类轮询结果、下单次数和延迟、每小时成交、各账号的成交量和磨损
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import sniper_bot as sb
+
+
+# 轮询结果的说明
+OUTCOME_NAMES = {
+    "opened": "已开仓",
+    "open_failed": "开仓失败",
+    "shared_limited": "共享限速",
+    "rate_limited": "限速中",
+    "spread": "点差过大",
+    "depth": "订单簿不足",
+    "no_bbo": "无行情",
+    "inflight_full": "持仓已满",
+}
+
+
+def print_report(db: str, hours: float, account: str = "", market: str = ""):
+    until_ms = int(time.time() * 1000)
+    since_ms = until_ms - int(hours * 3600000)
+    conn = sb.TradeHistory.connect(db)
+    try:
+        scope = " ".join(filter(None, [account, market])) or "全部账号和市场"
+        print(f"交易历史: {db}  最近 {hours:g} 小时  {scope}")
+        print()
+
+        hit = sb.history_hit_rate(conn, since_ms, until_ms, account, market)
+        print(f"轮询 {hit['polls']} 次, 满足开仓条件 {hit['eligible']} 次, 开仓 {hit['opened']} 次, 命中率 {hit['hit_rate']:.1%}")
+        for outcome, count in sorted(hit["outcomes"].items(), key=lambda item: -item[1]):
+            print(f"  {OUTCOME_NAMES.get(outcome, outcome):<12} {count:>10}")
+        print()
+
+        print(f"{'下单':<8} {'次数':>8} {'失败':>8} {'平均延迟 ms':>12} {'最大延迟 ms':>12}")
+        for row in sb.history_order_stats(conn, since_ms, until_ms, account, market):
+            print(f"{row['purpose']:<8} {row['orders']:>8} {row['failed']:>8} "
+                  f"{row['avg_latency_ms']:>12.1f} {row['max_latency_ms']:>12.1f}")
+        print()
+
+        print(f"{'小时':<18} {'成交':>8} {'成交量 $':>14} {'磨损 $':>12}")
+        for row in sb.history_fills_per_hour(conn, since_ms, until_ms, account, market):
+            hour = datetime.fromtimestamp(row["hour_ms"] / 1000).strftime("%Y-%m-%d %H:00")
+            print(f"{hour:<18} {row['fills']:>8} {row['volume']:>14,.2f} {row['wear']:>12.4f}")
+        print()
+
+        rows = sb.history_wear_by_account(conn, since_ms, until_ms, market)
+        if account:
+            rows = [row for row in rows if row["account"] == account]
+        print(f"{'账号':<16} {'成交':>8} {'成交量 $':>14} {'手续费 $':>10} {'磨损 $':>12}")
+        for row in rows:
+            print(f"{row['account'][:14]:<16} {row['fills']:>8} {row['volume']:>14,.2f} "
+                  f"{row['fees']:>10.4f} {row['wear']:>12.4f}")
+    finally:
+        conn.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sniper Bot 交易历史报表")
+    parser.add_argument("--db", default=os.getenv("HISTORY_DB", "history.db"), help="交易历史库 (默认 history.db)")
+    parser.add_argument("--hours", type=float, default=24, help="统计最近多少小时 (默认 24)")
+    parser.add_argument("--account", default="", help="只看某个账号 (L2 地址)")
+    parser.add_argument("--market", default="", help="只看某个市场")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"交易历史库不存在: {args.db}")
+        return 1
+    print_report(args.db, args.hours, args.account, args.market)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
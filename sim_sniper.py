@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Sniper Bot 虚拟时钟模拟
+离线运行，不访问网络，不需要 .env，用模拟交易所在虚拟时间里跑完整的多账号交易日:
+
+    python sim_sniper.py                            # 3 个账号跑 24 小时
+    python sim_sniper.py --accounts 10 --hours 48 --seed 7
+    python sim_sniper.py --repeat 2                 # 同样参数跑两次，检查决策完全一致
+
+事件循环的时间是虚拟的: 没有就绪的任务时直接跳到下一个定时器，sleep 和超时都不真正等待；
+SniperBot 和 AccountManager 通过 VirtualClock 读取同一个虚拟时间 (限速窗口、换日、账号调度)
+同样的参数和种子每次得到相同的决策序列，最后输出决策序列的摘要用于比对
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import selectors
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import sniper_bot as sb
+
+
+# =============================================================================
+# 虚拟时间事件循环
+# =============================================================================
+
+class _VirtualSelector:
+    """
+    包装真实的 selector: 有等待中的线程池任务时照常等待真实 IO；
+    否则不做系统调用，直接把虚拟时间推进到下一个定时器 (模拟运行没有网络 IO)
+    """
+
+    def __init__(self, selector: selectors.BaseSelector):
+        self._selector = selector
+        self.loop: Optional['VirtualTimeLoop'] = None
+
+    def select(self, timeout: Optional[float] = None):
+        if timeout is None or self.loop.executor_jobs:
+            # 等线程池任务完成 (完成时通过 self-pipe 唤醒)，期间虚拟时间不前进
+            return self._selector.select(None if timeout is None else min(timeout, 0.05))
+        if timeout > 0:
+            self.loop.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """loop.time() 返回虚拟时间 (秒，从 0 开始)，由 selector 在空闲时推进"""
+
+    def __init__(self):
+        self._virtual_now = 0.0
+        self.executor_jobs = 0
+        selector = _VirtualSelector(selectors.DefaultSelector())
+        super().__init__(selector)
+        selector.loop = self
+
+    def time(self) -> float:
+        return self._virtual_now
+
+    def advance(self, seconds: float):
+        self._virtual_now += seconds
+
+    def run_in_executor(self, executor, func, *args):
+        # 线程池任务 (客户端初始化、写文件) 按真实时间执行，未完成前冻结虚拟时间
+        fut = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        fut.add_done_callback(self._executor_done)
+        return fut
+
+    def _executor_done(self, fut):
+        self.executor_jobs -= 1
+
+
+class VirtualClock(sb.Clock):
+    """以 start 为起点 (epoch 秒) 的虚拟时钟，读取 VirtualTimeLoop 的时间"""
+
+    realtime = False
+
+    def __init__(self, loop: VirtualTimeLoop, start: float):
+        self.loop = loop
+        self.start = start
+
+    def time(self) -> float:
+        return self.start + self.loop.time()
+
+
+# =============================================================================
+# 模拟交易所
+# =============================================================================
+
+SIM_SPEC = sb.MarketSpec("BTC-USD-PERP", tick_size="0.1", size_increment="0.0001", min_notional="10")
+
+
+class SimExchange:
+    """
+    模拟交易所 (单市场)
+      - 中间价每 100ms 随机游走一次，点差 1~80 tick，买一/卖一数量随机
+      - 限价单按限价、市价单按对手价立即全部成交，手续费为 0
+      - 每个账号单独记录持仓和成交；所有下单按顺序记入 decisions
+    """
+
+    def __init__(self, clock: VirtualClock, seed: int, spec: sb.MarketSpec = SIM_SPEC):
+        self.clock = clock
+        self.spec = spec
+        self.rng = random.Random(seed)
+        self.mid_ticks = 895000
+        self._slot = -1
+        self._bbo: Optional[sb.BBO] = None
+        self.positions: Dict[str, int] = {}          # 账号 -> 持仓 lot 数 (空头为负)
+        self.fills: Dict[str, List[Dict]] = {}
+        self.decisions: List[str] = []
+        self._fill_seq = 0
+
+    def bbo(self) -> sb.BBO:
+        """当前报价，同一个 100ms 内返回同一报价"""
+        slot = int(self.clock.loop.time() * 10)
+        if slot != self._slot:
+            rng = self.rng
+            for _ in range(min(slot - self._slot, 50)):
+                self.mid_ticks += rng.randint(-3, 3)
+            spread = rng.randint(1, 80)
+            bid = self.mid_ticks - spread // 2
+            self._bbo = sb.BBO(
+                self.spec, bid, bid + spread,
+                rng.randint(10, 2000), rng.randint(10, 2000),
+                self.clock.time_ms(),
+            )
+            self._slot = slot
+        return self._bbo
+
+    def execute(self, account: str, side: str, size: str, price_ticks: int, kind: str) -> Dict:
+        """成交一笔订单，返回订单结果"""
+        lots = self.spec.size_to_lots(size)
+        signed = lots if side == "BUY" else -lots
+        self.positions[account] = self.positions.get(account, 0) + signed
+        now_ms = self.clock.time_ms()
+        self._fill_seq += 1
+        price = self.spec.ticks_to_price(price_ticks)
+        self.fills.setdefault(account, []).append({
+            "id": f"F{self._fill_seq}",
+            "market": self.spec.symbol,
+            "side": side,
+            "price": price,
+            "size": size,
+            "fee": "0",
+            "created_at": now_ms,
+        })
+        self.decisions.append(f"{now_ms} {account} {kind} {side} {size}@{price}")
+        return {"id": f"O{self._fill_seq}", "status": "CLOSED", "flags": ["INTERACTIVE"]}
+
+
+class SimClient:
+    """与 ParadexInteractiveClient 接口一致的模拟客户端，所有请求由 SimExchange 处理"""
+
+    def __init__(self, exchange: SimExchange, account: sb.AccountInfo):
+        self.exchange = exchange
+        self.l2_address = account.l2_address
+        self.market_data = None
+        self.clock = SimpleNamespace(offset_ms=0.0, rtt_ms=None)
+        self.balance = 1000.0
+
+    async def ensure_authenticated(self) -> bool:
+        return True
+
+    async def get_market_spec(self, market: str) -> Optional[sb.MarketSpec]:
+        return self.exchange.spec if market == self.exchange.spec.symbol else None
+
+    async def get_bbo(self, market: str) -> Optional[sb.BBO]:
+        return self.exchange.bbo() if market == self.exchange.spec.symbol else None
+
+    async def get_balance(self) -> Optional[float]:
+        return self.balance
+
+    async def place_limit_order(
+        self, market: str, side: str, size: str, price: str, instruction: str = "GTC", reduce_only: bool = False
+    ) -> Optional[Dict]:
+        return self.exchange.execute(self.l2_address, side, size, self.exchange.spec.price_to_ticks(price), "LIMIT")
+
+    async def place_market_order(
+        self, market: str, side: str, size: str, reduce_only: bool = False
+    ) -> Optional[Dict]:
+        bbo = self.exchange.bbo()
+        if bbo is None:
+            return None
+        price_ticks = bbo.ask_ticks if side == "BUY" else bbo.bid_ticks
+        return self.exchange.execute(self.l2_address, side, size, price_ticks, "MARKET")
+
+    async def get_positions(self, market: str = None) -> Optional[List[Dict]]:
+        lots = self.exchange.positions.get(self.l2_address, 0)
+        if not lots:
+            return []
+        return [{
+            "market": self.exchange.spec.symbol,
+            "side": "LONG" if lots > 0 else "SHORT",
+            "size": self.exchange.spec.lots_to_size(abs(lots)),
+            "status": "OPEN",
+        }]
+
+    async def get_fills(self, market: Optional[str] = None, start_at: Optional[int] = None) -> Optional[List[Dict]]:
+        start_at = start_at or 0
+        return [f for f in self.exchange.fills.get(self.l2_address, []) if f["created_at"] >= start_at]
+
+    async def get_open_orders(self, market: str = None) -> Optional[List[Dict]]:
+        return []
+
+    async def cancel_all_orders(self, market: str = None, orders: Optional[List[Dict]] = None) -> int:
+        return 0
+
+    async def close_all_positions(
+        self, market: str = None, positions: Optional[List[Dict]] = None,
+        on_result: Optional[Callable[[Dict, Optional[Dict], float], None]] = None,
+    ) -> int:
+        if positions is None:
+            positions = await self.get_positions(market)
+        for pos in positions:
+            side = "SELL" if pos["side"] == "LONG" else "BUY"
+            result = await self.place_market_order(pos["market"], side, pos["size"], reduce_only=True)
+            if on_result is not None:
+                order = {"market": pos["market"], "side": side, "size": pos["size"], "reduce_only": True}
+                on_result(order, result, 0.0)
+        return len(positions)
+
+    async def close(self):
+        pass
+
+
+class SimAccountManager(sb.AccountManager):
+    """客户端换成 SimClient 的账号管理器"""
+
+    def __init__(self, exchange: SimExchange, accounts: List[sb.AccountInfo], **kwargs):
+        self.exchange = exchange
+        super().__init__(accounts, **kwargs)
+
+    def _create_client(self, index: int) -> SimClient:
+        return SimClient(self.exchange, self.accounts[index])
+
+
+# =============================================================================
+# 运行
+# =============================================================================
+
+class _DiscardWrites(sb.BlockingExecutor):
+    """状态文件、账本的后台写入直接丢弃 (模拟结束后不保留)，线程池任务照常执行"""
+
+    def submit_call(self, func, *args, error_msg: str = ""):
+        pass
+
+
+class _VirtualTimeFormatter(logging.Formatter):
+    """日志时间显示为虚拟时间"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__("%(asctime)s [%(levelname)s] %(message)s")
+        self.clock = clock
+
+    def formatTime(self, record, datefmt=None):
+        return self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_start(text: str) -> float:
+    """虚拟起始时间 (本地时间，精确到分钟或秒)"""
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"无法解析起始时间: {text}")
+
+
+async def simulate(
+    args: argparse.Namespace,
+    workdir: str,
+    config: Optional[sb.TradingConfig] = None,
+    make_exchange: Optional[Callable[[VirtualClock], SimExchange]] = None,
+) -> Dict:
+    """
+    在当前 (虚拟时间) 事件循环里跑一次模拟，返回结果汇总
+    config / make_exchange 为空时使用默认配置和随机游走行情 (参数扫描时传入候选配置和回放行情)
+    """
+    loop = asyncio.get_running_loop()
+    clock = VirtualClock(loop, parse_start(args.start))
+    exchange = make_exchange(clock) if make_exchange else SimExchange(clock, args.seed)
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(_VirtualTimeFormatter(clock))
+    sb.log.handlers = [handler]
+    sb.log.propagate = False
+    sb.log.setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    accounts = [
+        sb.AccountInfo(l2_private_key="0x1", l2_address=f"0xsim{i + 1:04d}", name=f"模拟#{i + 1}")
+        for i in range(args.accounts)
+    ]
+    manager = SimAccountManager(
+        exchange, accounts,
+        state_file=os.path.join(workdir, "account_states.json"),
+        clock=clock,
+    )
+    config = config or sb.TradingConfig(fixed_size=args.size)
+    bot = sb.SniperBot(
+        manager.get_current_client(), config, manager,
+        state_file=os.path.join(workdir, "sniper_state.json"),
+        ledger_file=os.path.join(workdir, "ledger.json"),
+        exposure_file=os.path.join(workdir, "exposure.json"),
+        history_file="",
+        clock=clock,
+    )
+
+    async def stop_after():
+        # 到时间后与 Ctrl+C 一样设置退出标志，并打断正在进行的等待 (如等到次日)
+        await clock.sleep(args.hours * 3600)
+        sb._shutdown_requested = True
+        bot_task.cancel()
+
+    sb._shutdown_requested = False
+    bot_task = asyncio.ensure_future(bot.run())
+    stopper = asyncio.ensure_future(stop_after())
+    try:
+        await bot_task
+    finally:
+        stopper.cancel()
+
+    orders = Counter(d.split(" ", 2)[1] for d in exchange.decisions)
+    switches = 0
+    last_account = None
+    for d in exchange.decisions:
+        account = d.split(" ", 2)[1]
+        if last_account is not None and account != last_account:
+            switches += 1
+        last_account = account
+
+    return {
+        "virtual_hours": loop.time() / 3600,
+        "orders": len(exchange.decisions),
+        "opens": sum(1 for d in exchange.decisions if " LIMIT " in d),
+        "orders_by_account": dict(sorted(orders.items())),
+        "switches": switches,
+        "open_positions": sum(1 for lots in exchange.positions.values() if lots),
+        "ledger": bot.ledger.totals(),
+        "digest": hashlib.sha256("\n".join(exchange.decisions).encode()).hexdigest(),
+    }
+
+
+def run_once(
+    args: argparse.Namespace,
+    config: Optional[sb.TradingConfig] = None,
+    make_exchange: Optional[Callable[[VirtualClock], SimExchange]] = None,
+) -> Dict:
+    """新建虚拟时间事件循环和临时目录，跑一次模拟"""
+    loop = VirtualTimeLoop()
+    asyncio.set_event_loop(loop)
+    with tempfile.TemporaryDirectory(prefix="sniper_sim_") as workdir:
+        sb.metrics.export_path = os.devnull
+        sb.tracer.configure("")
+        blocking = sb.blocking
+        sb.blocking = _DiscardWrites()
+        try:
+            t0 = time.perf_counter()
+            result = loop.run_until_complete(simulate(args, workdir, config, make_exchange))
+            result["wall_s"] = time.perf_counter() - t0
+        finally:
+            sb.blocking = blocking
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+            asyncio.set_event_loop(None)
+    return result
+
+
+def print_result(result: Dict):
+    print(f"\n虚拟时间 {result['virtual_hours']:.2f} 小时，实际耗时 {result['wall_s']:.2f}s")
+    print(f"下单 {result['orders']} 笔，账号切换 {result['switches']} 次，未平仓账号 {result['open_positions']} 个")
+    for account, count in result["orders_by_account"].items():
+        print(f"  {account}: {count} 笔")
+    ledger = result["ledger"]
+    print(f"账本: 成交 {ledger['fills']} 笔, 成交量 ${ledger['volume']:,.2f}, 磨损 ${ledger['wear']:.4f}")
+    print(f"决策摘要: {result['digest']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sniper Bot 虚拟时钟模拟")
+    parser.add_argument("--accounts", type=int, default=3, help="模拟账号数 (默认 3)")
+    parser.add_argument("--hours", type=float, default=24, help="模拟时长，小时 (默认 24)")
+    parser.add_argument("--seed", type=int, default=1, help="行情随机种子 (默认 1)")
+    parser.add_argument("--size", default="0.0009", help="每笔开仓数量 (默认 0.0009)")
+    parser.add_argument("--start", default="2025-01-06 09:00", help="虚拟起始时间 (本地时间，默认 2025-01-06 09:00)")
+    parser.add_argument("--repeat", type=int, default=1, help="重复运行次数，大于 1 时检查决策摘要一致")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出机器人日志 (时间为虚拟时间)")
+    args = parser.parse_args()
+
+    digests = set()
+    for i in range(max(1, args.repeat)):
+        result = run_once(args)
+        print_result(result)
+        digests.add(result["digest"])
+
+    if len(digests) > 1:
+        print("\n多次运行的决策不一致!")
+        sys.exit(1)
+    if args.repeat > 1:
+        print(f"\n{args.repeat} 次运行决策一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,22 +6,78 @@ Jess-Para Sniper Bot (V27 Python API Version)
 """
 
 import os
+import gc
 import sys
 import json
 import time
+import base64
 import asyncio
 import logging
 import signal
+import uuid
+import threading
+import traceback
+import random
+import contextvars
+import multiprocessing
+import zlib
+import heapq
+import bisect
+import hashlib
+import glob
+import sqlite3
+from abc import ABC, abstractmethod
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from array import array
+from collections import deque, Counter, OrderedDict
 from datetime import datetime, timedelta
-from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List
+from email.utils import parsedate_to_datetime
+from dataclasses import dataclass, fields, replace
+from typing import Optional, Dict, Any, List, Deque, Tuple, Callable, Sequence
 from decimal import Decimal, ROUND_DOWN
+from fractions import Fraction
+from urllib.parse import urlsplit, unquote
 
+import aiohttp
 from dotenv import load_dotenv
 
+# paradex-py 在启动时导入一次 (缺失时在创建客户端时提示安装)
+try:
+    from paradex_py import ParadexSubkey
+    from paradex_py.environment import PROD, TESTNET
+    from paradex_py.common.order import Order, OrderSide, OrderType
+except ImportError:
+    ParadexSubkey = None
+
+# 可选的高速 JSON 库: orjson > msgspec > 标准库 json
+try:
+    import orjson
+
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import msgspec
+
+        json_dumps = msgspec.json.Encoder().encode
+        json_loads = msgspec.json.Decoder().decode
+        JSON_BACKEND = "msgspec"
+    except ImportError:
+        def json_dumps(obj: Any) -> bytes:
+            return json.dumps(obj, separators=(",", ":")).encode()
+
+        json_loads = json.loads
+        JSON_BACKEND = "json"
+
 # 全局退出标志
 _shutdown_requested = False
 
+# 进程启动时刻 (用于统计启动到首次满足开仓条件的耗时)
+_PROCESS_START = time.perf_counter()
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -30,6 +86,65 @@ logging.basicConfig(
 )
 log = logging.getLogger('JESS-SNIPER')
 
+# =============================================================================
+# 时钟
+# =============================================================================
+
+class Clock:
+    """
+    本地时钟与等待
+    限速窗口、日期切换、账号调度和各种等待都通过它取时间，
+    模拟运行时替换为虚拟时钟 (见 sim_sniper.py)，一整天的轮换几秒内跑完
+    """
+
+    # 虚拟时钟为 False: 依赖真实时间的监控 (事件循环延迟) 不启动
+    realtime = True
+
+    # 当天的日期键和起止时间 (ms)，在当天范围内复用
+    _day_key = ""
+    _day_start_ms = 0
+    _day_end_ms = 0
+
+    def time(self) -> float:
+        """Unix 时间 (秒)"""
+        return time.time()
+
+    def time_ms(self) -> int:
+        return int(self.time() * 1000)
+
+    def now(self) -> datetime:
+        """本地时间"""
+        return datetime.fromtimestamp(self.time())
+
+    def day_key(self) -> str:
+        """当天日期键 (每次轮询都会调用，同一天内返回同一个字符串，不重新格式化)"""
+        now_ms = self.time_ms()
+        if not self._day_start_ms <= now_ms < self._day_end_ms:
+            now = datetime.fromtimestamp(now_ms / 1000)
+            start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            self._day_key = now.strftime("%Y-%m-%d")
+            self._day_start_ms = int(start.timestamp() * 1000)
+            self._day_end_ms = int((start + timedelta(days=1)).timestamp() * 1000)
+        return self._day_key
+
+    def next_day_ms(self) -> int:
+        """次日零点 (本地时间) 的毫秒时间戳，与日期键的切换时刻一致"""
+        self.day_key()
+        return self._day_end_ms
+
+    def day_start_ms(self) -> int:
+        """当天零点 (本地时间) 的毫秒时间戳"""
+        self.day_key()
+        return self._day_start_ms
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+# 默认使用系统时钟
+system_clock = Clock()
+
+
 # =============================================================================
 # 配置类
 # =============================================================================
@@ -68,9 +183,16 @@ class TradingConfig:
     limits_per_hour: int = 300
     limits_per_day: int = 1000
 
+    # 流水线模式: 同时持有的最多仓位数 (1 = 顺序执行，开仓-平仓完成后才评估下一次机会)
+    # 大于 1 时平仓在后台进行，期间继续评估并开仓，受限速窗口和此上限约束
+    max_open_positions: int = 1
+
     # 市场
     market: str = "BTC-USD-PERP"
 
+    # 事件循环延迟告警阈值 (ms)
+    loop_lag_threshold_ms: int = 100
+
     # 运行状态
     enabled: bool = False
 
@@ -91,41 +213,144 @@ class Stats:
     last_stop_reason: Optional[str] = None
 
 
-@dataclass
 class RateLimitState:
-    """限速状态"""
-    day: str = ""
-    trades: List[int] = field(default_factory=list)
+    """
+    限速状态
+    trades 为有序的毫秒时间戳，存放在 array('q') 中 (每条 8 字节，list[int] 约 36 字节)
+    数千个账号常驻内存时，按窗口计数和清理都用二分查找
+    blocked_until / blocked_window: 共享限速后端告知的受限窗口和解除时间 (其他进程用掉了额度，不持久化)
+    """
+
+    __slots__ = ("day", "trades", "blocked_until", "blocked_window")
+
+    def __init__(self, day: str = "", trades: Optional[List[int]] = None):
+        self.day = day
+        self.trades = array("q", trades or ())
+        self.blocked_until = 0
+        self.blocked_window = ""
+
+    def reset(self, day: str):
+        """新的一天，清空交易记录"""
+        self.day = day
+        del self.trades[:]
+
+    def prune(self, cutoff_ms: int):
+        """删除 cutoff_ms 及之前的交易记录"""
+        del self.trades[:bisect.bisect_right(self.trades, cutoff_ms)]
+
+    def count_since(self, cutoff_ms: int) -> int:
+        """cutoff_ms 之后的交易数"""
+        return len(self.trades) - bisect.bisect_right(self.trades, cutoff_ms)
+
+    def to_dict(self, keep: int = 1000) -> Dict[str, Any]:
+        """持久化快照，只保留最近 keep 条"""
+        return {"day": self.day, "trades": self.trades[-keep:].tolist()}
+
+
+class RateUsage:
+    """
+    各限速窗口的用量
+    每个机器人预先分配一个，每次轮询原地更新，不新建 dict；只在当次轮询内有效
+    """
+
+    __slots__ = ("sec", "min", "hour", "day", "account")
+
+    def __init__(self):
+        self.sec = 0
+        self.min = 0
+        self.hour = 0
+        self.day = 0
+        self.account: Optional[str] = None
+
+    def __str__(self) -> str:
+        text = f"sec={self.sec} min={self.min} hour={self.hour} day={self.day}"
+        return f"{self.account} {text}" if self.account is not None else text
 
 
-@dataclass
 class AccountInfo:
-    """账号信息"""
-    l2_private_key: str
-    l2_address: str
-    name: str = ""  # 账号名称/标识
+    """
+    账号信息
+    从账号文件加载时不在内存中保存私钥，只记录文件路径和行偏移，创建客户端时再读取
+    """
+
+    __slots__ = ("_private_key", "l2_address", "name", "key_file", "key_offset")
+
+    def __init__(
+        self,
+        l2_private_key: str = "",
+        l2_address: str = "",
+        name: str = "",  # 账号名称/标识
+        key_file: str = "",
+        key_offset: int = -1,
+    ):
+        self._private_key = l2_private_key
+        self.l2_address = l2_address
+        self.name = name
+        self.key_file = key_file
+        self.key_offset = key_offset
+
+    @property
+    def l2_private_key(self) -> str:
+        """私钥 (账号文件模式下每次从文件读取，不缓存)"""
+        if self._private_key or self.key_offset < 0:
+            return self._private_key
+        with open(self.key_file, "rb") as f:
+            f.seek(self.key_offset)
+            line = f.readline().decode().strip()
+        return line.split(",", 1)[0].strip()
+
+    def __repr__(self) -> str:
+        return f"AccountInfo(name={self.name!r}, l2_address={self.l2_address!r})"
+
+
+# 账号数超过该值时，统计日志只输出汇总
+ACCOUNT_DETAIL_LOG_MAX = 20
 
 
 class AccountManager:
     """
     多账号管理器
     当一个账号达到日限制时自动切换到下一个账号
+
+    账号调度: 非当前账号按 "下次可交易时间" 放在最小堆中
+      - 可交易的账号: 键为最后一次交易时间 (最久未用的优先)
+      - 小时已满: 键为窗口内足够多的旧交易滑出 1 小时窗口的时间
+      - 日已满: 键为次日零点
+    只有当前账号会产生新交易，切换时把当前账号按新键放回堆中，再弹出堆顶，O(log n)
     """
 
-    def __init__(self, accounts: List[AccountInfo], environment: str = "prod"):
+    def __init__(
+        self,
+        accounts: List[AccountInfo],
+        environment: str = "prod",
+        state_file: str = "account_states.json",
+        max_live_clients: int = 32,
+        clock: Optional[Clock] = None,
+    ):
         if not accounts:
             raise ValueError("至少需要配置一个账号")
 
         self.accounts = accounts
         self.environment = environment
+        self.state_file = state_file
+        self.clock = clock or system_clock
         self.current_index = 0
-        self.clients: Dict[int, 'ParadexInteractiveClient'] = {}
+        # 客户端池 (LRU): 最多保留 max_live_clients 个客户端，超出时关闭最久未用的
+        self.clients: 'OrderedDict[int, ParadexInteractiveClient]' = OrderedDict()
+        self.max_live_clients = max(2, max_live_clients)
+        self.on_client_created: Optional[Callable[['ParadexInteractiveClient'], None]] = None
+        # 后台任务 (流水线平仓) 正在使用的客户端: id(客户端) -> 引用计数；被淘汰时推迟到释放后再关闭
+        self._pins: Dict[int, int] = {}
+        self._deferred_close: Dict[int, 'ParadexInteractiveClient'] = {}
         self.rate_states: Dict[int, RateLimitState] = {}
         self.daily_limits = 1000  # 每个账号每天最大交易次数
+        self.hourly_limits = 300  # 每个账号每小时最大交易次数
+        self._schedule: List[Tuple[int, int]] = []  # (下次可交易时间 ms, 账号序号)
 
         # 初始化每个账号的限速状态
         for i in range(len(accounts)):
             self.rate_states[i] = RateLimitState()
+        self._rebuild_schedule()
 
         log.info(f"账号管理器初始化: 共 {len(accounts)} 个账号")
 
@@ -135,21 +360,144 @@ class AccountManager:
             return None
 
         # 懒加载客户端
-        if self.current_index not in self.clients:
-            account = self.accounts[self.current_index]
-            try:
-                client = ParadexInteractiveClient(
-                    l2_private_key=account.l2_private_key,
-                    l2_address=account.l2_address,
-                    environment=self.environment
-                )
-                self.clients[self.current_index] = client
-                log.info(f"已加载账号 #{self.current_index + 1}: {account.name or account.l2_address[:10]}...")
-            except Exception as e:
-                log.error(f"加载账号 #{self.current_index + 1} 失败: {e}")
+        client = self.clients.get(self.current_index)
+        if client is None:
+            client = self._create_client(self.current_index)
+            if client is None:
+                return None
+            self._add_client(self.current_index, client)
+        else:
+            self.clients.move_to_end(self.current_index)
+
+        return client
+
+    def _add_client(self, index: int, client: 'ParadexInteractiveClient') -> 'ParadexInteractiveClient':
+        """放入客户端池，超出上限时淘汰最久未用的 (不淘汰当前账号)"""
+        existing = self.clients.get(index)
+        if existing is not None:
+            # 并发创建了同一账号的客户端，保留先放入的
+            self.clients.move_to_end(index)
+            return existing
+
+        if self.on_client_created is not None:
+            self.on_client_created(client)
+        self.clients[index] = client
+
+        while len(self.clients) > self.max_live_clients:
+            # 优先淘汰没有后台任务在用的客户端
+            candidates = [i for i in self.clients if i != self.current_index]
+            victim = next((i for i in candidates if id(self.clients[i]) not in self._pins), candidates[0])
+            self._evict_client(victim)
+        return client
+
+    def pin(self, client: 'ParadexInteractiveClient'):
+        """后台任务开始使用客户端，使用期间被淘汰也不会关闭其 HTTP 会话"""
+        key = id(client)
+        self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, client: 'ParadexInteractiveClient'):
+        """后台任务用完客户端；最后一个使用者释放时关闭期间被淘汰的客户端"""
+        key = id(client)
+        count = self._pins.get(key, 0) - 1
+        if count > 0:
+            self._pins[key] = count
+            return
+        self._pins.pop(key, None)
+        deferred = self._deferred_close.pop(key, None)
+        if deferred is not None:
+            self._close_in_background(deferred)
+
+    async def borrow_client(self, index: int) -> Tuple[Optional['ParadexInteractiveClient'], bool]:
+        """
+        临时使用某账号的客户端 (对账、退出清理)，不放入客户端池，不会挤掉池中正在用的客户端
+        返回 (客户端, 是否临时创建)；临时创建的由调用方用完后关闭
+        """
+        client = self.clients.get(index)
+        if client is not None:
+            return client, False
+        client = await blocking.run(self._create_client, index)
+        if client is None:
+            return None, False
+        if self.on_client_created is not None:
+            self.on_client_created(client)
+        return client, True
+
+    def account_index(self, l2_address: str) -> Optional[int]:
+        """按地址查找账号序号"""
+        for i, account in enumerate(self.accounts):
+            if account.l2_address == l2_address:
+                return i
+        return None
+
+    def _evict_client(self, index: int):
+        """从池中移除客户端并在后台关闭其 HTTP 会话"""
+        client = self.clients.pop(index)
+        metrics.inc("client_evictions")
+        if id(client) in self._pins:
+            self._deferred_close[id(client)] = client
+            return
+        self._close_in_background(client)
+
+    def open_clients(self) -> List['ParadexInteractiveClient']:
+        """池中的客户端加上已淘汰但推迟关闭的客户端 (退出时统一关闭)"""
+        return list(self.clients.values()) + list(self._deferred_close.values())
+
+    @staticmethod
+    def _close_in_background(client: 'ParadexInteractiveClient'):
+        """在后台关闭客户端的 HTTP 会话"""
+        try:
+            asyncio.get_running_loop().create_task(client.close())
+        except RuntimeError:
+            pass
+
+    def _create_client(self, index: int) -> Optional['ParadexInteractiveClient']:
+        """创建某个账号的客户端，失败返回 None"""
+        account = self.accounts[index]
+        try:
+            client = ParadexInteractiveClient(
+                l2_private_key=account.l2_private_key,
+                l2_address=account.l2_address,
+                environment=self.environment
+            )
+            log.info(f"已加载账号 #{index + 1}: {account.name or account.l2_address[:10]}...")
+            return client
+        except Exception as e:
+            log.error(f"加载账号 #{index + 1} 失败: {e}")
+            return None
+
+    async def get_current_client_async(self) -> Optional['ParadexInteractiveClient']:
+        """获取当前活跃的客户端 (需要新建时 SDK 初始化在线程池中执行，不阻塞事件循环)"""
+        return await self.get_client_async(self.current_index)
+
+    async def get_client_async(self, index: int) -> Optional['ParadexInteractiveClient']:
+        """获取指定账号的客户端 (需要新建时在线程池中初始化)"""
+        if index >= len(self.accounts):
+            return None
+
+        client = self.clients.get(index)
+        if client is None:
+            client = await blocking.run(self._create_client, index)
+            if client is None:
                 return None
+            return self._add_client(index, client)
+
+        self.clients.move_to_end(index)
+        return client
 
-        return self.clients[self.current_index]
+    async def load_all_clients(self) -> List['ParadexInteractiveClient']:
+        """
+        并发创建客户端 (SDK 初始化在线程池中执行)
+        账号数超过客户端池上限时，只预热当前账号和调度堆中最早可交易的账号，其余在切换时懒加载
+        """
+        wanted = [self.current_index] + [
+            i for _, i in heapq.nsmallest(self.max_live_clients - 1, self._schedule)
+        ]
+        missing = [i for i in wanted if i not in self.clients]
+        created = await asyncio.gather(*(blocking.run(self._create_client, i) for i in missing))
+        for i, client in zip(missing, created):
+            if client is not None:
+                self._add_client(i, client)
+        return list(self.clients.values())
 
     def get_current_rate_state(self) -> RateLimitState:
         """获取当前账号的限速状态"""
@@ -165,94 +513,99 @@ class AccountManager:
     def is_current_account_limited(self) -> bool:
         """检查当前账号是否达到日限制"""
         state = self.get_current_rate_state()
-        today = datetime.now().strftime("%Y-%m-%d")
+        today = self.clock.day_key()
 
         # 如果是新的一天，重置计数
         if state.day != today:
-            state.day = today
-            state.trades = []
+            state.reset(today)
             return False
 
         return len(state.trades) >= self.daily_limits
 
-    def switch_to_next_account(self) -> bool:
+    def next_available_ms(self, account_index: int, now_ms: Optional[int] = None) -> int:
         """
-        切换到下一个可用账号 (未达到 day 限制)
-        返回: True 如果成功切换, False 如果所有账号都已达到限制
+        某账号的调度键
+        可交易时返回最后一次交易时间 (不大于当前时间)，受限时返回解除限制的时间
         """
-        original_index = self.current_index
-        today = datetime.now().strftime("%Y-%m-%d")
+        now_ms = now_ms if now_ms is not None else self.clock.time_ms()
+        state = self.rate_states[account_index]
+        trades = state.trades if state.day == self.clock.day_key() else []
 
-        # 尝试找到下一个未达到日限制的账号
-        for _ in range(len(self.accounts)):
-            self.current_index = (self.current_index + 1) % len(self.accounts)
+        if len(trades) >= self.daily_limits:
+            return self.clock.next_day_ms()
 
-            # 检查是否回到了起始账号
-            if self.current_index == original_index:
-                # 检查所有账号是否都达到限制
-                all_limited = all(
-                    self.rate_states[i].day == today and
-                    len(self.rate_states[i].trades) >= self.daily_limits
-                    for i in range(len(self.accounts))
-                )
-                if all_limited:
-                    log.warning("所有账号都已达到今日交易限制!")
-                    return False
+        # trades 按时间追加，有序，二分查找小时窗口起点
+        start = bisect.bisect_right(trades, now_ms - 3600000)
+        excess = len(trades) - start - self.hourly_limits
+        if excess >= 0:
+            # 窗口内第 excess+1 旧的交易滑出窗口后，小时计数降到限制以下
+            ready_at = trades[start + excess] + 3600000 + 1
+        else:
+            ready_at = trades[-1] if trades else 0
+        # 共享限速后端告知的受限时间 (其他进程用掉的额度)
+        return max(ready_at, state.blocked_until) if state.blocked_until > now_ms else ready_at
+
+    def _rebuild_schedule(self):
+        """按当前状态重建调度堆 (不含当前账号)，O(n)"""
+        now_ms = self.clock.time_ms()
+        self._schedule = [
+            (self.next_available_ms(i, now_ms), i)
+            for i in range(len(self.accounts)) if i != self.current_index
+        ]
+        heapq.heapify(self._schedule)
+
+    def _switch_to_scheduled(self, now_ms: int):
+        """切换到堆顶账号，当前账号按新键放回堆中"""
+        index = heapq.heapreplace(self._schedule, (self.next_available_ms(self.current_index, now_ms), self.current_index))[1]
+        self.current_index = index
+
+    def peek_next_available(self) -> Tuple[int, int]:
+        """最早可交易的非当前账号 (下次可交易时间 ms, 账号序号)；只有一个账号时返回当前账号"""
+        if self._schedule:
+            return self._schedule[0]
+        return self.next_available_ms(self.current_index), self.current_index
 
-            # 检查新账号是否可用
-            if not self.is_current_account_limited():
-                log.info(f"切换到 {self.get_current_account_name()}")
-                return True
+    def switch_to_next_account(self) -> bool:
+        """
+        切换到下一个可用账号 (未达到 day 限制)
+        返回: True 如果成功切换, False 如果所有账号都已达到限制
+        """
+        if not self._schedule or self._schedule[0][0] >= self.clock.next_day_ms():
+            log.warning("所有账号都已达到今日交易限制!")
+            return False
 
-        return False
+        self._switch_to_scheduled(self.clock.time_ms())
+        log.info(f"切换到 {self.get_current_account_name()}")
+        return True
 
     def _count_hour_trades(self, account_index: int) -> int:
         """统计某账号过去1小时的交易数"""
-        state = self.rate_states[account_index]
-        cutoff = int(time.time() * 1000) - 3600000  # 1小时前
-        return len([t for t in state.trades if t > cutoff])
+        cutoff = self.clock.time_ms() - 3600000  # 1小时前
+        return self.rate_states[account_index].count_since(cutoff)
 
     def is_account_hour_limited(self, account_index: int) -> bool:
         """检查某账号是否达到小时限制 (300单)"""
         hour_trades = self._count_hour_trades(account_index)
-        return hour_trades >= 300  # limits_per_hour
+        return hour_trades >= self.hourly_limits
 
     def switch_to_next_available_account(self) -> str:
         """
-        切换到下一个小时未满的账号
+        切换到最早可交易的账号 (堆顶)
         返回:
           - "switched": 成功切换到 hour 未满的账号
           - "all_hour_limited": 所有账号 hour 都满了，但有 day 未满的，需要等待
           - "all_day_limited": 所有账号 day 都满了
         """
-        today = datetime.now().strftime("%Y-%m-%d")
-
-        # 尝试找到下一个 hour 未满的账号
-        for _ in range(len(self.accounts)):
-            self.current_index = (self.current_index + 1) % len(self.accounts)
-
-            # 跳过 day 已满的账号
-            state = self.rate_states[self.current_index]
-            if state.day == today and len(state.trades) >= self.daily_limits:
-                continue
-
-            # 检查 hour 是否未满
-            if not self.is_account_hour_limited(self.current_index):
-                log.info(f"切换到 {self.get_current_account_name()} (hour: {self._count_hour_trades(self.current_index)}/300)")
-                return "switched"
-
-        # 所有账号的 hour 都满了，检查是否有 day 未满的
-        has_day_available = False
-        for i in range(len(self.accounts)):
-            state = self.rate_states[i]
-            day_trades = len(state.trades) if state.day == today else 0
-            if day_trades < self.daily_limits:
-                has_day_available = True
-                break
+        now_ms = self.clock.time_ms()
+        if self._schedule and self._schedule[0][0] <= now_ms:
+            self._switch_to_scheduled(now_ms)
+            log.info(f"切换到 {self.get_current_account_name()} (hour: {self._count_hour_trades(self.current_index)}/{self.hourly_limits})")
+            return "switched"
 
-        if has_day_available:
-            # 所有账号 hour 都满了，需要等待
-            log.info("所有账号小时限制已满，等待重置...")
+        # 没有立即可用的其他账号，保持当前账号不变
+        ready_at, index = min(self.peek_next_available(), (self.next_available_ms(self.current_index, now_ms), self.current_index))
+        if ready_at < self.clock.next_day_ms():
+            log.info(f"所有账号小时限制已满，{(ready_at - now_ms) / 1000:.0f} 秒后 {self.accounts[index].name or f'账号#{index + 1}'} 恢复")
             return "all_hour_limited"
 
         # 所有账号 day 都满了
@@ -262,11 +615,11 @@ class AccountManager:
     def record_trade(self):
         """记录一次交易"""
         state = self.get_current_rate_state()
-        state.trades.append(int(time.time() * 1000))
+        state.trades.append(self.clock.time_ms())
 
     def get_all_stats(self) -> Dict:
         """获取所有账号的统计信息"""
-        today = datetime.now().strftime("%Y-%m-%d")
+        today = self.clock.day_key()
         stats = {
             "current_account": self.get_current_account_name(),
             "current_index": self.current_index + 1,
@@ -289,1115 +642,4988 @@ class AccountManager:
 
     def all_accounts_exhausted(self) -> bool:
         """检查是否所有账号都已用完今日额度"""
-        today = datetime.now().strftime("%Y-%m-%d")
+        today = self.clock.day_key()
+        next_day_ms = self.clock.next_day_ms()
         return all(
-            self.rate_states[i].day == today and
-            len(self.rate_states[i].trades) >= self.daily_limits
+            (self.rate_states[i].day == today and len(self.rate_states[i].trades) >= self.daily_limits)
+            or self.rate_states[i].blocked_until >= next_day_ms
             for i in range(len(self.accounts))
         )
 
-    def save_state(self, filepath: str = "account_states.json"):
-        """保存所有账号的状态"""
+    def save_state(self, filepath: Optional[str] = None):
+        """
+        保存所有账号的状态
+        限速状态按账号地址保存 (不按序号): 多进程分片时序号是账号在分片内的位置，
+        WORKERS 或账号列表变化后同一序号会对应别的账号
+        """
+        filepath = filepath or self.state_file
+        accounts = self.accounts
         data = {
             "current_index": self.current_index,
+            "current_account": accounts[self.current_index].l2_address if accounts else "",
             "rate_states": {
-                str(i): {"day": state.day, "trades": state.trades[-1000:]}
-                for i, state in self.rate_states.items()
+                accounts[i].l2_address: state.to_dict()
+                for i, state in self.rate_states.items() if state.trades
             }
         }
-        try:
-            with open(filepath, 'w') as f:
-                json.dump(data, f)
-        except Exception as e:
-            log.error(f"保存账号状态失败: {e}")
+        # 数据在事件循环中生成快照，写文件交给后台线程
+        blocking.submit_write(filepath, data, "保存账号状态失败")
 
-    def load_state(self, filepath: str = "account_states.json"):
-        """加载账号状态"""
-        try:
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as f:
+    def load_state(self, filepath: Optional[str] = None, peer_files: Sequence[str] = ()):
+        """
+        加载账号状态
+        peer_files: 其他进程 (分片) 的状态文件；WORKERS 变化后账号换了分片，它之前的交易记录在别的文件里，
+        同样按地址合并进来 (同一天的记录取并集，不同天取较新的一天)
+        旧格式 (按序号保存) 只从本进程自己的文件按序号恢复
+        """
+        filepath = filepath or self.state_file
+        by_address = {account.l2_address: i for i, account in enumerate(self.accounts)}
+        loaded: Dict[int, RateLimitState] = {}
+
+        def merge(i: int, state_data: Dict[str, Any]):
+            state = RateLimitState(day=state_data.get("day", ""), trades=sorted(state_data.get("trades", [])))
+            existing = loaded.get(i)
+            if existing is None or state.day > existing.day:
+                loaded[i] = state
+            elif state.day == existing.day:
+                loaded[i] = RateLimitState(day=state.day, trades=sorted(set(existing.trades) | set(state.trades)))
+
+        for path in [filepath, *peer_files]:
+            try:
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'r') as f:
                     data = json.load(f)
-                    self.current_index = data.get("current_index", 0)
-                    for i_str, state_data in data.get("rate_states", {}).items():
-                        i = int(i_str)
-                        if i < len(self.accounts):
-                            self.rate_states[i] = RateLimitState(
-                                day=state_data.get("day", ""),
-                                trades=state_data.get("trades", [])
-                            )
-                log.info(f"已加载账号状态，当前账号: {self.get_current_account_name()}")
-        except Exception as e:
-            log.warning(f"加载账号状态失败: {e}")
+            except Exception as e:
+                log.warning(f"加载账号状态失败 ({path}): {e}")
+                continue
+            own = path == filepath
+            for key, state_data in data.get("rate_states", {}).items():
+                if key in by_address:
+                    merge(by_address[key], state_data)
+                elif own and key.isdigit() and int(key) < len(self.accounts):
+                    merge(int(key), state_data)
+            if own:
+                current = by_address.get(data.get("current_account", ""))
+                if current is None and not data.get("current_account"):
+                    current = data.get("current_index", 0)
+                if current is not None and current < len(self.accounts):
+                    self.current_index = current
+
+        if loaded or os.path.exists(filepath):
+            self.rate_states.update(loaded)
+            self._rebuild_schedule()
+            log.info(f"已加载账号状态，当前账号: {self.get_current_account_name()}")
 
 
 # =============================================================================
-# Paradex API 客户端 (带 Interactive Token)
+# 运行指标
 # =============================================================================
 
-class ParadexInteractiveClient:
+class Metrics:
     """
-    Paradex API 客户端
-    关键：认证时使用 ?token_usage=interactive 获取 0 手续费 token
+    轻量运行指标: gauge / counter / 滑动窗口分位数
+    定期导出到 metrics.json，供外部监控读取
     """
 
-    def __init__(self, l2_private_key: str, l2_address: str, environment: str = "prod"):
-        self.l2_private_key = l2_private_key
-        self.l2_address = l2_address
-        self.environment = environment
+    def __init__(self, window: int = 1024):
+        self.gauges: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+        self._window = window
+        self.export_path = "metrics.json"
+
+    def set_gauge(self, name: str, value: float):
+        """设置瞬时值"""
+        self.gauges[name] = value
+
+    def inc(self, name: str, n: int = 1):
+        """累加计数"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float):
+        """记录一个样本 (只保留最近 window 个)"""
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self._window)
+        samples.append(value)
+
+    def percentiles(self, name: str, qs=(50, 95, 99)) -> Dict[str, float]:
+        """计算样本分位数"""
+        samples = self._samples.get(name)
+        if not samples:
+            return {}
+        ordered = sorted(samples)
+        last = len(ordered) - 1
+        return {f"p{q}": ordered[min(last, int(last * q / 100 + 0.5))] for q in qs}
+
+    def snapshot(self) -> Dict:
+        """导出当前所有指标"""
+        return {
+            "ts": int(time.time() * 1000),
+            "gauges": dict(self.gauges),
+            "counters": dict(self.counters),
+            "histograms": {name: self.percentiles(name) for name in self._samples},
+        }
 
-        self.base_url = f"https://api.{'prod' if environment == 'prod' else 'testnet'}.paradex.trade/v1"
-        self.jwt_token: Optional[str] = None
-        self.jwt_expires_at: int = 0
+    def export(self, filepath: Optional[str] = None):
+        """写入指标文件"""
+        try:
+            with open(filepath or self.export_path, "w") as f:
+                json.dump(self.snapshot(), f)
+        except Exception as e:
+            log.debug(f"导出指标失败: {e}")
 
-        # 市场信息缓存
-        self.market_info: Dict[str, Any] = {}
 
-        # 导入 paradex-py
-        try:
-            from paradex_py import ParadexSubkey
-            from paradex_py.environment import PROD, TESTNET
-
-            env = PROD if environment == "prod" else TESTNET
-            self.paradex = ParadexSubkey(
-                env=env,
-                l2_private_key=l2_private_key,
-                l2_address=l2_address,
-            )
-            log.info(f"Paradex SDK 初始化成功 (环境: {environment})")
-        except ImportError:
-            log.error("请先安装 paradex-py: pip install paradex-py")
-            raise
+# 全局指标实例
+metrics = Metrics()
 
-    async def authenticate_interactive(self) -> bool:
-        """
-        使用 interactive 模式认证
-        关键：POST /v1/auth?token_usage=interactive
-        """
-        try:
-            import aiohttp
 
-            # 生成认证签名
-            timestamp = int(time.time())
-            expiry = timestamp + 24 * 60 * 60  # 24小时有效
+# =============================================================================
+# 阻塞操作线程池与事件循环监控
+# =============================================================================
 
-            # 使用 paradex SDK 生成签名
-            auth_headers = self.paradex.account.auth_headers()
+def write_json_file(filepath: str, data: Any):
+    """写 JSON 文件 (先写临时文件再替换，避免写到一半崩溃留下损坏的文件)"""
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, filepath)
 
-            # 发送认证请求，关键是 URL 参数 token_usage=interactive
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/auth?token_usage=interactive"
 
-                headers = {
-                    "Content-Type": "application/json",
-                    **auth_headers
-                }
+class BlockingExecutor:
+    """
+    阻塞操作专用线程池
+    SDK 初始化、订单签名、同步 API 调用放到 run() 中执行；
+    状态文件写入交给单线程的 writer，按提交顺序落盘，调用方不等待
+    """
 
-                async with session.post(url, headers=headers) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        self.jwt_token = data.get("jwt_token")
+    def __init__(self, max_workers: int = 4):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sniper-blocking")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sniper-writer")
 
-                        # 解析 token 获取过期时间
-                        import base64
-                        payload = self.jwt_token.split('.')[1]
-                        # 添加 padding
-                        payload += '=' * (4 - len(payload) % 4)
-                        decoded = json.loads(base64.b64decode(payload))
+    async def run(self, func, *args):
+        """在线程池中执行阻塞函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, *args)
 
-                        self.jwt_expires_at = decoded.get("exp", 0)
-                        token_usage = decoded.get("token_usage", "unknown")
+    def submit_write(self, filepath: str, data: Any, error_msg: str = "保存状态失败"):
+        """后台写 JSON 文件 (data 必须是调用方不再修改的快照)"""
+        self.submit_call(write_json_file, filepath, data, error_msg=error_msg)
 
-                        log.info(f"认证成功! token_usage={token_usage} (应该是 interactive)")
+    def submit_call(self, func, *args, error_msg: str = "后台写入失败"):
+        """在 writer 线程按提交顺序执行写操作，调用方不等待"""
+        def call():
+            try:
+                func(*args)
+            except Exception as e:
+                log.error(f"{error_msg}: {e}")
+        self._writer.submit(call)
 
-                        if token_usage != "interactive":
-                            log.warning("警告: token_usage 不是 interactive，手续费可能不是 0!")
+    async def flush(self):
+        """等待已提交的写入全部完成"""
+        await asyncio.wrap_future(self._writer.submit(lambda: None))
 
-                        return True
-                    else:
-                        error = await resp.text()
-                        log.error(f"认证失败: {resp.status} - {error}")
-                        return False
 
-        except Exception as e:
-            log.error(f"认证异常: {e}")
-            return False
+# 全局阻塞操作线程池
+blocking = BlockingExecutor()
 
-    async def ensure_authenticated(self) -> bool:
-        """确保已认证且 token 未过期"""
-        now = int(time.time())
 
-        # token 还有至少 60 秒有效期
-        if self.jwt_token and self.jwt_expires_at > now + 60:
-            return True
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+      - 采样协程每 interval 醒来一次，实际醒来时间与预期之差即调度延迟，记入 loop_lag_ms 分位数
+      - 看门狗线程检查采样心跳，循环被阻塞超过阈值时抓取事件循环线程的调用栈并记录，定位阻塞的回调
+    """
 
-        log.info("Token 已过期或不存在，重新认证...")
-        return await self.authenticate_interactive()
+    def __init__(self, interval_s: float = 0.1, threshold_ms: float = 100):
+        self.interval_s = interval_s
+        self.threshold_ms = threshold_ms
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在当前事件循环中启动监控"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._thread = threading.Thread(target=self._watchdog, name="sniper-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监控"""
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _sample(self):
+        while True:
+            expected = time.perf_counter() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            now = time.perf_counter()
+            self._heartbeat = now
+            lag_ms = (now - expected) * 1000
+            metrics.observe("loop_lag_ms", lag_ms)
+            if lag_ms > self.threshold_ms:
+                metrics.inc("loop_lag_over_threshold")
+
+    def _watchdog(self):
+        reported = False
+        while not self._stop.wait(self.threshold_ms / 2000):
+            stalled_ms = (time.perf_counter() - self._heartbeat - self.interval_s) * 1000
+            if stalled_ms <= self.threshold_ms:
+                reported = False
+                continue
+            if reported:
+                continue
+            # 每次阻塞只记录一次调用栈
+            reported = True
+            metrics.inc("loop_stalls")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)[-8:]) if frame else "(无法获取调用栈)"
+            log.warning(f"事件循环已阻塞 {stalled_ms:.0f}ms，当前执行位置:\n{stack}")
 
-    def _get_auth_headers(self) -> Dict[str, str]:
-        """获取带认证的请求头"""
-        return {
-            "Authorization": f"Bearer {self.jwt_token}",
-            "Content-Type": "application/json"
-        }
 
-    async def get_balance(self) -> Optional[float]:
-        """获取 USDC 余额"""
-        try:
-            if not await self.ensure_authenticated():
-                return None
+class GcController:
+    """
+    低分配模式的垃圾回收控制 (LOW_ALLOC=1 启用)
+      - 启动完成后 gc.freeze(): 模块、SDK、客户端等长期对象移入永久代，之后的回收不再扫描它们
+      - 关闭自动回收，改为在两个交易周期之间 (随后就要等待) 手动回收，不会在下单、平仓途中停顿；
+        触发条件与解释器默认相同: 新生代超过阈值回收 0 代，1 代/2 代按计数逐级升级
+      - 每次回收的耗时记入 gc_pause_ms 分位数
+    未启用时不做任何事，使用解释器默认的自动回收
+    """
 
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/balance"
-                async with session.get(url, headers=self._get_auth_headers()) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        for item in data.get("results", []):
-                            if item.get("token") == "USDC":
-                                return float(item.get("size", 0))
-            return 0
-        except Exception as e:
-            log.error(f"获取余额失败: {e}")
-            return None
+    def __init__(self):
+        self.enabled = False
+        self._active = False
+        self._thresholds = gc.get_threshold()
 
-    async def get_positions(self, market: str = None) -> List[Dict]:
-        """获取持仓"""
-        try:
-            if not await self.ensure_authenticated():
-                return []
+    def start(self):
+        """启动完成后调用: 冻结已有对象并接管回收"""
+        if not self.enabled or self._active:
+            return
+        gc.collect()
+        gc.freeze()
+        self._thresholds = gc.get_threshold()
+        gc.disable()
+        self._active = True
+        metrics.set_gauge("gc_frozen_objects", gc.get_freeze_count())
+        log.info(f"低分配模式: 已冻结 {gc.get_freeze_count()} 个启动对象，垃圾回收改在交易周期之间进行")
+
+    def between_cycles(self):
+        """两个周期之间调用，按需回收"""
+        if not self._active:
+            return
+        count0, count1, count2 = gc.get_count()
+        threshold0, threshold1, threshold2 = self._thresholds
+        if count0 < threshold0:
+            return
+        if count2 >= threshold2:
+            generation = 2
+        elif count1 >= threshold1:
+            generation = 1
+        else:
+            generation = 0
+        t0 = time.perf_counter()
+        gc.collect(generation)
+        metrics.observe("gc_pause_ms", (time.perf_counter() - t0) * 1000)
+        metrics.inc(f"gc_collections_gen{generation}")
 
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/positions"
-                async with session.get(url, headers=self._get_auth_headers()) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        positions = data.get("results", [])
+    def stop(self):
+        """恢复自动回收"""
+        if self._active:
+            self._active = False
+            gc.enable()
 
-                        if market:
-                            positions = [p for p in positions if p.get("market") == market]
 
-                        # 过滤掉已关闭的仓位
-                        return [p for p in positions if p.get("status") != "CLOSED" and float(p.get("size", 0)) > 0]
-            return []
-        except Exception as e:
-            log.error(f"获取持仓失败: {e}")
-            return []
+# 全局垃圾回收控制
+gc_control = GcController()
 
-    async def get_market_info(self, market: str) -> Optional[Dict]:
-        """获取市场信息（tick size, min notional 等）"""
-        if market in self.market_info:
-            return self.market_info[market]
 
-        try:
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/markets"
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        for m in data.get("results", []):
-                            self.market_info[m.get("symbol")] = m
-                        return self.market_info.get(market)
-            return None
-        except Exception as e:
-            log.error(f"获取市场信息失败: {e}")
-            return None
+# =============================================================================
+# 共享限速状态后端
+# =============================================================================
 
-    async def get_bbo(self, market: str) -> Optional[Dict]:
-        """
-        获取最优买卖价 (Best Bid/Offer)
-        返回: {"bid": price, "ask": price, "bid_size": size, "ask_size": size}
-        """
-        try:
-            if not await self.ensure_authenticated():
-                return None
+# 限速窗口: (名称, 长度 ms)；day 按自然日计算，从当天零点起
+RATE_WINDOWS = (("sec", 1000), ("min", 60000), ("hour", 3600000), ("day", 0))
 
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                # 使用 orderbook API
-                url = f"{self.base_url}/orderbook/{market}?depth=1"
+# 账号交易记录在后端保留的时间 (ms)，比日窗口长一点，空闲账号的数据自动过期
+RATE_RETENTION_MS = 90000000
 
-                try:
-                    async with session.get(url, headers=self._get_auth_headers()) as resp:
-                        if resp.status == 200:
-                            data = await resp.json()
-
-                            # 解析 bids 和 asks 数组: [[price, size], ...]
-                            bids = data.get("bids", [])
-                            asks = data.get("asks", [])
-
-                            # 优先使用 best_bid_api/best_ask_api (格式: [price, size])
-                            best_bid = data.get("best_bid_api") or (bids[0] if bids else None)
-                            best_ask = data.get("best_ask_api") or (asks[0] if asks else None)
-
-                            if best_bid and best_ask:
-                                return {
-                                    "bid": float(best_bid[0]),
-                                    "ask": float(best_ask[0]),
-                                    "bid_size": float(best_bid[1]),
-                                    "ask_size": float(best_ask[1]),
-                                }
-                except Exception as e:
-                    log.debug(f"orderbook API 调用失败: {e}")
+# reserve 的返回值: (是否占用, 受限窗口, 各窗口用量 (sec, min, hour, day), 受限窗口解除时间 ms)
+RateDecision = Tuple[bool, Optional[str], Tuple[int, int, int, int], int]
 
-            return None
-        except Exception as e:
-            log.error(f"获取 BBO 失败: {e}")
-            return None
 
-    async def get_spread_percent(self, market: str) -> Optional[float]:
-        """计算点差百分比"""
-        bbo = await self.get_bbo(market)
-        if not bbo or not bbo["bid"] or not bbo["ask"]:
-            return None
+def _exceeded_window(counts: Tuple[int, ...], limits: Tuple[int, ...], headroom: int) -> int:
+    """按 day -> hour -> min -> sec 的顺序 (与本地限速检查一致) 找第一个超限的窗口，没有返回 -1"""
+    for i in (3, 2, 1, 0):
+        if counts[i] + headroom >= limits[i]:
+            return i
+    return -1
 
-        mid = (bbo["bid"] + bbo["ask"]) / 2
-        spread = bbo["ask"] - bbo["bid"]
-        return (spread / mid) * 100 if mid > 0 else None
 
-    async def place_limit_order(
-        self,
-        market: str,
-        side: str,  # "BUY" or "SELL"
-        size: str,
-        price: str,
-        instruction: str = "GTC",
-        reduce_only: bool = False
-    ) -> Optional[Dict]:
-        """
-        下限价单
-        使用 paradex SDK 进行签名，但通过 HTTP 发送以使用 interactive token
-        """
-        try:
-            if not await self.ensure_authenticated():
-                return None
+class RateBackend(ABC):
+    """
+    限速状态后端
+    同一账号可能被多个机器人进程 (不同市场、不同主机) 同时使用，各自的本地限速状态互相看不到，
+    都以为自己有完整的 limits_per_* 额度。共享后端把账号的交易时间戳放在进程外，
+    开仓前一次往返原子地检查各窗口并占用名额；本地检查仍然每次轮询先做，不产生 I/O
 
-            # 使用 SDK 创建并签名订单
-            from paradex_py.common.order import Order, OrderSide, OrderType
-            from decimal import Decimal
+    key 为账号地址，member 为本次交易的唯一标识 (开仓失败时据此撤销)
+    """
 
-            order_side = OrderSide.Buy if side.upper() == "BUY" else OrderSide.Sell
+    name = "local"
+    # False: 本地检查就是全部检查，不访问后端
+    shared = False
 
-            order = Order(
-                market=market,
-                order_type=OrderType.Limit,
-                order_side=order_side,
-                size=Decimal(size),
-                limit_price=Decimal(price),
-                client_id=f"sniper_{int(time.time()*1000)}",
-                instruction=instruction,
-                reduce_only=reduce_only,
-                signature_timestamp=int(time.time() * 1000),
-            )
+    @abstractmethod
+    async def reserve(
+        self, key: str, member: str, now_ms: int, day_start_ms: int,
+        limits: Tuple[int, int, int, int], headroom: int = 0,
+    ) -> RateDecision:
+        """各窗口 (已用 + headroom) 都低于限制时记入一次交易，否则返回受限窗口和解除时间"""
 
-            # 使用 SDK 签名订单并将签名赋值给订单
-            order.signature = self.paradex.account.sign_order(order)
+    @abstractmethod
+    async def record(self, key: str, member: str, now_ms: int):
+        """不检查限制直接记入一次交易 (平仓必须执行)"""
 
-            # 通过 HTTP 发送，使用我们的 interactive JWT token
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/orders"
-                payload = order.dump_to_dict()
+    @abstractmethod
+    async def release(self, key: str, member: str):
+        """撤销 reserve 占用的名额 (开仓失败)"""
 
-                async with session.post(url, headers=self._get_auth_headers(), json=payload) as resp:
-                    if resp.status == 201:
-                        result = await resp.json()
-                        log.info(f"下单成功: {side} {size} @ {price}, order_id={result.get('id')}")
+    async def close(self):
+        pass
 
-                        # 检查是否为 interactive 模式
-                        flags = result.get("flags", [])
-                        if "INTERACTIVE" in flags:
-                            log.info("确认: 订单使用 INTERACTIVE 模式 (0 手续费)")
-                        else:
-                            log.warning(f"警告: 订单 flags={flags}, 可能不是 interactive 模式")
 
-                        return result
-                    else:
-                        error = await resp.text()
-                        log.error(f"下单失败: {resp.status} - {error}")
-                        return None
+class LocalRateBackend(RateBackend):
+    """本地 JSON: 限速状态只在本进程内 (account_states.json / sniper_state.json)，不与其他进程共享"""
 
-        except Exception as e:
-            log.error(f"下单失败: {e}")
-            return None
+    async def reserve(self, key, member, now_ms, day_start_ms, limits, headroom=0) -> RateDecision:
+        return True, None, (0, 0, 0, 0), 0
 
-    async def place_market_order(
-        self,
-        market: str,
-        side: str,
-        size: str,
-        reduce_only: bool = False
-    ) -> Optional[Dict]:
-        """下市价单（用于平仓）"""
-        try:
-            if not await self.ensure_authenticated():
-                return None
-
-            from paradex_py.common.order import Order, OrderSide, OrderType
-            from decimal import Decimal
+    async def record(self, key: str, member: str, now_ms: int):
+        pass
 
-            order_side = OrderSide.Buy if side.upper() == "BUY" else OrderSide.Sell
+    async def release(self, key: str, member: str):
+        pass
 
-            order = Order(
-                market=market,
-                order_type=OrderType.Market,
-                order_side=order_side,
-                size=Decimal(size),
-                client_id=f"sniper_mkt_{int(time.time()*1000)}",
-                reduce_only=reduce_only,
-                signature_timestamp=int(time.time() * 1000),
-            )
-
-            # 使用 SDK 签名订单并将签名赋值给订单
-            order.signature = self.paradex.account.sign_order(order)
-
-            # 通过 HTTP 发送，使用我们的 interactive JWT token
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.base_url}/orders"
-                payload = order.dump_to_dict()
 
-                async with session.post(url, headers=self._get_auth_headers(), json=payload) as resp:
-                    if resp.status == 201:
-                        result = await resp.json()
-                        log.info(f"市价单成功: {side} {size}, order_id={result.get('id')}")
-                        return result
-                    else:
-                        error = await resp.text()
-                        log.error(f"市价单失败: {resp.status} - {error}")
-                        return None
+class SqliteRateBackend(RateBackend):
+    """
+    SQLite (WAL 模式): 同一台机器上的多个进程共享额度
+    检查和占用在一个 BEGIN IMMEDIATE 事务里完成，进程间由 SQLite 的写锁串行；
+    数据库调用在线程池中执行，不阻塞事件循环
+    """
 
-        except Exception as e:
-            log.error(f"市价单失败: {e}")
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_trades ("
+                "member TEXT PRIMARY KEY, account TEXT NOT NULL, ts INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rate_trades_account_ts ON rate_trades (account, ts)")
+            self._conn = conn
+        return self._conn
+
+    def _reserve_sync(self, key, member, now_ms, day_start_ms, limits, headroom) -> RateDecision:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM rate_trades WHERE account = ? AND ts <= ?", (key, now_ms - RATE_RETENTION_MS))
+                row = conn.execute(
+                    "SELECT COUNT(*) FILTER (WHERE ts > ?), COUNT(*) FILTER (WHERE ts > ?), "
+                    "COUNT(*) FILTER (WHERE ts > ?), COUNT(*) FILTER (WHERE ts >= ?) "
+                    "FROM rate_trades WHERE account = ? AND ts > ?",
+                    (now_ms - 1000, now_ms - 60000, now_ms - 3600000, day_start_ms, key, now_ms - 86400000),
+                ).fetchone()
+                counts = tuple(row)
+                i = _exceeded_window(counts, limits, headroom)
+                retry_at = 0
+                if i < 0:
+                    conn.execute("INSERT INTO rate_trades VALUES (?, ?, ?)", (member, key, now_ms))
+                elif i < 3:
+                    # 窗口内第 excess+1 旧的交易滑出窗口后，用量降到限制以下
+                    window_ms = RATE_WINDOWS[i][1]
+                    oldest = conn.execute(
+                        "SELECT ts FROM rate_trades WHERE account = ? AND ts > ? ORDER BY ts LIMIT 1 OFFSET ?",
+                        (key, now_ms - window_ms, counts[i] + headroom - limits[i]),
+                    ).fetchone()
+                    retry_at = (oldest[0] if oldest else now_ms) + window_ms + 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return i < 0, RATE_WINDOWS[i][0] if i >= 0 else None, counts, retry_at
+
+    def _execute_sync(self, sql: str, params: tuple):
+        with self._lock:
+            self._connection().execute(sql, params)
+
+    async def reserve(self, key, member, now_ms, day_start_ms, limits, headroom=0) -> RateDecision:
+        return await blocking.run(self._reserve_sync, key, member, now_ms, day_start_ms, limits, headroom)
+
+    async def record(self, key: str, member: str, now_ms: int):
+        await blocking.run(self._execute_sync, "INSERT OR IGNORE INTO rate_trades VALUES (?, ?, ?)", (member, key, now_ms))
+
+    async def release(self, key: str, member: str):
+        await blocking.run(self._execute_sync, "DELETE FROM rate_trades WHERE member = ?", (member,))
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RedisError(Exception):
+    """Redis 返回的错误响应"""
+
+
+def _resp_command(args: Tuple[Any, ...]) -> bytes:
+    """编码为 RESP 命令 (bulk string 数组)"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _resp_read(reader: asyncio.StreamReader) -> Any:
+    """读取一个 RESP 响应，错误响应返回 RedisError 实例 (不抛出，连接仍可继续使用)"""
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        return RedisError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        size = int(body)
+        if size < 0:
             return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if kind == b"*":
+        size = int(body)
+        if size < 0:
+            return None
+        return [await _resp_read(reader) for _ in range(size)]
+    raise RedisError(f"无法解析的响应: {line[:64]!r}")
 
-    async def cancel_order(self, order_id: str) -> bool:
-        """取消订单"""
-        try:
-            if not await self.ensure_authenticated():
-                return False
-
-            self.paradex.api_client.cancel_order(order_id)
-            log.info(f"订单已取消: {order_id}")
-            return True
-
-        except Exception as e:
-            log.error(f"取消订单失败: {e}")
-            return False
 
-    async def cancel_all_orders(self, market: str = None) -> int:
-        """取消所有挂单"""
-        try:
-            if not await self.ensure_authenticated():
-                return 0
+class RedisRateBackend(RateBackend):
+    """
+    Redis 协议服务器: 多台主机共享额度
+    每个账号一个有序集合 (score 为交易时间 ms)；检查和占用由 Lua 脚本在服务端原子执行，
+    用 EVALSHA 发送，一次往返；服务端没有缓存脚本时回退 EVAL
+    只用到 RESP 的基本命令，自带极简客户端，不依赖 redis 库
+    """
 
-            import aiohttp
-            async with aiohttp.ClientSession() as session:
-                # 获取所有挂单
-                url = f"{self.base_url}/orders"
-                params = {"status": "OPEN"}
-                if market:
-                    params["market"] = market
+    name = "redis"
+    shared = True
+
+    # KEYS[1]: 账号；ARGV: member, now_ms, day_start_ms, headroom, sec/min/hour/day 限制
+    # 返回 {是否占用, 受限窗口序号 (1-4, 0 为未受限), sec, min, hour, day 用量, 解除时间 ms}
+    RESERVE_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[2])
+local headroom = tonumber(ARGV[4])
+local windows = {1000, 60000, 3600000}
+redis.call('ZREMRANGEBYSCORE', key, '-inf', string.format('%d', now - 90000000))
+local counts = {}
+for i = 1, 3 do
+  counts[i] = redis.call('ZCOUNT', key, string.format('(%d', now - windows[i]), '+inf')
+end
+counts[4] = redis.call('ZCOUNT', key, ARGV[3], '+inf')
+for i = 4, 1, -1 do
+  local excess = counts[i] + headroom - tonumber(ARGV[4 + i])
+  if excess >= 0 then
+    local retry = 0
+    if i < 4 then
+      retry = now + windows[i] + 1
+      local oldest = redis.call('ZRANGEBYSCORE', key, string.format('(%d', now - windows[i]), '+inf',
+        'WITHSCORES', 'LIMIT', excess, 1)
+      if oldest[2] then retry = tonumber(oldest[2]) + windows[i] + 1 end
+    end
+    return {0, i, counts[1], counts[2], counts[3], counts[4], retry}
+  end
+end
+redis.call('ZADD', key, now, ARGV[1])
+redis.call('PEXPIRE', key, 90000000)
+return {1, 0, counts[1], counts[2], counts[3], counts[4], 0}
+"""
 
-                async with session.get(url, headers=self._get_auth_headers(), params=params) as resp:
-                    if resp.status != 200:
-                        return 0
-                    data = await resp.json()
-                    orders = data.get("results", [])
-
-                if not orders:
-                    log.info("没有挂单需要取消")
-                    return 0
-
-                # 取消所有订单
-                cancelled = 0
-                for order in orders:
-                    order_id = order.get("id")
-                    if order_id:
-                        cancel_url = f"{self.base_url}/orders/{order_id}"
-                        async with session.delete(cancel_url, headers=self._get_auth_headers()) as cancel_resp:
-                            if cancel_resp.status in [200, 204]:
-                                cancelled += 1
-
-                log.info(f"已取消 {cancelled}/{len(orders)} 个挂单")
-                return cancelled
+    RECORD_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('PEXPIRE', KEYS[1], 90000000)
+return 1
+"""
 
-        except Exception as e:
-            log.error(f"取消所有订单失败: {e}")
-            return 0
+    def __init__(self, url: str, prefix: str = "sniper:rate:"):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # 一条连接上同一时刻只有一个请求
+        self._lock = asyncio.Lock()
+        self._sha = {
+            script: hashlib.sha1(script.encode()).hexdigest()
+            for script in (self.RESERVE_SCRIPT, self.RECORD_SCRIPT)
+        }
 
-    async def close_all_positions(self, market: str = None) -> int:
-        """平掉所有仓位"""
+    async def _connect(self):
+        """连接并认证、选库；任何一步失败都丢弃连接，下次调用从头重连 (不会在未认证或错误的库上继续)"""
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
         try:
-            if not await self.ensure_authenticated():
-                return 0
-
-            positions = await self.get_positions()
-            if not positions:
-                log.info("没有仓位需要平仓")
-                return 0
+            if self.password:
+                await self._request("AUTH", self.password)
+            if self.db:
+                await self._request("SELECT", self.db)
+        except BaseException:
+            self._drop()
+            raise
 
-            closed = 0
-            for pos in positions:
-                pos_market = pos.get("market")
-                if market and pos_market != market:
-                    continue
+    async def _request(self, *args) -> Any:
+        self._writer.write(_resp_command(args))
+        reply = await _resp_read(self._reader)
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
 
-                size = pos.get("size", "0")
-                side = pos.get("side", "")
+    async def call(self, *args) -> Any:
+        """执行一条命令 (首次调用时连接；连接出错时丢弃，下次调用重连)"""
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._request(*args)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                self._drop()
+                raise
+            except asyncio.CancelledError:
+                # 响应可能还在路上，连接状态不确定
+                self._drop()
+                raise
 
-                if float(size) == 0:
-                    continue
+    async def _eval(self, script: str, key: str, *args) -> Any:
+        try:
+            return await self.call("EVALSHA", self._sha[script], 1, key, *args)
+        except RedisError as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+            return await self.call("EVAL", script, 1, key, *args)
+
+    def _drop(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def reserve(self, key, member, now_ms, day_start_ms, limits, headroom=0) -> RateDecision:
+        ok, i, sec, minute, hour, day, retry_at = await self._eval(
+            self.RESERVE_SCRIPT, self.prefix + key, member, now_ms, day_start_ms, headroom, *limits
+        )
+        return bool(ok), RATE_WINDOWS[i - 1][0] if i else None, (sec, minute, hour, day), retry_at
 
-                # 平仓方向与持仓相反
-                close_side = "SELL" if side == "LONG" else "BUY"
+    async def record(self, key: str, member: str, now_ms: int):
+        await self._eval(self.RECORD_SCRIPT, self.prefix + key, member, now_ms)
 
-                result = await self.place_market_order(
-                    market=pos_market,
-                    side=close_side,
-                    size=size,
-                    reduce_only=True
-                )
+    async def release(self, key: str, member: str):
+        await self.call("ZREM", self.prefix + key, member)
 
-                if result:
-                    closed += 1
-                    log.info(f"已平仓 {pos_market}: {close_side} {size}")
+    async def close(self):
+        async with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                try:
+                    await self._writer.wait_closed()
+                except Exception:
+                    pass
+                self._reader = self._writer = None
 
-            log.info(f"已平仓 {closed} 个仓位")
-            return closed
 
-        except Exception as e:
-            log.error(f"平仓所有仓位失败: {e}")
-            return 0
+def create_rate_backend(spec: str) -> RateBackend:
+    """
+    按 RATE_BACKEND 创建限速状态后端
+      空 / local: 本地 JSON (默认，不共享)
+      sqlite:路径: 同机多进程共享，如 sqlite:rate_state.db
+      redis://[:密码@]主机:端口/库: 多主机共享
+    """
+    spec = spec.strip()
+    if not spec or spec == "local":
+        return LocalRateBackend()
+    if spec.startswith("sqlite:"):
+        backend = SqliteRateBackend(spec[len("sqlite:"):] or "rate_state.db")
+    elif spec.startswith("redis://"):
+        backend = RedisRateBackend(spec)
+    else:
+        raise ValueError(f"不支持的 RATE_BACKEND: {spec}")
+    log.info(f"共享限速后端: {backend.name} ({spec.split('@')[-1]})")
+    return backend
 
 
 # =============================================================================
-# 交易机器人主逻辑
+# 按需性能剖析 (SIGUSR1)
 # =============================================================================
 
-class SniperBot:
-    """狙击机器人 - 对应原脚本的主循环逻辑"""
+class AsyncProfiler:
+    """
+    采样式剖析器，收到 SIGUSR1 后在后台线程采样 PROFILE_SECONDS 秒 (默认 30)
+      - 每 PROFILE_INTERVAL_MS 毫秒 (默认 5) 抓一次各线程调用栈
+      - 事件循环线程的样本按当时正在执行的 asyncio 任务归类 (run_cycle、下单、报告等)
+      - 线程池中的签名/写文件单独归类到各自线程
+      - 结果写为 flamegraph 折叠栈格式 (flamegraph.pl / speedscope 可直接打开)
+    未触发时只有一个信号处理器，没有任何额外开销
+    """
 
-    def __init__(
-        self,
-        client: ParadexInteractiveClient,
-        config: TradingConfig,
-        account_manager: Optional[AccountManager] = None
-    ):
-        self.client = client
-        self.config = config
-        self.stats = Stats()
-        self.rate_state = RateLimitState()
-        self.account_manager = account_manager
+    # 空闲线程的栈顶函数 (线程池等任务、看门狗休眠)，不计入样本
+    IDLE_FUNCS = {"_worker", "wait", "_wait_for_tstate_lock"}
 
-        # 加载持久化数据
-        self._load_state()
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
 
-        # 注意: account_manager 的状态应该在 main() 中提前加载
-        # 这样确保 client 与 current_index 同步
-        # 这里只同步 rate_state
-        if self.account_manager:
-            self.rate_state = self.account_manager.get_current_rate_state()
+    def trigger(self):
+        """开始一次剖析 (在事件循环线程的信号处理器中调用)"""
+        if self._thread and self._thread.is_alive():
+            log.info("性能剖析进行中，忽略本次信号")
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        duration_s = float(os.getenv("PROFILE_SECONDS", "30"))
+        interval_s = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        path = f"profile_{os.getpid()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(threading.get_ident(), loop, duration_s, interval_s, path),
+            name="sniper-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+        log.info(f"开始性能剖析: {duration_s:.0f} 秒, 采样间隔 {interval_s * 1000:.0f}ms -> {path}")
 
-    def _load_state(self):
-        """加载持久化状态"""
+    @staticmethod
+    def _task_label(loop) -> str:
+        """事件循环线程当前正在执行的任务"""
         try:
-            if os.path.exists("sniper_state.json"):
-                with open("sniper_state.json", "r") as f:
-                    data = json.load(f)
-                    self.stats = Stats(**data.get("stats", {}))
-                    self.rate_state = RateLimitState(**data.get("rate_state", {}))
-        except Exception as e:
-            log.warning(f"加载状态失败: {e}")
+            task = asyncio.current_task(loop) if loop else None
+        except RuntimeError:
+            task = None
+        if task is None:
+            return "loop"
+        name = task.get_name()
+        if name.startswith("Task-"):
+            coro = task.get_coro()
+            name = getattr(coro, "__qualname__", None) or type(coro).__name__
+        return f"task:{name}"
+
+    @staticmethod
+    def _fold(frame) -> List[str]:
+        """调用栈展开为由外到内的函数列表"""
+        stack = []
+        while frame is not None and len(stack) < 64:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self, loop_thread_id: int, loop, duration_s: float, interval_s: float, path: str):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        by_label: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + duration_s
+
+        # 采样线程要等其他线程让出 GIL 才能运行，默认 5ms 的切换间隔会让样本偏向
+        # 事件循环主动让出 GIL 的 select；剖析期间临时缩短切换间隔
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, interval_s / 10))
+        try:
+            while time.monotonic() < deadline and not _shutdown_requested:
+                for tid, frame in sys._current_frames().items():
+                    if tid == me:
+                        continue
+                    if tid == loop_thread_id:
+                        label = self._task_label(loop)
+                    elif frame.f_code.co_name in self.IDLE_FUNCS:
+                        continue
+                    else:
+                        if tid not in names:
+                            names = {t.ident: t.name for t in threading.enumerate()}
+                        label = f"thread:{names.get(tid, tid)}"
+                    stacks[";".join([label] + self._fold(frame))] += 1
+                    by_label[label] += 1
+                samples += 1
+                time.sleep(interval_s)
+        finally:
+            sys.setswitchinterval(switch_interval)
 
-    def _save_state(self):
-        """保存持久化状态"""
         try:
-            data = {
-                "stats": {
-                    "is_running": self.stats.is_running,
-                    "runs": self.stats.runs,
-                    "total_wear": self.stats.total_wear,
-                    "total_volume": self.stats.total_volume,
-                },
-                "rate_state": {
-                    "day": self.rate_state.day,
-                    "trades": self.rate_state.trades[-1000:],  # 只保留最近1000条
-                }
-            }
-            with open("sniper_state.json", "w") as f:
-                json.dump(data, f)
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
         except Exception as e:
-            log.warning(f"保存状态失败: {e}")
+            log.error(f"写入剖析结果失败: {e}")
+            return
 
-    def _day_key(self) -> str:
-        """获取当天日期键"""
-        return datetime.now().strftime("%Y-%m-%d")
+        top = ", ".join(f"{label} {count * 100 / max(samples, 1):.0f}%" for label, count in by_label.most_common(5))
+        log.info(f"性能剖析完成: {samples} 次采样 -> {path}")
+        log.info(f"  样本占比: {top}")
 
-    def _prune_trades(self):
-        """清理过期的交易记录"""
-        cutoff = int(time.time() * 1000) - 86400000  # 24小时前
-        self.rate_state.trades = [t for t in self.rate_state.trades if t > cutoff]
 
-    def _count_trades_in_window(self, window_ms: int) -> int:
-        """统计时间窗口内的交易数"""
-        cutoff = int(time.time() * 1000) - window_ms
-        return len([t for t in self.rate_state.trades if t > cutoff])
+profiler = AsyncProfiler()
 
-    def _can_trade(self) -> tuple[bool, Optional[str], Dict]:
-        """检查是否可以交易（限速检查）"""
-        # 如果使用多账号管理器
-        if self.account_manager:
-            return self._can_trade_multi_account()
 
-        # 单账号模式（原逻辑）
-        # 检查日期是否变化
-        if self.rate_state.day != self._day_key():
-            self.rate_state.day = self._day_key()
-            self.rate_state.trades = []
+# =============================================================================
+# 周期追踪 (span)
+# =============================================================================
 
-        self._prune_trades()
+class Span:
+    """一个计时区间，属于某条 trace，可嵌套"""
 
-        usage = {
-            "sec": self._count_trades_in_window(1000),
-            "min": self._count_trades_in_window(60000),
-            "hour": self._count_trades_in_window(3600000),
-            "day": len(self.rate_state.trades),
-        }
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
 
-        if usage["day"] >= self.config.limits_per_day:
-            return False, "day", usage
-        if usage["hour"] >= self.config.limits_per_hour:
-            return False, "hour", usage
-        if usage["min"] >= self.config.limits_per_minute:
-            return False, "min", usage
-        if usage["sec"] >= self.config.limits_per_second:
-            return False, "sec", usage
+    def __init__(self, trace: 'Trace', name: str, parent_id: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
 
-        return True, None, usage
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
 
-    def _can_trade_multi_account(self) -> tuple[bool, Optional[str], Dict]:
-        """多账号模式的限速检查"""
-        # 使用当前账号的限速状态
-        self.rate_state = self.account_manager.get_current_rate_state()
 
-        # 检查日期是否变化
-        if self.rate_state.day != self._day_key():
-            self.rate_state.day = self._day_key()
-            self.rate_state.trades = []
+class Trace:
+    """一个交易周期的全部 span，公共属性 (账号、市场) 写到每个 span 上"""
 
-        self._prune_trades()
+    __slots__ = ("trace_id", "attributes", "spans")
 
-        usage = {
-            "sec": self._count_trades_in_window(1000),
-            "min": self._count_trades_in_window(60000),
-            "hour": self._count_trades_in_window(3600000),
-            "day": len(self.rate_state.trades),
-            "account": self.account_manager.get_current_account_name(),
-        }
+    def __init__(self, attributes: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        self.attributes = attributes
+        self.spans: List[Span] = []
 
-        # 检查是否达到日限制 (1000单)，如果所有账号都满了就停止
-        if usage["day"] >= self.config.limits_per_day:
-            log.info(f"{usage['account']} 达到日限制 ({usage['day']}/{self.config.limits_per_day})")
 
-            # 检查是否所有账号的 day 限制都满了
-            if self.account_manager.all_accounts_exhausted():
-                return False, "all_accounts_exhausted", usage
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("sniper_span", default=None)
+_NO_SPAN = nullcontext()
 
-            # 标记需要切换账号 (hour 限制触发切换，day 限制不切换只是等待)
-            return False, "day_limit_wait", usage
 
-        # 检查是否达到小时限制 (300单)，触发账号轮换
-        if usage["hour"] >= self.config.limits_per_hour:
-            log.info(f"{usage['account']} 达到小时限制 ({usage['hour']}/{self.config.limits_per_hour})，需要切换账号...")
-            return False, "hour_switch", usage
-        if usage["min"] >= self.config.limits_per_minute:
-            return False, "min", usage
-        if usage["sec"] >= self.config.limits_per_second:
-            return False, "sec", usage
+class _SpanScope:
+    """进入时把 span 设为当前 span，退出时记录结束时间和异常"""
 
-        return True, None, usage
+    __slots__ = ("span", "_token")
 
-    def _record_trade(self):
-        """记录一次交易"""
-        self.rate_state.trades.append(int(time.time() * 1000))
+    def __init__(self, span: Span):
+        self.span = span
 
-        # 如果使用多账号管理器，也记录到管理器中并保存
-        if self.account_manager:
-            self.account_manager.save_state()
-        else:
-            self._save_state()
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end_ns = time.time_ns()
+        if exc is not None:
+            self.span.error = repr(exc)
+        _current_span.reset(self._token)
+        return False
 
-    async def _open_position(self) -> tuple[bool, str]:
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """属性值转为 OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """
+    交易周期追踪
+      - run_cycle 开始一条 trace，内部用 tracer.span(name) 记录嵌套区间 (contextvars 传递父 span)
+      - 周期结束后采样: 有下单的周期全部保留，其余按 TRACE_SAMPLE_RATE 抽样 (默认 1%)
+      - 保留的 trace 编码为 OTLP JSON (每行一个 resourceSpans 文档)，攒批后由 writer 线程追加到文件
+      - 文件超过 TRACE_MAX_MB 时轮转，保留 3 个旧文件
+    不在 trace 中时 span() 直接返回空上下文
+    """
+
+    def __init__(self):
+        self.filepath = ""
+        self.sample_rate = 0.01
+        self.max_bytes = 20 * 1024 * 1024
+        self.backups = 3
+        self.flush_every = 20
+        self._pending: List[bytes] = []
+
+    def configure(self, filepath: str, sample_rate: float = 0.01, max_mb: float = 20):
+        """filepath 为空时关闭追踪"""
+        self.filepath = filepath
+        self.sample_rate = sample_rate
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    def start_trace(self, name: str, **attributes):
+        """开始一条 trace，返回根 span 的上下文 (关闭时返回空上下文，as 得到 None)"""
+        if not self.filepath:
+            return _NO_SPAN
+        trace = Trace(attributes)
+        root = Span(trace, name, "", {})
+        trace.spans.append(root)
+        return _SpanScope(root)
+
+    def span(self, name: str, **attributes):
+        """在当前 trace 中开始一个子 span"""
+        parent = _current_span.get()
+        if parent is None:
+            return _NO_SPAN
+        child = Span(parent.trace, name, parent.span_id, attributes)
+        parent.trace.spans.append(child)
+        return _SpanScope(child)
+
+    def finish(self, root: Optional[Span], keep: bool = False):
         """
-        开仓逻辑
-        使用 Last Price 下限价单
+        周期结束: 按采样规则决定是否保留
+        之后清空 span 列表，断开 trace 与 span 的引用环，丢弃的 trace 立即释放而不是留给 GC
         """
+        if root is None:
+            return
+        trace = root.trace
+        if keep or root.error is not None or random.random() < self.sample_rate:
+            metrics.inc("traces_sampled")
+            self._pending.append(json_dumps(self._encode(trace)))
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+        trace.spans.clear()
+
+    def flush(self):
+        """把已保留的 trace 交给 writer 线程写入"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        blocking.submit_call(self._append, batch, error_msg="写入 trace 失败")
+
+    def _encode(self, trace: Trace) -> Dict[str, Any]:
+        spans = []
+        for span in trace.spans:
+            attributes = {**trace.attributes, **span.attributes}
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": "jess-sniper"}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "sniper_bot"}, "spans": spans}],
+        }]}
+
+    def _append(self, lines: List[bytes]):
+        """追加写入，超过大小上限时先轮转 (writer 线程)"""
         try:
-            market = self.config.market
+            if os.path.getsize(self.filepath) >= self.max_bytes:
+                for i in range(self.backups - 1, 0, -1):
+                    if os.path.exists(f"{self.filepath}.{i}"):
+                        os.replace(f"{self.filepath}.{i}", f"{self.filepath}.{i + 1}")
+                os.replace(self.filepath, f"{self.filepath}.1")
+        except FileNotFoundError:
+            pass
+        with open(self.filepath, "ab") as f:
+            for line in lines:
+                f.write(line)
+                f.write(b"\n")
 
-            # 获取市场信息
-            market_info = await self.client.get_market_info(market)
-            if not market_info:
-                return False, "无法获取市场信息"
 
-            tick_size = Decimal(market_info.get("price_tick_size", "0.1"))
-            size_increment = Decimal(market_info.get("order_size_increment", "0.0001"))
-            min_notional = float(market_info.get("min_notional", 10))
+# 全局追踪器 (main 中按环境变量配置)
+tracer = Tracer()
 
-            # 获取 BBO
-            bbo = await self.client.get_bbo(market)
-            if not bbo:
-                return False, "无法获取 BBO"
 
-            # 获取余额
-            balance = await self.client.get_balance()
-            if not balance or balance < min_notional:
-                return False, f"余额不足: {balance}"
+# =============================================================================
+# 配置热加载
+# =============================================================================
 
-            mid_price = (bbo["bid"] + bbo["ask"]) / 2
+# 不能热更新的字段: 市场 (持仓和精度缓存都与市场绑定)、运行状态
+_CONFIG_FIXED_FIELDS = {"market", "enabled"}
 
-            # 计算开仓大小
-            if self.config.fixed_size:
-                # 使用固定大小
-                size = Decimal(self.config.fixed_size)
-            else:
-                # 按余额百分比计算
-                trade_value = balance * (self.config.open_size_percent / 100)
-                size = Decimal(str(trade_value / mid_price))
 
-            # 对齐到 size_increment
-            size = (size / size_increment).quantize(Decimal('1'), rounding=ROUND_DOWN) * size_increment
+def _read_config_file(filepath: str) -> Optional[Dict[str, Any]]:
+    """读取配置文件，不存在时返回 None"""
+    try:
+        with open(filepath, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not isinstance(data, dict):
+        raise ValueError("配置文件必须是 JSON 对象")
+    return data
 
-            if float(size) * mid_price < min_notional:
-                return False, f"订单金额低于最小值 {min_notional}"
 
-            # 使用 mid price 作为限价（对齐到 tick_size）
-            price = Decimal(str(mid_price))
-            price = (price / tick_size).quantize(Decimal('1'), rounding=ROUND_DOWN) * tick_size
+def apply_config_overrides(config: TradingConfig, data: Dict[str, Any]) -> TradingConfig:
+    """
+    校验配置文件内容并返回新的 TradingConfig (原配置不变)
+    校验失败抛出 ValueError，列出全部错误
+    """
+    types = {f.name: f.type for f in fields(TradingConfig)}
+    errors = []
+    changes: Dict[str, Any] = {}
 
-            # 下单
-            result = await self.client.place_limit_order(
-                market=market,
-                side="BUY",
-                size=str(size),
-                price=str(price),
-                instruction="GTC"
-            )
+    for key, value in data.items():
+        if key not in types:
+            errors.append(f"未知字段 {key}")
+            continue
+        if key in _CONFIG_FIXED_FIELDS:
+            if value != getattr(config, key):
+                errors.append(f"{key} 不支持热更新")
+            continue
+        expected = types[key]
+        if isinstance(value, bool) or value is None:
+            errors.append(f"{key} 类型错误: {value!r}")
+        elif expected is float and isinstance(value, (int, float)):
+            changes[key] = float(value)
+        elif expected is int and isinstance(value, int):
+            changes[key] = value
+        elif expected is str and isinstance(value, (str, int, float)):
+            changes[key] = str(value).strip()
+        else:
+            errors.append(f"{key} 类型错误: {value!r}")
+
+    new = replace(config, **changes)
+
+    for key in ("spread_threshold_percent", "close_spread_target", "cycle_every_ms"):
+        if getattr(new, key) <= 0:
+            errors.append(f"{key} 必须大于 0")
+    for key in ("min_order_book_size_usd", "close_timeout_ms", "price_offset"):
+        if getattr(new, key) < 0:
+            errors.append(f"{key} 不能为负数")
+    if new.max_open_positions < 1:
+        errors.append("max_open_positions 必须大于等于 1")
+    if not 0 < new.open_size_percent <= 100:
+        errors.append("open_size_percent 必须在 1-100 之间")
+    if new.fixed_size:
+        try:
+            if Decimal(new.fixed_size) <= 0:
+                errors.append("fixed_size 必须大于 0")
+        except ArithmeticError:
+            errors.append(f"fixed_size 格式错误: {new.fixed_size!r}")
+    limits = (new.limits_per_second, new.limits_per_minute, new.limits_per_hour, new.limits_per_day)
+    if min(limits) < 1 or list(limits) != sorted(limits):
+        errors.append("限速需满足 1 <= 每秒 <= 每分钟 <= 每小时 <= 每天")
 
-            if result:
-                return True, f"开仓成功: {size} @ {price}"
-            else:
-                return False, "下单失败"
+    if errors:
+        raise ValueError("; ".join(errors))
+    return new
 
-        except Exception as e:
-            return False, f"开仓异常: {e}"
 
-    async def _close_position(self) -> tuple[bool, str]:
-        """
-        平仓逻辑
-        智能择时：点差 <= 目标点差时平仓，或超时强制平仓
-        """
+class ConfigWatcher:
+    """
+    轮询配置文件的修改时间，变化时读取并校验
+    校验通过的新配置交给 SniperBot 在两个周期之间整体替换
+    """
+
+    def __init__(self, filepath: str, interval_s: float = 2.0):
+        self.filepath = filepath
+        self.interval_s = interval_s
+        self._mtime: Optional[float] = None
+
+    def mark_loaded(self):
+        """记录当前文件版本 (启动时已加载过，不再重复应用)"""
         try:
-            market = self.config.market
-            start_time = time.time() * 1000
+            self._mtime = os.stat(self.filepath).st_mtime_ns
+        except OSError:
+            self._mtime = None
 
-            while True:
-                # 检查是否超时
-                elapsed = time.time() * 1000 - start_time
+    async def watch(self, get_config, on_change):
+        """
+        get_config() 返回当前配置，on_change(new_config) 接收校验通过的新配置
+        文件暂时不可读 (权限、IO 错误) 时记录日志并继续轮询，恢复后重新读取
+        """
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                mtime = os.stat(self.filepath).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                log.warning(f"读取配置文件 {self.filepath} 状态失败: {e}")
+                continue
+            if mtime == self._mtime:
+                continue
+            previous, self._mtime = self._mtime, mtime
+            try:
+                data = await blocking.run(_read_config_file, self.filepath)
+                if data is None:
+                    continue
+                on_change(apply_config_overrides(get_config(), data))
+            except (ValueError, json.JSONDecodeError) as e:
+                metrics.inc("config_reload_rejected")
+                log.error(f"配置文件 {self.filepath} 无效，保持原配置: {e}")
+            except OSError as e:
+                # 没读到内容，下次轮询重试 (修复权限不一定会改变修改时间)
+                self._mtime = previous
+                log.warning(f"读取配置文件 {self.filepath} 失败，稍后重试: {e}")
 
-                # 获取当前点差
-                spread = await self.client.get_spread_percent(market)
 
-                # 满足平仓条件：点差足够小 或 超时
-                can_close = (
-                    (spread is not None and spread <= self.config.close_spread_target) or
-                    (elapsed > self.config.close_timeout_ms)
-                )
+# =============================================================================
+# 序列化
+# =============================================================================
 
-                if not can_close:
-                    await asyncio.sleep(0.2)
-                    continue
+async def read_json(resp) -> Any:
+    """用 json_loads 解析响应体 (替代 aiohttp 的 resp.json())"""
+    return json_loads(await resp.read())
 
-                # 获取当前持仓
-                positions = await self.client.get_positions(market)
-                if not positions:
-                    return True, "无持仓需要平仓"
 
-                pos = positions[0]
-                size = pos.get("size", "0")
-                side = pos.get("side", "LONG")
+def decode_jwt_payload(token: str) -> Dict[str, Any]:
+    """解析 JWT 的 payload 部分 (base64url，不校验签名)"""
+    payload = token.split(".")[1]
+    return json_loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
 
-                if float(size) <= 0:
-                    return True, "持仓已关闭"
+
+class OrderTemplate:
+    """
+    订单载荷模板
+    同一市场/方向/类型的订单只有 size、price、client_id、签名和时间戳会变化，
+    其余字段预先构建好，下单时复制后填入变化的字段，替代 Order.dump_to_dict()
+    生成的字段与 dump_to_dict() 完全一致
+    """
+
+    __slots__ = ("market", "order_type", "side", "is_limit", "_static")
+
+    def __init__(self, market: str, order_type: str, side: str, instruction: str = "GTC", reduce_only: bool = False):
+        self.market = market
+        self.order_type = order_type
+        self.side = side
+        self.is_limit = order_type == "LIMIT"
+        self._static: Dict[str, Any] = {
+            "market": market,
+            "side": side,
+            "type": order_type,
+            "instruction": instruction,
+            "recv_window": None,
+            "stp": None,
+        }
+        if reduce_only:
+            self._static["flags"] = ["REDUCE_ONLY"]
+
+    def build(
+        self,
+        size: str,
+        price: Optional[str],
+        client_id: str,
+        signature: str,
+        signature_timestamp: int,
+    ) -> Dict[str, Any]:
+        """填入变化的字段，返回可直接发送的载荷"""
+        payload = self._static.copy()
+        payload["size"] = size
+        payload["client_id"] = client_id
+        payload["signature"] = signature
+        payload["signature_timestamp"] = signature_timestamp
+        if self.is_limit:
+            payload["price"] = price
+        return payload
+
+
+# =============================================================================
+# 交易所时钟同步
+# =============================================================================
+
+class ClockSync:
+    """
+    交易所时钟偏移估计
+    通过 GET /system/time 采样: offset = 服务器时间 - 本地请求往返中点，取 RTT 最小的样本，EWMA 平滑
+    端点不可用时退化为响应 Date 头 (秒级精度)
+    签名时间戳、client_id、JWT 过期判断都应通过它取时间
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        alpha: float = 0.2,
+        samples: int = 3,
+        resync_interval_s: float = 300,
+    ):
+        self.base_url = base_url
+        self.alpha = alpha                        # EWMA 平滑系数
+        self.samples = samples                    # 每次同步的采样次数
+        self.resync_interval_s = resync_interval_s
+
+        self.offset_ms: float = 0.0               # 交易所时间 - 本地时间
+        self.rtt_ms: Optional[float] = None
+        self.precise = False                      # 是否已有 /system/time 的精确样本
+        self.last_sync_at: float = 0              # 上次同步 (monotonic 秒)
+        self._last_sync_wall: float = 0           # 上次同步 (本地墙钟秒，用于计算漂移)
+        self._resync_task: Optional[asyncio.Task] = None
+
+    def now_ms(self) -> int:
+        """交易所时间 (毫秒)"""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def now(self) -> int:
+        """交易所时间 (秒)"""
+        return int(time.time() + self.offset_ms / 1000)
+
+    def is_stale(self) -> bool:
+        """是否需要重新同步"""
+        return time.monotonic() - self.last_sync_at > self.resync_interval_s
+
+    def _update(self, offset_ms: float, rtt_ms: Optional[float]):
+        """合并一个新的偏移估计"""
+        wall = time.time()
+        if self.last_sync_at == 0:
+            smoothed = offset_ms
+        else:
+            smoothed = self.offset_ms + self.alpha * (offset_ms - self.offset_ms)
+
+        # 漂移: 相邻两次同步之间偏移的变化率 (ms/小时)
+        if self._last_sync_wall and wall > self._last_sync_wall:
+            hours = (wall - self._last_sync_wall) / 3600
+            metrics.set_gauge("clock_drift_ms_per_hour", (smoothed - self.offset_ms) / hours)
+
+        self.offset_ms = smoothed
+        if rtt_ms is not None:
+            self.rtt_ms = rtt_ms if self.rtt_ms is None else self.rtt_ms + self.alpha * (rtt_ms - self.rtt_ms)
+            metrics.set_gauge("clock_rtt_ms", self.rtt_ms)
+        metrics.set_gauge("clock_offset_ms", self.offset_ms)
+        self.last_sync_at = time.monotonic()
+        self._last_sync_wall = wall
+
+    async def sync(self) -> bool:
+        """通过 /system/time 同步，返回是否成功"""
+        try:
+            best = None  # (rtt_ms, offset_ms)
+            async with aiohttp.ClientSession() as session:
+                url = f"{self.base_url}/system/time"
+                for _ in range(self.samples):
+                    t_send = time.time() * 1000
+                    async with session.get(url) as resp:
+                        if resp.status != 200:
+                            break
+                        data = await read_json(resp)
+                    t_recv = time.time() * 1000
+                    rtt = t_recv - t_send
+                    offset = float(data["server_time"]) - (t_send + t_recv) / 2
+                    if best is None or rtt < best[0]:
+                        best = (rtt, offset)
+
+            if best is None:
+                return False
+
+            self.precise = True
+            self._update(best[1], best[0])
+            metrics.inc("clock_syncs")
+            log.debug(f"时钟同步: offset={self.offset_ms:.1f}ms rtt={self.rtt_ms:.1f}ms")
+            return True
+        except Exception as e:
+            metrics.inc("clock_sync_errors")
+            log.debug(f"时钟同步失败: {e}")
+            return False
+
+    def observe_date_header(self, date_header: Optional[str], t_send_ms: float, t_recv_ms: float):
+        """
+        用响应 Date 头校正 (仅在没有精确样本时使用)
+        Date 头只有秒级精度: 服务器时间落在 [D, D+1000)，只在估计明显偏出该区间时才修正
+        """
+        if self.precise or not date_header:
+            return
+        try:
+            server_ms = parsedate_to_datetime(date_header).timestamp() * 1000
+        except (TypeError, ValueError):
+            return
+        local_mid = (t_send_ms + t_recv_ms) / 2
+        estimate = local_mid + self.offset_ms
+        if server_ms <= estimate < server_ms + 1000 and self.last_sync_at:
+            self.last_sync_at = time.monotonic()
+            return
+        self._update(server_ms + 500 - local_mid, t_recv_ms - t_send_ms)
+
+    def schedule_resync(self):
+        """后台重新同步，不阻塞调用方"""
+        if self._resync_task and not self._resync_task.done():
+            return
+        self._resync_task = asyncio.create_task(self.sync())
+
+
+# 按 API 地址共享的时钟实例 (同一交易所的所有账号共用)
+_clock_syncs: Dict[str, ClockSync] = {}
+# 客户端可能在线程池中并发创建 (load_all_clients)，共享对象的创建需要串行，保证每个 API 地址只有一个实例
+_shared_lock = threading.Lock()
+
+
+def get_clock_sync(base_url: str) -> ClockSync:
+    """获取 (或创建) 某个 API 地址对应的时钟同步器"""
+    clock = _clock_syncs.get(base_url)
+    if clock is None:
+        with _shared_lock:
+            clock = _clock_syncs.get(base_url)
+            if clock is None:
+                clock = _clock_syncs[base_url] = ClockSync(base_url)
+    return clock
+
+
+# =============================================================================
+# 请求延迟统计 (对冲请求)
+# =============================================================================
+
+class LatencyTracker:
+    """
+    记录某类请求最近的延迟，给出对冲请求的触发时间 (观测到的 p95)
+    样本不足时不对冲
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 200,
+        min_samples: int = 20,
+        floor_ms: float = 20,
+        quantile: float = 0.95,
+    ):
+        self.name = name
+        self.min_samples = min_samples
+        self.floor_ms = floor_ms                  # 对冲延迟下限，避免在极快时也发两份请求
+        self.quantile = quantile
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._cached: Optional[float] = None
+        self._since_cache = 0
+
+    def record(self, latency_ms: float):
+        """记录一次成功请求的延迟"""
+        self._samples.append(latency_ms)
+        metrics.observe(self.name, latency_ms)
+        self._since_cache += 1
+        # 每 20 个样本重新计算一次分位数，避免每次请求都排序
+        if self._since_cache >= 20:
+            self._cached = None
+
+    def hedge_delay_s(self) -> Optional[float]:
+        """对冲触发时间 (秒)，None 表示不对冲"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._cached is None:
+            ordered = sorted(self._samples)
+            self._cached = ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+            self._since_cache = 0
+            metrics.set_gauge(f"{self.name}_hedge_after_ms", self._cached)
+        return max(self._cached, self.floor_ms) / 1000
+
+
+# =============================================================================
+# 市场精度 (整数 tick / lot 定点表示)
+# =============================================================================
+
+def _decimal_places(value: str) -> int:
+    """小数位数，如 "0.0001" -> 4"""
+    exponent = Decimal(value).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+class MarketSpec:
+    """
+    市场精度
+    价格以 price_tick_size 为单位 (tick)、数量以 order_size_increment 为单位 (lot) 的整数表示，
+    由市场信息推导一次，之后点差、厚度、对齐都是精确的整数运算
+    """
+
+    __slots__ = (
+        "symbol", "tick_size", "size_increment", "min_notional",
+        "_price_decimals", "_tick_units", "_size_decimals", "_lot_units",
+        "min_notional_units",
+    )
+
+    def __init__(self, symbol: str, tick_size: str, size_increment: str, min_notional: str):
+        self.symbol = symbol
+        self.tick_size = Decimal(tick_size)
+        self.size_increment = Decimal(size_increment)
+        self.min_notional = Decimal(min_notional)
+
+        # 价格/数量先按小数位放大为整数，再除以 tick/lot 的整数值
+        self._price_decimals = _decimal_places(tick_size)
+        self._tick_units = int(self.tick_size.scaleb(self._price_decimals))
+        self._size_decimals = _decimal_places(size_increment)
+        self._lot_units = int(self.size_increment.scaleb(self._size_decimals))
+
+        # 最小名义价值换算为 lots * ticks 的下限
+        lot_tick_value = Fraction(self.tick_size) * Fraction(self.size_increment)
+        self.min_notional_units = _ceil_fraction(Fraction(self.min_notional) / lot_tick_value)
+
+    @classmethod
+    def from_market_info(cls, info: Dict[str, Any]) -> 'MarketSpec':
+        """由 /markets 返回的市场信息构建"""
+        return cls(
+            symbol=info.get("symbol", ""),
+            tick_size=str(info.get("price_tick_size", "0.1")),
+            size_increment=str(info.get("order_size_increment", "0.0001")),
+            min_notional=str(info.get("min_notional", 10)),
+        )
+
+    @staticmethod
+    def _to_scaled(value: str, decimals: int) -> int:
+        """十进制字符串 -> 放大 10^decimals 的整数 (多余小数位截断)"""
+        if "e" in value or "E" in value:
+            return int(Decimal(value).scaleb(decimals).to_integral_value(rounding=ROUND_DOWN))
+        whole, _, frac = value.partition(".")
+        scaled = int(whole or "0") * 10 ** decimals
+        if decimals:
+            digits = int(frac[:decimals].ljust(decimals, "0"))
+            scaled += -digits if whole.startswith("-") else digits
+        return scaled
+
+    @staticmethod
+    def _from_scaled(scaled: int, decimals: int) -> str:
+        """放大 10^decimals 的整数 -> 十进制字符串"""
+        if not decimals:
+            return str(scaled)
+        sign = "-" if scaled < 0 else ""
+        whole, frac = divmod(abs(scaled), 10 ** decimals)
+        return f"{sign}{whole}.{frac:0{decimals}d}"
+
+    def price_to_ticks(self, price: str) -> int:
+        """价格 -> tick 数 (向下对齐)"""
+        return self._to_scaled(price, self._price_decimals) // self._tick_units
+
+    def size_to_lots(self, size: str) -> int:
+        """数量 -> lot 数 (向下对齐)"""
+        return self._to_scaled(size, self._size_decimals) // self._lot_units
+
+    def ticks_to_price(self, ticks: int) -> str:
+        """tick 数 -> 价格字符串"""
+        return self._from_scaled(ticks * self._tick_units, self._price_decimals)
+
+    def lots_to_size(self, lots: int) -> str:
+        """lot 数 -> 数量字符串"""
+        return self._from_scaled(lots * self._lot_units, self._size_decimals)
+
+
+def _ceil_fraction(value: Fraction) -> int:
+    """分数向上取整"""
+    return -((-value.numerator) // value.denominator)
+
+
+class BBO:
+    """
+    最优买卖价，价格为 tick 数、数量为 lot 数
+    ts_ms: 本地毫秒时间，表示该报价在此时刻仍然有效 (用于新鲜度判断)
+    """
+
+    __slots__ = ("spec", "bid_ticks", "ask_ticks", "bid_lots", "ask_lots", "ts_ms")
+
+    def __init__(
+        self, spec: MarketSpec, bid_ticks: int, ask_ticks: int, bid_lots: int, ask_lots: int, ts_ms: float = 0
+    ):
+        self.spec = spec
+        self.bid_ticks = bid_ticks
+        self.ask_ticks = ask_ticks
+        self.bid_lots = bid_lots
+        self.ask_lots = ask_lots
+        self.ts_ms = ts_ms
+
+    @classmethod
+    def parse(cls, spec: MarketSpec, best_bid: List[str], best_ask: List[str], ts_ms: float = 0) -> 'BBO':
+        """由 orderbook 返回的 [price, size] 构建"""
+        return cls(
+            spec,
+            spec.price_to_ticks(best_bid[0]),
+            spec.price_to_ticks(best_ask[0]),
+            spec.size_to_lots(best_bid[1]),
+            spec.size_to_lots(best_ask[1]),
+            ts_ms,
+        )
+
+    def age_ms(self, now_ms: Optional[float] = None) -> float:
+        """报价年龄 (毫秒)"""
+        return (now_ms if now_ms is not None else time.time() * 1000) - self.ts_ms
+
+    # 以下浮点值仅用于日志显示
+    @property
+    def bid(self) -> float:
+        return float(self.bid_ticks * self.spec.tick_size)
+
+    @property
+    def ask(self) -> float:
+        return float(self.ask_ticks * self.spec.tick_size)
+
+    @property
+    def bid_size(self) -> float:
+        return float(self.bid_lots * self.spec.size_increment)
+
+    @property
+    def ask_size(self) -> float:
+        return float(self.ask_lots * self.spec.size_increment)
+
+    def spread_percent(self) -> Optional[float]:
+        """点差百分比"""
+        total = self.bid_ticks + self.ask_ticks
+        if total <= 0:
+            return None
+        return 200 * (self.ask_ticks - self.bid_ticks) / total
+
+
+class SpreadThreshold:
+    """
+    点差阈值 (百分比) 的精确整数比较
+    spread% = 200 * (ask - bid) / (ask + bid) <= num / den
+    """
+
+    __slots__ = ("percent", "num", "den")
+
+    def __init__(self, percent: float):
+        self.percent = percent
+        ratio = Fraction(Decimal(str(percent)))
+        self.num = ratio.numerator
+        self.den = ratio.denominator
+
+    def allows(self, bbo: BBO) -> bool:
+        """点差是否不超过阈值"""
+        total = bbo.bid_ticks + bbo.ask_ticks
+        return total > 0 and 200 * (bbo.ask_ticks - bbo.bid_ticks) * self.den <= self.num * total
+
+
+class EntryRule:
+    """开仓条件 (点差阈值、订单簿厚度)，按市场精度预先换算为整数比较"""
+
+    __slots__ = ("spec", "spread", "min_depth_units")
+
+    def __init__(self, spec: MarketSpec, spread_threshold_percent: float, min_order_book_size_usd: float):
+        self.spec = spec
+        self.spread = SpreadThreshold(spread_threshold_percent)
+        # 厚度: lots * ticks * (lot * tick) >= min_usd
+        lot_tick_value = Fraction(spec.tick_size) * Fraction(spec.size_increment)
+        self.min_depth_units = _ceil_fraction(Fraction(Decimal(str(min_order_book_size_usd))) / lot_tick_value)
+
+    def depth_ok(self, bbo: BBO) -> bool:
+        """买一卖一厚度是否都满足"""
+        return (
+            bbo.bid_lots * bbo.bid_ticks >= self.min_depth_units and
+            bbo.ask_lots * bbo.ask_ticks >= self.min_depth_units
+        )
+
+
+# =============================================================================
+# 市场参考数据缓存
+# =============================================================================
+
+class ReferenceData:
+    """
+    市场参考数据 (/markets)，同一 API 地址的所有账号共享
+    启动时先用磁盘快照，随后后台刷新，刷新结果写回快照
+    """
+
+    def __init__(self, base_url: str, cache_file: str = "markets_cache.json"):
+        self.base_url = base_url
+        self.cache_file = cache_file
+        self.markets: Dict[str, Dict] = {}
+        self.specs: Dict[str, MarketSpec] = {}
+        self.updated_at: float = 0                # 数据时间 (epoch 秒)
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def load_snapshot(self) -> bool:
+        """加载磁盘快照，返回是否成功"""
+        try:
+            if not os.path.exists(self.cache_file):
+                return False
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+            if data.get("base_url") != self.base_url:
+                return False
+            self._apply(data.get("results", []))
+            self.updated_at = data.get("ts", 0)
+            log.info(f"已加载市场信息快照: {len(self.markets)} 个市场 (缓存于 {datetime.fromtimestamp(self.updated_at):%m-%d %H:%M})")
+            return True
+        except Exception as e:
+            log.warning(f"加载市场信息快照失败: {e}")
+            return False
+
+    def _apply(self, results: List[Dict]):
+        """合并市场信息，精度变化的市场需要重建 MarketSpec"""
+        for m in results:
+            symbol = m.get("symbol")
+            if not symbol:
+                continue
+            old = self.markets.get(symbol)
+            self.markets[symbol] = m
+            if old is not None and (
+                old.get("price_tick_size") != m.get("price_tick_size") or
+                old.get("order_size_increment") != m.get("order_size_increment") or
+                old.get("min_notional") != m.get("min_notional")
+            ):
+                self.specs.pop(symbol, None)
+
+    async def refresh(self, session) -> bool:
+        """拉取 /markets (并发调用共享同一个请求)，返回是否成功"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch(session))
+        return await asyncio.shield(self._refresh_task)
+
+    def schedule_refresh(self, session):
+        """后台刷新，不阻塞调用方"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch(session))
+
+    async def _fetch(self, session) -> bool:
+        try:
+            async with session.get(f"{self.base_url}/markets") as resp:
+                if resp.status != 200:
+                    return False
+                data = await read_json(resp)
+            results = data.get("results", [])
+            self._apply(results)
+            self.updated_at = time.time()
+            self._save_snapshot(results)
+            return True
+        except Exception as e:
+            log.warning(f"刷新市场信息失败: {e}")
+            return False
+
+    def _save_snapshot(self, results: List[Dict]):
+        """快照写盘交给后台写线程 (原子替换)，不在事件循环里序列化整个 /markets 响应"""
+        data = {"base_url": self.base_url, "ts": self.updated_at, "results": results}
+        blocking.submit_write(self.cache_file, data, "保存市场信息快照失败")
+
+
+# 按 API 地址共享的参考数据
+_reference_data: Dict[str, ReferenceData] = {}
+
+
+def get_reference_data(base_url: str) -> ReferenceData:
+    """获取 (或创建) 某个 API 地址对应的参考数据缓存"""
+    ref = _reference_data.get(base_url)
+    if ref is None:
+        with _shared_lock:
+            ref = _reference_data.get(base_url)
+            if ref is None:
+                ref = _reference_data[base_url] = ReferenceData(base_url)
+    return ref
+
+
+# =============================================================================
+# Paradex API 客户端 (带 Interactive Token)
+# =============================================================================
+
+class ParadexInteractiveClient:
+    """
+    Paradex API 客户端
+    关键：认证时使用 ?token_usage=interactive 获取 0 手续费 token
+    """
+
+    def __init__(self, l2_private_key: str, l2_address: str, environment: str = "prod"):
+        self.l2_private_key = l2_private_key
+        self.l2_address = l2_address
+        self.environment = environment
+
+        self.base_url = f"https://api.{'prod' if environment == 'prod' else 'testnet'}.paradex.trade/v1"
+        self.jwt_token: Optional[str] = None
+        self.jwt_expires_at: int = 0
+        self._auth_headers: Dict[str, str] = {}
+        self._auth_headers_token: Optional[str] = None
+        self._orderbook_urls: Dict[str, str] = {}  # 市场 -> orderbook 请求地址
+
+        # 交易所时钟 (签名时间戳、client_id、token 过期判断都以交易所时间为准)
+        self.clock = get_clock_sync(self.base_url)
+
+        # 市场信息缓存 (同一 API 地址的所有账号共享，启动时从磁盘快照加载)
+        self.reference = get_reference_data(self.base_url)
+        self.market_info: Dict[str, Any] = self.reference.markets
+        self.market_specs: Dict[str, MarketSpec] = self.reference.specs
+
+        # 订单载荷模板: (market, type, side, instruction, reduce_only) -> OrderTemplate
+        self._order_templates: Dict[tuple, OrderTemplate] = {}
+
+        # 复用的 HTTP 会话 (保持连接，对冲请求不必重新握手)
+        self._session = None
+
+        # 行情源管理 (推送行情/共享内存优先，过期时回退 REST；多个账号共享)
+        self.market_data: Optional['MarketDataManager'] = None
+
+        # BBO 请求延迟 (超过 p95 时发出对冲请求)
+        self._bbo_latency = LatencyTracker("bbo_latency_ms")
+
+        # 下单请求超时与重试次数 (重试使用同一 client_id 的同一份签名)
+        self.order_timeout_s = 3.0
+        self.order_retries = 2
+        # 结果未知时查询订单前的等待 (秒)，逐次递增，给仍在途的原请求落地的时间
+        self.order_lookup_delays_s = (0.3, 0.7, 1.5)
+
+        # 批量下单接口是否可用 (交易所返回 404/405/501 后改为逐单并发提交)
+        self._batch_supported = True
+
+        # 初始化 paradex-py
+        if ParadexSubkey is None:
+            log.error("请先安装 paradex-py: pip install paradex-py")
+            raise ImportError("paradex-py 未安装")
+
+        env = PROD if environment == "prod" else TESTNET
+        self.paradex = ParadexSubkey(
+            env=env,
+            l2_private_key=l2_private_key,
+            l2_address=l2_address,
+        )
+        log.info(f"Paradex SDK 初始化成功 (环境: {environment})")
+
+    async def _get_session(self):
+        """获取复用的 HTTP 会话"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def close(self):
+        """关闭 HTTP 会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _new_client_id(self, prefix: str) -> str:
+        """
+        生成不会冲突的 client_id
+        包含账号地址后缀 (跨账号)、交易所毫秒时间和随机部分 (同一毫秒内并发/多进程)
+        """
+        return f"{prefix}_{self.l2_address[-8:]}_{self.clock.now_ms()}_{uuid.uuid4().hex[:12]}"
+
+    async def authenticate_interactive(self) -> bool:
+        """
+        使用 interactive 模式认证
+        关键：POST /v1/auth?token_usage=interactive
+        """
+        try:
+            # 首次认证前先同步交易所时钟，避免时钟偏差导致签名被拒
+            if not self.clock.precise:
+                await self.clock.sync()
+
+            # 生成认证签名 (使用交易所时间)
+            timestamp = self.clock.now()
+            expiry = timestamp + 24 * 60 * 60  # 24小时有效
+
+            # 使用 paradex SDK 生成签名
+            auth_headers = self._build_auth_headers(timestamp, expiry)
+
+            # 发送认证请求，关键是 URL 参数 token_usage=interactive
+            session = await self._get_session()
+            url = f"{self.base_url}/auth?token_usage=interactive"
+
+            headers = {
+                "Content-Type": "application/json",
+                **auth_headers
+            }
+
+            t_send = time.time() * 1000
+            async with session.post(url, headers=headers) as resp:
+                self.clock.observe_date_header(resp.headers.get("Date"), t_send, time.time() * 1000)
+                if resp.status == 200:
+                    data = await read_json(resp)
+                    self.jwt_token = data.get("jwt_token")
+
+                    # 解析 token 获取过期时间
+                    decoded = decode_jwt_payload(self.jwt_token)
+
+                    self.jwt_expires_at = decoded.get("exp", 0)
+                    token_usage = decoded.get("token_usage", "unknown")
+
+                    log.info(f"认证成功! token_usage={token_usage} (应该是 interactive)")
+
+                    if token_usage != "interactive":
+                        log.warning("警告: token_usage 不是 interactive，手续费可能不是 0!")
+
+                    return True
+                else:
+                    error = await resp.text()
+                    log.error(f"认证失败: {resp.status} - {error}")
+                    return False
+
+        except Exception as e:
+            log.error(f"认证异常: {e}")
+            return False
+
+    def _build_auth_headers(self, timestamp: int, expiry: int) -> Dict[str, str]:
+        """生成认证请求头 (与 SDK auth_headers 相同，但时间戳由交易所时钟提供)"""
+        account = self.paradex.account
+        return {
+            "PARADEX-STARKNET-ACCOUNT": hex(account.l2_address),
+            "PARADEX-STARKNET-SIGNATURE": account.auth_signature(timestamp, expiry),
+            "PARADEX-TIMESTAMP": str(timestamp),
+            "PARADEX-SIGNATURE-EXPIRATION": str(expiry),
+        }
+
+    async def ensure_authenticated(self) -> bool:
+        """确保已认证且 token 未过期"""
+        # 时钟估计过旧时在后台重新同步
+        if self.clock.is_stale():
+            self.clock.schedule_resync()
+
+        now = self.clock.now()
+
+        # token 还有至少 60 秒有效期
+        if self.jwt_token and self.jwt_expires_at > now + 60:
+            return True
+
+        log.info("Token 已过期或不存在，重新认证...")
+        return await self.authenticate_interactive()
+
+    def _get_auth_headers(self) -> Dict[str, str]:
+        """获取带认证的请求头 (token 不变时复用同一个 dict)"""
+        if self._auth_headers_token != self.jwt_token:
+            self._auth_headers = {
+                "Authorization": f"Bearer {self.jwt_token}",
+                "Content-Type": "application/json"
+            }
+            self._auth_headers_token = self.jwt_token
+        return self._auth_headers
+
+    async def get_balance(self) -> Optional[float]:
+        """获取 USDC 余额"""
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            session = await self._get_session()
+            url = f"{self.base_url}/balance"
+            async with session.get(url, headers=self._get_auth_headers()) as resp:
+                if resp.status == 200:
+                    data = await read_json(resp)
+                    for item in data.get("results", []):
+                        if item.get("token") == "USDC":
+                            return float(item.get("size", 0))
+            return 0
+        except Exception as e:
+            log.error(f"获取余额失败: {e}")
+            return None
+
+    async def get_positions(self, market: str = None) -> Optional[List[Dict]]:
+        """获取持仓，失败返回 None (与 "没有持仓" 区分)"""
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            session = await self._get_session()
+            url = f"{self.base_url}/positions"
+            async with session.get(url, headers=self._get_auth_headers()) as resp:
+                if resp.status == 200:
+                    data = await read_json(resp)
+                    positions = data.get("results", [])
+
+                    if market:
+                        positions = [p for p in positions if p.get("market") == market]
+
+                    # 过滤掉已关闭的仓位
+                    return [p for p in positions if p.get("status") != "CLOSED" and float(p.get("size", 0)) > 0]
+            return None
+        except Exception as e:
+            log.error(f"获取持仓失败: {e}")
+            return None
+
+    async def get_fills(self, market: Optional[str] = None, start_at: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        获取 start_at (毫秒) 之后的成交记录，自动翻页，按时间升序返回
+        失败返回 None (与 "没有新成交" 区分，调用方不推进游标)
+        """
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            session = await self._get_session()
+            url = f"{self.base_url}/fills"
+            params: Dict[str, Any] = {"page_size": 100}
+            if market:
+                params["market"] = market
+            if start_at is not None:
+                params["start_at"] = start_at
+
+            fills: List[Dict] = []
+            while True:
+                async with session.get(url, headers=self._get_auth_headers(), params=params) as resp:
+                    if resp.status != 200:
+                        log.warning(f"获取成交记录失败: {resp.status}")
+                        return None
+                    data = await read_json(resp)
+                fills.extend(data.get("results", []))
+                cursor = data.get("next")
+                if not cursor:
+                    break
+                params["cursor"] = cursor
+
+            fills.sort(key=lambda f: int(f.get("created_at", 0)))
+            return fills
+        except Exception as e:
+            log.error(f"获取成交记录失败: {e}")
+            return None
+
+    async def get_market_info(self, market: str) -> Optional[Dict]:
+        """获取市场信息（tick size, min notional 等）"""
+        if market in self.market_info:
+            return self.market_info[market]
+
+        try:
+            session = await self._get_session()
+            if await self.reference.refresh(session):
+                return self.market_info.get(market)
+            return None
+        except Exception as e:
+            log.error(f"获取市场信息失败: {e}")
+            return None
+
+    async def get_market_spec(self, market: str) -> Optional[MarketSpec]:
+        """获取市场精度 (由市场信息推导一次后缓存)"""
+        spec = self.market_specs.get(market)
+        if spec is None:
+            info = await self.get_market_info(market)
+            if not info:
+                return None
+            spec = self.market_specs[market] = MarketSpec.from_market_info(info)
+        return spec
+
+    async def get_bbo(self, market: str) -> Optional[BBO]:
+        """
+        获取最优买卖价 (Best Bid/Offer)
+        返回: BBO (价格为 tick 数、数量为 lot 数)；配置了行情源管理时，没有新鲜的行情源返回 None
+        """
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            spec = await self.get_market_spec(market)
+            if not spec:
+                return None
+
+            if self.market_data is not None:
+                return await self.market_data.get_bbo(self, market, spec)
+            return await self.fetch_bbo_rest(market, spec)
+        except Exception as e:
+            log.error(f"获取 BBO 失败: {e}")
+            return None
+
+    async def fetch_bbo_rest(self, market: str, spec: MarketSpec) -> Optional[BBO]:
+        """
+        REST 获取 BBO
+        首个请求超过观测到的 p95 延迟仍未返回时，发出第二个对冲请求，取先到的结果
+        """
+        try:
+            first = asyncio.ensure_future(self._fetch_bbo(market, spec))
+            hedge_delay = self._bbo_latency.hedge_delay_s()
+            if hedge_delay is None:
+                return await first
+
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+            if done:
+                return first.result()
+
+            # 首个请求过慢，发出对冲请求
+            metrics.inc("bbo_hedged")
+            hedge = asyncio.ensure_future(self._fetch_bbo(market, spec))
+            pending = {first, hedge}
+            result = None
+            try:
+                while pending and result is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.result() is not None:
+                            result = task.result()
+                            if task is hedge:
+                                metrics.inc("bbo_hedge_wins")
+                            break
+            finally:
+                for task in pending:
+                    task.cancel()
+            return result
+        except Exception as e:
+            log.error(f"获取 BBO 失败: {e}")
+            return None
+
+    async def _fetch_bbo(self, market: str, spec: MarketSpec) -> Optional[BBO]:
+        """单次 orderbook 请求"""
+        try:
+            session = await self._get_session()
+            # 使用 orderbook API
+            url = self._orderbook_urls.get(market)
+            if url is None:
+                url = self._orderbook_urls[market] = f"{self.base_url}/orderbook/{market}?depth=1"
+
+            t_send = time.time() * 1000
+            async with session.get(url, headers=self._get_auth_headers()) as resp:
+                t_recv = time.time() * 1000
+                self.clock.observe_date_header(resp.headers.get("Date"), t_send, t_recv)
+                if resp.status == 200:
+                    data = await read_json(resp)
+                    self._bbo_latency.record(time.time() * 1000 - t_send)
+
+                    # 解析 bids 和 asks 数组: [[price, size], ...]
+                    bids = data.get("bids", [])
+                    asks = data.get("asks", [])
+
+                    # 优先使用 best_bid_api/best_ask_api (格式: [price, size])
+                    best_bid = data.get("best_bid_api") or (bids[0] if bids else None)
+                    best_ask = data.get("best_ask_api") or (asks[0] if asks else None)
+
+                    if best_bid and best_ask:
+                        # 以发出请求的时刻为报价时间 (保守估计，请求耗时计入年龄)
+                        return BBO.parse(spec, best_bid, best_ask, t_send)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.debug(f"orderbook API 调用失败: {e}")
+
+        return None
+
+    async def get_spread_percent(self, market: str) -> Optional[float]:
+        """计算点差百分比"""
+        bbo = await self.get_bbo(market)
+        if not bbo or not bbo.bid_ticks or not bbo.ask_ticks:
+            return None
+
+        return bbo.spread_percent()
+
+    async def place_limit_order(
+        self,
+        market: str,
+        side: str,  # "BUY" or "SELL"
+        size: str,
+        price: str,
+        instruction: str = "GTC",
+        reduce_only: bool = False
+    ) -> Optional[Dict]:
+        """
+        下限价单
+        使用 paradex SDK 进行签名，但通过 HTTP 发送以使用 interactive token
+        """
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            # 使用 SDK 签名，按模板生成载荷
+            with tracer.span("sign"):
+                payload = await blocking.run(
+                    self._build_signed_payload,
+                    market, "LIMIT", side, size, price, instruction, reduce_only, "sniper"
+                )
+
+            # 通过 HTTP 发送，使用我们的 interactive JWT token
+            with tracer.span("order_post", side=side, type="LIMIT"):
+                result, error = await self._submit_order(payload)
+            if result:
+                log.info(f"下单成功: {side} {size} @ {price}, order_id={result.get('id')}")
+
+                # 检查是否为 interactive 模式
+                flags = result.get("flags", [])
+                if "INTERACTIVE" in flags:
+                    log.info("确认: 订单使用 INTERACTIVE 模式 (0 手续费)")
+                else:
+                    log.warning(f"警告: 订单 flags={flags}, 可能不是 interactive 模式")
+
+                return result
+            else:
+                log.error(f"下单失败: {error}")
+                return None
+
+        except Exception as e:
+            log.error(f"下单失败: {e}")
+            return None
+
+    async def place_market_order(
+        self,
+        market: str,
+        side: str,
+        size: str,
+        reduce_only: bool = False
+    ) -> Optional[Dict]:
+        """下市价单（用于平仓）"""
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            # 使用 SDK 签名，按模板生成载荷
+            with tracer.span("sign"):
+                payload = await blocking.run(
+                    self._build_signed_payload,
+                    market, "MARKET", side, size, None, "GTC", reduce_only, "sniper_mkt"
+                )
+
+            # 通过 HTTP 发送，使用我们的 interactive JWT token
+            with tracer.span("order_post", side=side, type="MARKET"):
+                result, error = await self._submit_order(payload)
+            if result:
+                log.info(f"市价单成功: {side} {size}, order_id={result.get('id')}")
+                return result
+            else:
+                log.error(f"市价单失败: {error}")
+                return None
+
+        except Exception as e:
+            log.error(f"市价单失败: {e}")
+            return None
+
+    def _build_signed_payload(
+        self,
+        market: str,
+        order_type: str,  # "LIMIT" or "MARKET"
+        side: str,
+        size: str,
+        price: Optional[str],
+        instruction: str,
+        reduce_only: bool,
+        client_id_prefix: str,
+    ) -> Dict[str, Any]:
+        """
+        签名订单并生成请求载荷
+        签名仍交给 SDK 的 Order (签名内容由 SDK 定义)，载荷由预构建的模板填充
+        """
+        side = side.upper()
+        key = (market, order_type, side, instruction, reduce_only)
+        template = self._order_templates.get(key)
+        if template is None:
+            template = self._order_templates[key] = OrderTemplate(
+                market, order_type, side, instruction, reduce_only
+            )
+
+        order = Order(
+            market=market,
+            order_type=OrderType.Limit if template.is_limit else OrderType.Market,
+            order_side=OrderSide.Buy if side == "BUY" else OrderSide.Sell,
+            size=Decimal(size),
+            limit_price=Decimal(price) if template.is_limit else Decimal(0),
+            client_id=self._new_client_id(client_id_prefix),
+            instruction=instruction,
+            reduce_only=reduce_only,
+            signature_timestamp=self.clock.now_ms(),
+        )
+
+        # 使用 SDK 签名订单
+        signature = self.paradex.account.sign_order(order)
+        return template.build(size, price, order.client_id, signature, order.signature_timestamp)
+
+    async def _submit_order(self, payload: Dict) -> tuple[Optional[Dict], Optional[str]]:
+        """
+        提交已签名订单，返回 (订单结果, 错误信息)
+        超时或连接中断时结果未知: 按 order_lookup_delays_s 退避并多次按 client_id 对账，都查不到才原样重发。
+        重发的是同一 client_id、同一签名时间戳的同一份载荷，但交易所是否拒绝重复 client_id 没有保证:
+        原请求若在全部对账之后才到达撮合，仍可能重复下单。这类重发计入 order_resends_unknown
+        """
+        client_id = payload["client_id"]
+        url = f"{self.base_url}/orders"
+        timeout = aiohttp.ClientTimeout(total=self.order_timeout_s)
+        error = "下单超时"
+
+        for attempt in range(self.order_retries + 1):
+            try:
+                session = await self._get_session()
+                async with session.post(url, headers=self._get_auth_headers(), data=json_dumps(payload), timeout=timeout) as resp:
+                    if resp.status == 201:
+                        return await read_json(resp), None
+                    error = f"{resp.status} - {await resp.text()}"
+
+                # 明确被拒绝: 首次提交直接返回；重发被拒可能是因为原请求已成功，需要对账
+                if attempt == 0:
+                    return None, error
+                existing = await self._lookup_unknown_order(client_id)
+                if existing:
+                    return existing, None
+                return None, error
+
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                metrics.inc("order_post_timeouts")
+                error = f"下单超时: {e!r}"
+                existing = await self._lookup_unknown_order(client_id)
+                if existing:
+                    log.info(f"下单响应丢失，按 client_id 对账找到订单: {client_id}")
+                    return existing, None
+                if attempt < self.order_retries:
+                    metrics.inc("order_retries")
+                    metrics.inc("order_resends_unknown")
+                    log.warning(
+                        f"下单超时且 {len(self.order_lookup_delays_s)} 次对账均无此订单，重发 "
+                        f"({attempt + 1}/{self.order_retries}，原请求若仍在途可能重复下单): {client_id}"
+                    )
+
+        return None, error
+
+    async def _lookup_unknown_order(self, client_id: str) -> Optional[Dict]:
+        """结果未知的订单: 按 order_lookup_delays_s 退避后多次按 client_id 查询，找到即返回"""
+        for delay in self.order_lookup_delays_s:
+            await asyncio.sleep(delay)
+            existing = await self.get_order_by_client_id(client_id)
+            if existing:
+                metrics.inc("order_reconciled")
+                return existing
+        return None
+
+    # 交易所单次批量下单的订单数上限
+    BATCH_MAX_ORDERS = 10
+
+    async def place_orders_batch(self, orders: List[Dict[str, Any]]) -> List[tuple[Optional[Dict], Optional[str]]]:
+        """
+        批量下单
+        orders 每项: market, side, size, type ("LIMIT"/"MARKET"，默认 MARKET)，可选 price、instruction、reduce_only
+        所有订单在线程池中并行签名，按每批 BATCH_MAX_ORDERS 单并发 POST /orders/batch
+        返回与 orders 顺序一致的 [(订单结果, 错误信息)]；批量接口不可用时改为并发逐单提交
+        """
+        if not orders:
+            return []
+        if not await self.ensure_authenticated():
+            return [(None, "认证失败")] * len(orders)
+
+        with tracer.span("sign", orders=len(orders)):
+            payloads = await asyncio.gather(*(
+                blocking.run(
+                    self._build_signed_payload,
+                    o["market"], o.get("type", "MARKET"), o["side"], o["size"], o.get("price"),
+                    o.get("instruction", "GTC"), o.get("reduce_only", False), "sniper_batch"
+                )
+                for o in orders
+            ))
+
+        with tracer.span("order_post_batch", orders=len(orders)):
+            n = self.BATCH_MAX_ORDERS
+            chunks = await asyncio.gather(*(
+                self._submit_batch(payloads[i:i + n]) for i in range(0, len(payloads), n)
+            ))
+        return [result for chunk in chunks for result in chunk]
+
+    async def _submit_batch(self, payloads: List[Dict]) -> List[tuple[Optional[Dict], Optional[str]]]:
+        """提交一批已签名订单，结果按 client_id 与载荷对应"""
+        if self._batch_supported:
+            url = f"{self.base_url}/orders/batch"
+            timeout = aiohttp.ClientTimeout(total=self.order_timeout_s)
+            try:
+                session = await self._get_session()
+                async with session.post(url, headers=self._get_auth_headers(), data=json_dumps(payloads), timeout=timeout) as resp:
+                    if resp.status in (200, 201):
+                        metrics.inc("order_batches")
+                        return self._match_batch_results(payloads, await read_json(resp))
+                    if resp.status not in (404, 405, 501):
+                        error = f"{resp.status} - {await resp.text()}"
+                        return [(None, error)] * len(payloads)
+                self._batch_supported = False
+                log.warning("交易所不支持批量下单接口，改为并发逐单提交")
+
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                # 结果未知: 逐单按 client_id 对账，交易所没有的再逐单提交
+                metrics.inc("order_post_timeouts")
+                log.warning(f"批量下单响应丢失，逐单对账: {e!r}")
+                return await asyncio.gather(*(self._reconcile_or_submit(p) for p in payloads))
+
+        metrics.inc("order_batch_fallbacks")
+        return await asyncio.gather(*(self._submit_order(p) for p in payloads))
+
+    @staticmethod
+    def _match_batch_results(payloads: List[Dict], data: Any) -> List[tuple[Optional[Dict], Optional[str]]]:
+        """
+        批量下单响应 {"orders": [...], "errors": [...]} 按 client_id 对应到载荷
+        errors 与请求等长时按位置取每单的错误信息
+        """
+        if isinstance(data, list):
+            orders, errors = data, []
+        else:
+            orders, errors = data.get("orders") or [], data.get("errors") or []
+        by_client_id = {o.get("client_id"): o for o in orders if isinstance(o, dict)}
+
+        results = []
+        for i, payload in enumerate(payloads):
+            order = by_client_id.get(payload["client_id"])
+            if order:
+                results.append((order, None))
+                continue
+            error = errors[i] if len(errors) == len(payloads) else None
+            results.append((None, f"批量下单被拒: {error}" if error else "批量下单结果中无此订单"))
+        return results
+
+    async def _reconcile_or_submit(self, payload: Dict) -> tuple[Optional[Dict], Optional[str]]:
+        """先按 client_id 退避对账，交易所没有该订单时再单独提交同一份载荷 (与 _submit_order 重发的风险相同)"""
+        existing = await self._lookup_unknown_order(payload["client_id"])
+        if existing:
+            return existing, None
+        metrics.inc("order_resends_unknown")
+        return await self._submit_order(payload)
+
+    async def get_order_by_client_id(self, client_id: str) -> Optional[Dict]:
+        """按 client_id 查询订单 (用于下单结果未知时对账)"""
+        try:
+            session = await self._get_session()
+            url = f"{self.base_url}/orders/by_client_id/{client_id}"
+            async with session.get(url, headers=self._get_auth_headers()) as resp:
+                if resp.status == 200:
+                    return await read_json(resp)
+            return None
+        except Exception as e:
+            log.debug(f"按 client_id 查询订单失败: {e}")
+            return None
+
+    async def cancel_order(self, order_id: str) -> bool:
+        """取消订单"""
+        try:
+            if not await self.ensure_authenticated():
+                return False
+
+            await blocking.run(self.paradex.api_client.cancel_order, order_id)
+            log.info(f"订单已取消: {order_id}")
+            return True
+
+        except Exception as e:
+            log.error(f"取消订单失败: {e}")
+            return False
+
+    async def get_open_orders(self, market: str = None) -> Optional[List[Dict]]:
+        """获取挂单，失败返回 None (与 "没有挂单" 区分)"""
+        try:
+            if not await self.ensure_authenticated():
+                return None
+
+            session = await self._get_session()
+            url = f"{self.base_url}/orders"
+            params = {"status": "OPEN"}
+            if market:
+                params["market"] = market
+
+            async with session.get(url, headers=self._get_auth_headers(), params=params) as resp:
+                if resp.status != 200:
+                    return None
+                data = await read_json(resp)
+                return data.get("results", [])
+        except Exception as e:
+            log.error(f"获取挂单失败: {e}")
+            return None
+
+    async def cancel_all_orders(self, market: str = None, orders: Optional[List[Dict]] = None) -> int:
+        """取消所有挂单 (orders 为已查询到的挂单时不再重新查询)"""
+        try:
+            if orders is None:
+                orders = await self.get_open_orders(market)
+            if not orders:
+                log.info("没有挂单需要取消")
+                return 0
+
+            session = await self._get_session()
+
+            # 取消所有订单
+            cancelled = 0
+            for order in orders:
+                order_id = order.get("id")
+                if order_id:
+                    cancel_url = f"{self.base_url}/orders/{order_id}"
+                    async with session.delete(cancel_url, headers=self._get_auth_headers()) as cancel_resp:
+                        if cancel_resp.status in [200, 204]:
+                            cancelled += 1
+
+            log.info(f"已取消 {cancelled}/{len(orders)} 个挂单")
+            return cancelled
+
+        except Exception as e:
+            log.error(f"取消所有订单失败: {e}")
+            return 0
+
+    async def close_all_positions(
+        self, market: str = None, positions: Optional[List[Dict]] = None,
+        on_result: Optional[Callable[[Dict, Optional[Dict], float], None]] = None,
+    ) -> int:
+        """
+        平掉所有仓位 (positions 为已查询到的持仓时不再重新查询)
+        on_result 不为空时对每笔平仓单调用 on_result(订单, 结果, 批量下单耗时 ms)，供交易历史记录
+        """
+        try:
+            if not await self.ensure_authenticated():
+                return 0
+
+            if positions is None:
+                positions = await self.get_positions()
+            if positions is None:
+                log.error("查询持仓失败，无法平仓")
+                return 0
+            if not positions:
+                log.info("没有仓位需要平仓")
+                return 0
+
+            orders = []
+            for pos in positions:
+                pos_market = pos.get("market")
+                if market and pos_market != market:
+                    continue
+
+                size = pos.get("size", "0")
+                side = pos.get("side", "")
+
+                if float(size) == 0:
+                    continue
+
+                # 平仓方向与持仓相反
+                close_side = "SELL" if side == "LONG" else "BUY"
+                orders.append({"market": pos_market, "side": close_side, "size": size, "reduce_only": True})
+
+            # 所有仓位一次批量市价平仓
+            closed = 0
+            sent_at = time.perf_counter()
+            results = await self.place_orders_batch(orders)
+            latency_ms = (time.perf_counter() - sent_at) * 1000
+            for order, (result, error) in zip(orders, results):
+                if on_result is not None:
+                    on_result(order, result, latency_ms)
+                if result:
+                    closed += 1
+                    log.info(f"已平仓 {order['market']}: {order['side']} {order['size']}")
+                else:
+                    log.error(f"平仓 {order['market']} 失败: {error}")
+
+            log.info(f"已平仓 {closed} 个仓位")
+            return closed
+
+        except Exception as e:
+            log.error(f"平仓所有仓位失败: {e}")
+            return 0
+
+
+# =============================================================================
+# 成交账本 (成交量 / 手续费 / 盈亏)
+# =============================================================================
+
+class MarketLedger:
+    """
+    单个账号在单个市场上的累计成交数据，每笔成交 O(1) 更新
+    持仓按平均成本计算已实现盈亏；仓位回到 0 视为完成一个来回 (开仓 + 平仓)
+    """
+
+    __slots__ = ("volume", "fees", "realized", "position", "avg_price", "fills", "trip_realized", "trip_fees")
+
+    # 浮点累加误差内视为 0 仓位
+    EPSILON = 1e-12
+
+    def __init__(self, volume=0.0, fees=0.0, realized=0.0, position=0.0, avg_price=0.0, fills=0,
+                 trip_realized=0.0, trip_fees=0.0):
+        self.volume = volume
+        self.fees = fees
+        self.realized = realized
+        self.position = position
+        self.avg_price = avg_price
+        self.fills = fills
+        self.trip_realized = trip_realized  # 本次来回开始时的累计已实现盈亏
+        self.trip_fees = trip_fees          # 本次来回开始时的累计手续费
+
+    @property
+    def wear(self) -> float:
+        """磨损 = 手续费 - 已实现盈亏 (正数为亏损)"""
+        return self.fees - self.realized
+
+    def apply(self, side: str, price: float, size: float, fee: float) -> Optional[float]:
+        """记入一笔成交；若这笔成交让仓位回到 0，返回该来回的净盈亏 (已实现盈亏 - 手续费)"""
+        self.volume += price * size
+        self.fees += fee
+        self.fills += 1
+
+        pos = self.position
+        signed = size if side == "BUY" else -size
+        if abs(pos) <= self.EPSILON:
+            # 新开一个来回
+            self.trip_realized = self.realized
+            self.trip_fees = self.fees - fee
+            self.position, self.avg_price = signed, price
+            return None
+
+        if (pos > 0) == (signed > 0):
+            # 加仓: 更新平均成本
+            new = pos + signed
+            self.avg_price = (abs(pos) * self.avg_price + size * price) / abs(new)
+            self.position = new
+            return None
+
+        # 减仓/平仓/反手
+        closed = min(abs(pos), size)
+        self.realized += (price - self.avg_price) * closed * (1 if pos > 0 else -1)
+        new = pos + signed
+        if abs(new) <= self.EPSILON:
+            self.position, self.avg_price = 0.0, 0.0
+            return (self.realized - self.trip_realized) - (self.fees - self.trip_fees)
+        if (new > 0) != (pos > 0):
+            # 反手: 剩余部分按成交价开新仓
+            self.avg_price = price
+        self.position = new
+        return None
+
+    def to_list(self) -> List[float]:
+        return [self.volume, self.fees, self.realized, self.position, self.avg_price, self.fills,
+                self.trip_realized, self.trip_fees]
+
+
+class ExecutionLedger:
+    """
+    由交易所成交记录 (GET /fills) 增量维护的账本，按 账号|市场 汇总
+      - 每个账号记一个时间游标，只拉取游标之后的成交；游标同一毫秒的成交 id 用于去重
+      - 持久化为紧凑的数组格式，写文件交给后台线程
+    """
+
+    def __init__(self, filepath: str = "ledger.json"):
+        self.filepath = filepath
+        self.books: Dict[str, MarketLedger] = {}
+        self.cursors: Dict[str, int] = {}
+        self._cursor_ids: Dict[str, List[str]] = {}
+
+    def load(self):
+        """加载账本文件"""
+        try:
+            if os.path.exists(self.filepath):
+                with open(self.filepath, "r") as f:
+                    data = json.load(f)
+                self.books = {k: MarketLedger(*v) for k, v in data.get("books", {}).items()}
+                for account, (ms, ids) in data.get("cursors", {}).items():
+                    self.cursors[account] = ms
+                    self._cursor_ids[account] = ids
+        except Exception as e:
+            log.warning(f"加载成交账本失败: {e}")
+
+    def save(self):
+        """后台写入账本文件"""
+        data = {
+            "books": {k: book.to_list() for k, book in self.books.items()},
+            "cursors": {a: [ms, self._cursor_ids.get(a, [])] for a, ms in self.cursors.items()},
+        }
+        blocking.submit_write(self.filepath, data, "保存成交账本失败")
+
+    def apply_fills(self, account: str, fills: List[Dict],
+                    applied: Optional[List[Tuple[Dict, float]]] = None) -> List[float]:
+        """
+        记入一批按时间升序的成交 (已记过的跳过)，返回其中完成的来回的净盈亏
+        applied 不为空时追加本次新记入的 (成交, 该笔成交的已实现盈亏)
+        """
+        cursor = self.cursors.get(account, 0)
+        cursor_ids = set(self._cursor_ids.get(account, []))
+        trips = []
+
+        for fill in fills:
+            created_at = int(fill.get("created_at", 0))
+            fill_id = str(fill.get("id", ""))
+            if created_at < cursor or (created_at == cursor and fill_id in cursor_ids):
+                continue
+            if created_at > cursor:
+                cursor, cursor_ids = created_at, set()
+            cursor_ids.add(fill_id)
+
+            key = f"{account}|{fill.get('market', '')}"
+            book = self.books.get(key)
+            if book is None:
+                book = self.books[key] = MarketLedger()
+            realized = book.realized
+            net = book.apply(
+                str(fill.get("side", "")).upper(),
+                float(fill.get("price", 0)),
+                float(fill.get("size", 0)),
+                float(fill.get("fee", 0) or 0),
+            )
+            if net is not None:
+                trips.append(net)
+            if applied is not None:
+                applied.append((fill, book.realized - realized))
+
+        if cursor:
+            self.cursors[account] = cursor
+            self._cursor_ids[account] = sorted(cursor_ids)
+        return trips
+
+    def totals(self) -> Dict[str, float]:
+        """所有账号、市场的合计"""
+        books = self.books.values()
+        return {
+            "volume": sum(b.volume for b in books),
+            "fees": sum(b.fees for b in books),
+            "realized": sum(b.realized for b in books),
+            "wear": sum(b.wear for b in books),
+            "fills": sum(b.fills for b in books),
+        }
+
+
+class ExposureBook:
+    """
+    本地持仓视图 (热重启用): 账号 -> 市场 -> 机器人开出、尚未确认平掉的数量
+      - 开仓下单成功后累加，平仓成功后扣减，清理/对账后按结果清除或覆盖
+      - 正常退出且清理完成时标记 clean_exit，下次启动可以跳过对账
+      - 持久化到 exposure.json，写文件交给后台线程
+    """
+
+    def __init__(self, filepath: str = "exposure.json"):
+        self.filepath = filepath
+        self.positions: Dict[str, Dict[str, Dict[str, Any]]] = {}  # 账号 -> 市场 -> {"size", "since"}
+        self.clean_exit = False
+        self.loaded = False
+
+    def load(self):
+        """加载快照文件"""
+        try:
+            if os.path.exists(self.filepath):
+                with open(self.filepath, "r") as f:
+                    data = json.load(f)
+                self.positions = data.get("positions", {})
+                self.clean_exit = bool(data.get("clean_exit", False))
+                self.loaded = True
+        except Exception as e:
+            log.warning(f"加载持仓快照失败: {e}")
+
+    def save(self):
+        """后台写入快照文件"""
+        data = {
+            "saved_at": int(time.time() * 1000),
+            "clean_exit": self.clean_exit,
+            "positions": {a: dict(markets) for a, markets in self.positions.items()},
+        }
+        blocking.submit_write(self.filepath, data, "保存持仓快照失败")
+
+    def opened(self, account: str, market: str, size: str, ts_ms: int):
+        """记录一次开仓"""
+        markets = self.positions.setdefault(account, {})
+        entry = markets.get(market)
+        if entry is None:
+            markets[market] = {"size": size, "since": ts_ms}
+        else:
+            entry["size"] = str(Decimal(entry["size"]) + Decimal(size))
+        self.clean_exit = False
+        self.save()
+
+    def closed(self, account: str, market: str, size: Optional[str] = None):
+        """记录一次平仓 (size 为空表示该市场已无持仓)"""
+        markets = self.positions.get(account)
+        if not markets or market not in markets:
+            return
+        remaining = Decimal(markets[market]["size"]) - Decimal(size) if size is not None else Decimal(0)
+        if remaining > 0:
+            markets[market]["size"] = str(remaining)
+        else:
+            del markets[market]
+            if not markets:
+                del self.positions[account]
+        self.save()
+
+    def reset(self, account: str, positions: Optional[List[Dict]] = None, ts_ms: int = 0):
+        """清理或对账后按交易所结果覆盖某账号 (positions 为空表示已无持仓)"""
+        if positions:
+            self.positions[account] = {
+                p.get("market", ""): {"size": str(p.get("size", "0")), "since": ts_ms} for p in positions
+            }
+        elif account in self.positions:
+            del self.positions[account]
+        else:
+            return
+        self.save()
+
+    def mark_clean(self):
+        """正常退出: 所有账号已清理"""
+        self.positions = {}
+        self.clean_exit = True
+        self.save()
+
+
+# =============================================================================
+# 交易历史 (SQLite，按账号 / 市场 / 时间索引)
+# =============================================================================
+
+class TradeHistory:
+    """
+    交易历史: 每笔订单、每条成交、每个开仓周期的结果，以及每分钟各类轮询结果的计数
+      - orders / fills / cycles 按 (account, ts)、(market, ts)、(ts) 建索引，几个月的数据也能快速按时间窗口查询
+      - 空闲轮询不逐条记录，按 (分钟, 账号, 市场, 结果) 计数，作为机会命中率的分母
+      - 写入先在内存中攒批，由 writer 线程在一个事务中写入，不阻塞事件循环
+      - WAL 模式，报表 (report_sniper.py) 可以在机器人运行时读取
+    filepath 为空时不记录
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS orders ("
+        "ts INTEGER NOT NULL, account TEXT NOT NULL, market TEXT NOT NULL, purpose TEXT NOT NULL, "
+        "side TEXT, type TEXT, size REAL, price REAL, ok INTEGER NOT NULL, order_id TEXT, latency_ms REAL)",
+        "CREATE TABLE IF NOT EXISTS fills ("
+        "fill_id TEXT PRIMARY KEY, ts INTEGER NOT NULL, account TEXT NOT NULL, market TEXT NOT NULL, "
+        "side TEXT, price REAL, size REAL, fee REAL, realized REAL)",
+        "CREATE TABLE IF NOT EXISTS cycles ("
+        "ts INTEGER NOT NULL, account TEXT NOT NULL, market TEXT NOT NULL, spread_pct REAL, size REAL, "
+        "closed INTEGER NOT NULL, result TEXT, duration_ms REAL)",
+        "CREATE TABLE IF NOT EXISTS polls ("
+        "minute INTEGER NOT NULL, account TEXT NOT NULL, market TEXT NOT NULL, outcome TEXT NOT NULL, "
+        "count INTEGER NOT NULL, PRIMARY KEY (account, market, minute, outcome))",
+        "CREATE INDEX IF NOT EXISTS polls_minute ON polls (minute)",
+    ) + tuple(
+        f"CREATE INDEX IF NOT EXISTS {table}_{column}_ts ON {table} ({column}, ts)"
+        for table in ("orders", "fills", "cycles") for column in ("account", "market")
+    ) + tuple(
+        f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (ts)"
+        for table in ("orders", "fills", "cycles")
+    )
+
+    # 满足开仓条件 (点差和厚度都通过) 的轮询结果
+    ELIGIBLE_OUTCOMES = ("opened", "open_failed", "shared_limited")
+
+    def __init__(self, filepath: str = "history.db", flush_interval_s: float = 5, max_batch: int = 1000):
+        self.filepath = filepath
+        self.enabled = bool(filepath)
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self._orders: List[tuple] = []
+        self._fills: List[tuple] = []
+        self._cycles: List[tuple] = []
+        self._polls: List[tuple] = []
+        self._pending = 0
+        self._flushed_at = 0.0
+        # 当前分钟的轮询计数: 同一分钟、账号、市场内原地累加，不产生新对象
+        self._bucket_minute = 0
+        self._bucket_account = ""
+        self._bucket_market = ""
+        self._poll_counts: Dict[str, int] = {}
+        # 只在 writer 线程中使用
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def connect(filepath: str) -> sqlite3.Connection:
+        """打开历史库并建表 (报表脚本也用它)"""
+        conn = sqlite3.connect(filepath, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for sql in TradeHistory.SCHEMA:
+            conn.execute(sql)
+        return conn
+
+    # ---- 记录 (事件循环中调用，只追加到内存批次) ----
+
+    def record_order(
+        self, ts_ms: int, account: str, market: str, purpose: str, side: str, order_type: str,
+        size: Optional[str], price: Optional[str], result: Optional[Dict], latency_ms: float,
+    ):
+        """记录一次下单 (purpose: open / close / cleanup)，result 为空表示失败"""
+        if not self.enabled:
+            return
+        self._orders.append((
+            ts_ms, account, market, purpose, side, order_type,
+            float(size) if size else None, float(price) if price else None,
+            1 if result else 0, str(result.get("id", "")) if result else None, round(latency_ms, 3),
+        ))
+        self._pending += 1
+
+    def record_fills(self, account: str, fills: List[Tuple[Dict, float]]):
+        """记录账本新记入的成交 (成交, 该笔成交的已实现盈亏)"""
+        if not self.enabled or not fills:
+            return
+        for fill, realized in fills:
+            self._fills.append((
+                str(fill.get("id", "")), int(fill.get("created_at", 0)), account, fill.get("market", ""),
+                str(fill.get("side", "")).upper(), float(fill.get("price", 0)), float(fill.get("size", 0)),
+                float(fill.get("fee", 0) or 0), realized,
+            ))
+        self._pending += len(fills)
+
+    def record_cycle(
+        self, ts_ms: int, account: str, market: str, spread_pct: float, size: Optional[str],
+        closed: bool, result: str, duration_ms: float,
+    ):
+        """记录一个开了仓的周期的结果"""
+        if not self.enabled:
+            return
+        self._cycles.append((
+            ts_ms, account, market, round(spread_pct, 6), float(size) if size else None,
+            1 if closed else 0, result, round(duration_ms, 1),
+        ))
+        self._pending += 1
+
+    def count_poll(self, ts_ms: int, account: str, market: str, outcome: str):
+        """轮询结果计数 (每次轮询调用)"""
+        if not self.enabled:
+            return
+        minute = ts_ms // 60000
+        if minute != self._bucket_minute or account != self._bucket_account or market != self._bucket_market:
+            self._close_bucket()
+            self._bucket_minute, self._bucket_account, self._bucket_market = minute, account, market
+        counts = self._poll_counts
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+    def _close_bucket(self):
+        """当前分钟的计数放入批次"""
+        if self._poll_counts:
+            for outcome, count in self._poll_counts.items():
+                self._polls.append((self._bucket_minute, self._bucket_account, self._bucket_market, outcome, count))
+            self._pending += len(self._poll_counts)
+            self._poll_counts.clear()
+
+    # ---- 写入 (writer 线程) ----
+
+    def maybe_flush(self, now_s: float):
+        """距上次写入超过 flush_interval_s 或批次已满时写入"""
+        if self._pending >= self.max_batch or (
+            now_s - self._flushed_at >= self.flush_interval_s and (self._pending or self._poll_counts)
+        ):
+            self.flush(now_s)
+
+    def flush(self, now_s: float = 0.0):
+        """把当前批次交给 writer 线程 (当前分钟的计数也一起写入，之后继续累加)"""
+        if not self.enabled:
+            return
+        self._flushed_at = now_s
+        self._close_bucket()
+        if not self._pending:
+            return
+        batch = (self._orders, self._fills, self._cycles, self._polls)
+        self._orders, self._fills, self._cycles, self._polls = [], [], [], []
+        self._pending = 0
+        blocking.submit_call(self._write_batch, batch, error_msg="写入交易历史失败")
+
+    def _write_batch(self, batch: Tuple[List[tuple], ...]):
+        orders, fills, cycles, polls = batch
+        if self._conn is None:
+            self._conn = self.connect(self.filepath)
+        with self._conn:
+            if orders:
+                self._conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", orders)
+            if fills:
+                self._conn.executemany("INSERT OR IGNORE INTO fills VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", fills)
+            if cycles:
+                self._conn.executemany("INSERT INTO cycles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", cycles)
+            if polls:
+                self._conn.executemany(
+                    "INSERT INTO polls VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (account, market, minute, outcome) DO UPDATE SET count = count + excluded.count",
+                    polls,
+                )
+
+    def close(self):
+        """写入剩余批次并在 writer 线程关闭连接"""
+        if not self.enabled:
+            return
+        self.flush()
+        blocking.submit_call(self._close_connection)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _history_filter(column: str, since_ms: int, until_ms: Optional[int],
+                    account: Optional[str], market: Optional[str]) -> Tuple[str, List[Any]]:
+    """时间窗口 + 账号 / 市场过滤条件"""
+    where, params = [f"{column} >= ?"], [since_ms]
+    if until_ms is not None:
+        where.append(f"{column} < ?")
+        params.append(until_ms)
+    if account:
+        where.append("account = ?")
+        params.append(account)
+    if market:
+        where.append("market = ?")
+        params.append(market)
+    return " AND ".join(where), params
+
+
+def history_fills_per_hour(conn: sqlite3.Connection, since_ms: int, until_ms: Optional[int] = None,
+                           account: Optional[str] = None, market: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按小时统计成交笔数、成交量和磨损"""
+    where, params = _history_filter("ts", since_ms, until_ms, account, market)
+    rows = conn.execute(
+        f"SELECT ts / 3600000 * 3600000 AS hour, COUNT(*), SUM(price * size), SUM(fee) - SUM(realized) "
+        f"FROM fills WHERE {where} GROUP BY hour ORDER BY hour", params,
+    ).fetchall()
+    return [{"hour_ms": h, "fills": n, "volume": v or 0.0, "wear": w or 0.0} for h, n, v, w in rows]
+
+
+def history_wear_by_account(conn: sqlite3.Connection, since_ms: int, until_ms: Optional[int] = None,
+                            market: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按账号统计成交、手续费、已实现盈亏和磨损 (磨损从大到小)"""
+    where, params = _history_filter("ts", since_ms, until_ms, None, market)
+    # +account: 按时间索引取窗口内的行再分组，避免为了省掉排序而扫描整个 (account, ts) 索引
+    rows = conn.execute(
+        f"SELECT account, COUNT(*), SUM(price * size), SUM(fee), SUM(realized) "
+        f"FROM fills WHERE {where} GROUP BY +account", params,
+    ).fetchall()
+    result = [
+        {"account": a, "fills": n, "volume": v or 0.0, "fees": f or 0.0, "realized": r or 0.0,
+         "wear": (f or 0.0) - (r or 0.0)}
+        for a, n, v, f, r in rows
+    ]
+    result.sort(key=lambda row: row["wear"], reverse=True)
+    return result
+
+
+def history_hit_rate(conn: sqlite3.Connection, since_ms: int, until_ms: Optional[int] = None,
+                     account: Optional[str] = None, market: Optional[str] = None) -> Dict[str, Any]:
+    """机会命中率: 满足开仓条件的轮询中实际开仓的比例，以及各类轮询结果的计数"""
+    # 计数按分钟聚合，包含 until_ms 所在的分钟
+    where, params = _history_filter(
+        "minute", since_ms // 60000, None if until_ms is None else until_ms // 60000 + 1, account, market
+    )
+    outcomes = dict(conn.execute(
+        f"SELECT outcome, SUM(count) FROM polls WHERE {where} GROUP BY outcome", params,
+    ).fetchall())
+    eligible = sum(outcomes.get(o, 0) for o in TradeHistory.ELIGIBLE_OUTCOMES)
+    opened = outcomes.get("opened", 0)
+    return {
+        "polls": sum(outcomes.values()),
+        "eligible": eligible,
+        "opened": opened,
+        "hit_rate": opened / eligible if eligible else 0.0,
+        "outcomes": outcomes,
+    }
+
+
+def history_order_stats(conn: sqlite3.Connection, since_ms: int, until_ms: Optional[int] = None,
+                        account: Optional[str] = None, market: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按用途 (open / close) 统计下单次数、失败次数和平均延迟"""
+    where, params = _history_filter("ts", since_ms, until_ms, account, market)
+    rows = conn.execute(
+        f"SELECT purpose, COUNT(*), SUM(ok = 0), AVG(latency_ms), MAX(latency_ms) "
+        f"FROM orders WHERE {where} GROUP BY purpose ORDER BY purpose", params,
+    ).fetchall()
+    return [
+        {"purpose": p, "orders": n, "failed": f or 0, "avg_latency_ms": a or 0.0, "max_latency_ms": m or 0.0}
+        for p, n, f, a, m in rows
+    ]
+
+
+# =============================================================================
+# 交易机器人主逻辑
+# =============================================================================
+
+class SniperBot:
+    """狙击机器人 - 对应原脚本的主循环逻辑"""
+
+    def __init__(
+        self,
+        client: ParadexInteractiveClient,
+        config: TradingConfig,
+        account_manager: Optional[AccountManager] = None,
+        state_file: str = "sniper_state.json",
+        config_file: Optional[str] = None,
+        ledger_file: str = "ledger.json",
+        clock: Optional[Clock] = None,
+        exposure_file: str = "exposure.json",
+        rate_backend: Optional[RateBackend] = None,
+        history_file: str = "history.db",
+    ):
+        self.client = client
+        self.config = config
+        self.state_file = state_file
+        self.clock = clock or system_clock
+        self.stats = Stats()
+        self.rate_state = RateLimitState()
+        self._usage = RateUsage()
+        self.account_manager = account_manager
+
+        # 限速状态后端: 默认只用本地状态；共享后端在开仓前占用名额，平仓后记入
+        self.rate_backend = rate_backend or LocalRateBackend()
+        self._rate_token = uuid.uuid4().hex[:8]
+        self._rate_seq = 0
+
+        # 按市场精度预先换算的开仓/平仓条件
+        self._entry_rule: Optional[EntryRule] = None
+        self._close_threshold = SpreadThreshold(config.close_spread_target)
+        self._first_eligible_seen = False
+
+        # 配置热加载: 新配置先放在 _pending_config，两个周期之间替换
+        self._config_watcher = ConfigWatcher(config_file) if config_file else None
+        self._pending_config: Optional[TradingConfig] = None
+        self._lag_monitor: Optional[LoopLagMonitor] = None
+
+        # 流水线模式下后台平仓中的周期
+        self._inflight: set = set()
+
+        # 成交账本: 成交量、手续费、盈亏由成交记录计算，定期增量同步
+        self.ledger = ExecutionLedger(ledger_file)
+        self.ledger.load()
+        self.ledger_sync_interval_s = 30
+        self._ledger_synced_at = 0.0
+
+        # 本地持仓视图: 重启时据此对账
+        self.exposure = ExposureBook(exposure_file)
+        self.exposure.load()
+
+        # 交易历史: 订单、成交、周期结果和轮询计数 (history_file 为空时不记录)
+        self.history = TradeHistory(history_file)
+        self._cycle_outcome = ""
+        self._ledger_start_ms = self.clock.time_ms()
+
+        # 加载持久化数据
+        self._load_state()
+
+        # 注意: account_manager 的状态应该在 main() 中提前加载
+        # 这样确保 client 与 current_index 同步
+        # 这里只同步 rate_state
+        if self.account_manager:
+            self.rate_state = self.account_manager.get_current_rate_state()
+            self._sync_account_limits()
+
+    def _sync_account_limits(self):
+        """账号调度使用与配置一致的小时/日限制"""
+        self.account_manager.daily_limits = self.config.limits_per_day
+        self.account_manager.hourly_limits = self.config.limits_per_hour
+        self.account_manager._rebuild_schedule()
+
+    def _on_config_change(self, new_config: TradingConfig):
+        """配置监视器回调: 记下新配置，等当前周期结束后替换"""
+        self._pending_config = new_config
+
+    def _apply_pending_config(self):
+        """在两个周期之间整体替换配置，并失效按旧配置换算的条件 (连接、token、限速状态不受影响)"""
+        new, self._pending_config = self._pending_config, None
+        old = self.config
+        new.enabled = old.enabled
+        diff = [
+            f"{f.name}: {getattr(old, f.name)} -> {getattr(new, f.name)}"
+            for f in fields(TradingConfig) if getattr(old, f.name) != getattr(new, f.name)
+        ]
+        if not diff:
+            return
+
+        self.config = new
+        self._entry_rule = None
+        self._close_threshold = SpreadThreshold(new.close_spread_target)
+        if self.account_manager:
+            self._sync_account_limits()
+        if self._lag_monitor:
+            self._lag_monitor.threshold_ms = new.loop_lag_threshold_ms
+
+        metrics.inc("config_reloads")
+        log.info(f"配置已更新: {', '.join(diff)}")
+
+    def _load_state(self):
+        """加载持久化状态"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, "r") as f:
+                    data = json.load(f)
+                    self.stats = Stats(**data.get("stats", {}))
+                    self.rate_state = RateLimitState(**data.get("rate_state", {}))
+        except Exception as e:
+            log.warning(f"加载状态失败: {e}")
+
+    def _save_state(self):
+        """保存持久化状态"""
+        try:
+            data = {
+                "stats": {
+                    "is_running": self.stats.is_running,
+                    "runs": self.stats.runs,
+                    "total_wear": self.stats.total_wear,
+                    "total_volume": self.stats.total_volume,
+                    "last_wear": self.stats.last_wear,
+                    "last_delta": self.stats.last_delta,
+                },
+                "rate_state": self.rate_state.to_dict(),  # 只保留最近1000条
+            }
+            # 写文件交给后台线程
+            blocking.submit_write(self.state_file, data)
+        except Exception as e:
+            log.warning(f"保存状态失败: {e}")
+
+    def _entry_rule_for(self, spec: MarketSpec) -> EntryRule:
+        """获取开仓条件 (市场精度变化时重建)"""
+        rule = self._entry_rule
+        if rule is None or rule.spec is not spec:
+            rule = self._entry_rule = EntryRule(
+                spec, self.config.spread_threshold_percent, self.config.min_order_book_size_usd
+            )
+        return rule
+
+    def _day_key(self) -> str:
+        """获取当天日期键"""
+        return self.clock.day_key()
+
+    def _prune_trades(self):
+        """清理过期的交易记录"""
+        cutoff = self.clock.time_ms() - 86400000  # 24小时前
+        self.rate_state.prune(cutoff)
+
+    def _count_trades_in_window(self, window_ms: int) -> int:
+        """统计时间窗口内的交易数"""
+        cutoff = self.clock.time_ms() - window_ms
+        return self.rate_state.count_since(cutoff)
+
+    def _can_trade(self) -> tuple[bool, Optional[str], RateUsage]:
+        """检查是否可以交易（限速检查）"""
+        # 如果使用多账号管理器
+        if self.account_manager:
+            return self._can_trade_multi_account()
+
+        # 单账号模式（原逻辑）
+        # 检查日期是否变化
+        if self.rate_state.day != self._day_key():
+            self.rate_state.reset(self._day_key())
+
+        self._prune_trades()
+
+        # 流水线模式: 为后台未完成的平仓和本次开仓对应的平仓预留额度
+        reserved = self._reserved_trades()
+        usage = self._usage
+        usage.sec = self._count_trades_in_window(1000) + reserved
+        usage.min = self._count_trades_in_window(60000) + reserved
+        usage.hour = self._count_trades_in_window(3600000) + reserved
+        usage.day = len(self.rate_state.trades) + reserved
+
+        if usage.day >= self.config.limits_per_day:
+            return False, "day", usage
+        if usage.hour >= self.config.limits_per_hour:
+            return False, "hour", usage
+        if usage.min >= self.config.limits_per_minute:
+            return False, "min", usage
+        if usage.sec >= self.config.limits_per_second:
+            return False, "sec", usage
+        if self.rate_state.blocked_until > self.clock.time_ms():
+            return False, self.rate_state.blocked_window, usage
+
+        return True, None, usage
+
+    def _can_trade_multi_account(self) -> tuple[bool, Optional[str], RateUsage]:
+        """多账号模式的限速检查"""
+        # 使用当前账号的限速状态
+        self.rate_state = self.account_manager.get_current_rate_state()
+
+        # 检查日期是否变化
+        if self.rate_state.day != self._day_key():
+            self.rate_state.reset(self._day_key())
+
+        self._prune_trades()
+
+        reserved = self._reserved_trades()
+        usage = self._usage
+        usage.sec = self._count_trades_in_window(1000) + reserved
+        usage.min = self._count_trades_in_window(60000) + reserved
+        usage.hour = self._count_trades_in_window(3600000) + reserved
+        usage.day = len(self.rate_state.trades) + reserved
+        usage.account = self.account_manager.get_current_account_name()
+
+        # 检查是否达到日限制 (1000单)，如果所有账号都满了就停止
+        if usage.day >= self.config.limits_per_day:
+            log.info(f"{usage.account} 达到日限制 ({usage.day}/{self.config.limits_per_day})")
+
+            # 检查是否所有账号的 day 限制都满了
+            if self.account_manager.all_accounts_exhausted():
+                return False, "all_accounts_exhausted", usage
+
+            # 标记需要切换账号 (hour 限制触发切换，day 限制不切换只是等待)
+            return False, "day_limit_wait", usage
+
+        # 检查是否达到小时限制 (300单)，触发账号轮换
+        if usage.hour >= self.config.limits_per_hour:
+            log.info(f"{usage.account} 达到小时限制 ({usage.hour}/{self.config.limits_per_hour})，需要切换账号...")
+            return False, "hour_switch", usage
+        if usage.min >= self.config.limits_per_minute:
+            return False, "min", usage
+        if usage.sec >= self.config.limits_per_second:
+            return False, "sec", usage
+        # 共享后端告知的受限窗口 (其他进程用掉了额度)
+        if self.rate_state.blocked_until > self.clock.time_ms():
+            return False, self._shared_limit_reason(self.rate_state.blocked_window), usage
+
+        return True, None, usage
+
+    def _shared_limit_reason(self, window: str) -> str:
+        """共享后端的受限窗口换成主循环的处理方式 (多账号模式下 hour/day 受限触发切换账号)"""
+        if not self.account_manager:
+            return window
+        if window == "day":
+            return "all_accounts_exhausted" if self.account_manager.all_accounts_exhausted() else "day_limit_wait"
+        if window == "hour":
+            return "hour_switch"
+        return window
+
+    def _next_rate_member(self, now_ms: int) -> str:
+        """共享后端中一次交易的唯一标识 (多个进程同一毫秒交易也不重复)"""
+        self._rate_seq += 1
+        return f"{now_ms}-{self._rate_token}-{self._rate_seq}"
+
+    async def _reserve_shared_slot(self) -> Tuple[Optional[Tuple[str, str]], str]:
+        """
+        开仓前在共享后端原子地检查各窗口并占用一个名额 (一次往返)，返回 ((账号, 标识), "") 或 (None, 受限说明)
+        受限时把解除时间记在本地限速状态上，此前的轮询由本地检查直接拒绝，不再访问后端；
+        后端不可用时不开仓 (宁可少做也不超出交易所限额)
+        """
+        config = self.config
+        key = self.client.l2_address
+        now_ms = self.clock.time_ms()
+        member = self._next_rate_member(now_ms)
+        limits = (config.limits_per_second, config.limits_per_minute, config.limits_per_hour, config.limits_per_day)
+        started = time.perf_counter()
+        try:
+            ok, window, counts, retry_at = await self.rate_backend.reserve(
+                key, member, now_ms, self.clock.day_start_ms(), limits, self._reserved_trades()
+            )
+        except Exception as e:
+            metrics.inc("rate_backend_errors")
+            return None, f"共享限速后端不可用: {e!r}"
+        metrics.observe("rate_reserve_ms", (time.perf_counter() - started) * 1000)
+
+        if ok:
+            return (key, member), ""
+
+        metrics.inc("rate_shared_denied")
+        self.rate_state.blocked_until = self.clock.next_day_ms() if window == "day" else retry_at
+        self.rate_state.blocked_window = window
+        sec, minute, hour, day = counts
+        return None, f"{self._shared_limit_reason(window)} (sec={sec}, min={minute}, hour={hour}, day={day})"
+
+    async def _release_shared_slot(self, slot: Tuple[str, str]):
+        """开仓失败，撤销占用的名额"""
+        try:
+            await self.rate_backend.release(*slot)
+        except Exception as e:
+            metrics.inc("rate_backend_errors")
+            log.warning(f"撤销共享限速名额失败: {e!r}")
+
+    async def _record_shared_trade(self, client: ParadexInteractiveClient):
+        """平仓记入共享后端 (平仓必须执行，不检查限制)"""
+        now_ms = self.clock.time_ms()
+        try:
+            await self.rate_backend.record(client.l2_address, self._next_rate_member(now_ms), now_ms)
+        except Exception as e:
+            metrics.inc("rate_backend_errors")
+            log.warning(f"平仓记入共享限速后端失败: {e!r}")
+
+    def _pipelined(self) -> bool:
+        """是否为流水线模式"""
+        return self.config.max_open_positions > 1
+
+    def _reserved_trades(self) -> int:
+        """流水线模式下需预留的交易次数: 后台每个未完成的平仓 1 次 + 本次开仓后的平仓 1 次"""
+        if not self._pipelined():
+            return 0
+        return len(self._inflight) + 1
+
+    async def _drain_inflight(self):
+        """等待后台平仓全部完成 (切换账号、清理、退出前调用)"""
+        if self._inflight:
+            log.info(f"等待 {len(self._inflight)} 个后台平仓完成...")
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def _sync_ledger(self, force: bool = False):
+        """
+        拉取当前账号的新成交记入账本，并更新统计 (成交量、磨损、最近一个来回的盈亏)
+        非 force 时按 ledger_sync_interval_s 节流，一次请求覆盖多个周期
+        """
+        if not force and self.clock.time() - self._ledger_synced_at < self.ledger_sync_interval_s:
+            return
+        self._ledger_synced_at = self.clock.time()
+
+        account = self.client.l2_address
+        start_at = self.ledger.cursors.get(account, self._ledger_start_ms)
+        fills = await self.client.get_fills(start_at=start_at)
+        if not fills:
+            return
+
+        applied = [] if self.history.enabled else None
+        for net in self.ledger.apply_fills(account, fills, applied):
+            self.stats.last_delta = net
+            self.stats.last_wear = -net
+        self.history.record_fills(account, applied)
+        totals = self.ledger.totals()
+        self.stats.total_volume = totals["volume"]
+        self.stats.total_wear = totals["wear"]
+        metrics.set_gauge("ledger_volume", round(totals["volume"], 2))
+        metrics.set_gauge("ledger_wear", round(totals["wear"], 6))
+        self.ledger.save()
+        self._save_state()
+
+    def _record_trade(self):
+        """记录一次交易"""
+        self.rate_state.trades.append(self.clock.time_ms())
+
+        # 如果使用多账号管理器，也记录到管理器中并保存
+        if self.account_manager:
+            self.account_manager.save_state()
+        else:
+            self._save_state()
+
+    async def _open_position(self) -> tuple[bool, str, Optional[str]]:
+        """
+        开仓逻辑
+        使用 Last Price 下限价单
+        返回 (是否成功, 说明, 开仓数量)
+        """
+        try:
+            market = self.config.market
+
+            # 获取市场精度 (tick / lot)
+            with tracer.span("market_info"):
+                spec = await self.client.get_market_spec(market)
+            if not spec:
+                return False, "无法获取市场信息", None
+
+            # 获取 BBO
+            with tracer.span("bbo_fetch"):
+                bbo = await self.client.get_bbo(market)
+            if not bbo:
+                return False, "无法获取 BBO", None
+
+            # 获取余额
+            with tracer.span("balance"):
+                balance = await self.client.get_balance()
+            if not balance or balance < spec.min_notional:
+                return False, f"余额不足: {balance}", None
+
+            # 使用 mid price 作为限价（向下对齐到 tick）
+            price_ticks = (bbo.bid_ticks + bbo.ask_ticks) // 2
+
+            # 计算开仓大小 (lot 数，向下对齐到 size_increment)
+            if self.config.fixed_size:
+                # 使用固定大小
+                lots = spec.size_to_lots(self.config.fixed_size)
+            else:
+                # 按余额百分比计算
+                trade_value = Fraction(balance) * self.config.open_size_percent / 100
+                mid_value = Fraction(bbo.bid_ticks + bbo.ask_ticks, 2) * Fraction(spec.tick_size)
+                lots = int(trade_value / (mid_value * Fraction(spec.size_increment)))
+
+            if lots * price_ticks < spec.min_notional_units:
+                return False, f"订单金额低于最小值 {spec.min_notional}", None
+
+            size = spec.lots_to_size(lots)
+            price = spec.ticks_to_price(price_ticks)
+
+            # 下单
+            sent_ms, sent_at = self.clock.time_ms(), time.perf_counter()
+            result = await self.client.place_limit_order(
+                market=market,
+                side="BUY",
+                size=size,
+                price=price,
+                instruction="GTC"
+            )
+            self.history.record_order(
+                sent_ms, self.client.l2_address, market, "open", "BUY", "LIMIT", size, price, result,
+                (time.perf_counter() - sent_at) * 1000,
+            )
+
+            if result:
+                self.exposure.opened(self.client.l2_address, market, size, self.clock.time_ms())
+                return True, f"开仓成功: {size} @ {price}", size
+            else:
+                return False, "下单失败", None
+
+        except Exception as e:
+            return False, f"开仓异常: {e}", None
+
+    async def _close_position(
+        self,
+        client: Optional[ParadexInteractiveClient] = None,
+        max_size: Optional[str] = None,
+    ) -> tuple[bool, str]:
+        """
+        平仓逻辑
+        智能择时：点差 <= 目标点差时平仓，或超时强制平仓
+        流水线模式下只平本周期开的数量 (max_size)，不影响其他周期的仓位
+        """
+        client = client or self.client
+        try:
+            market = self.config.market
+            start_time = self.clock.time_ms()
+
+            polls = 0
+            while True:
+                # 检查是否超时
+                elapsed = self.clock.time_ms() - start_time
+                polls += 1
+
+                # 获取当前点差
+                with tracer.span("close_poll", iteration=polls) as poll_span:
+                    bbo = await client.get_bbo(market)
+                    spread_ok = bbo is not None and self._close_threshold.allows(bbo)
+                    if poll_span:
+                        poll_span.set("spread_ok", spread_ok)
+
+                # 满足平仓条件：点差足够小 或 超时
+                can_close = spread_ok or (elapsed > self.config.close_timeout_ms)
+
+                if not can_close:
+                    await self.clock.sleep(0.2)
+                    continue
+
+                # 获取当前持仓
+                with tracer.span("positions_fetch"):
+                    positions = await client.get_positions(market)
+                if positions is None:
+                    return False, "查询持仓失败"
+                if not positions:
+                    self.exposure.closed(client.l2_address, market)
+                    return True, "无持仓需要平仓"
+
+                pos = positions[0]
+                size = pos.get("size", "0")
+                side = pos.get("side", "LONG")
+
+                if float(size) <= 0:
+                    self.exposure.closed(client.l2_address, market)
+                    return True, "持仓已关闭"
+
+                if max_size is not None and Decimal(max_size) < Decimal(size):
+                    size = max_size
 
                 # 平仓方向与持仓相反
                 close_side = "SELL" if side == "LONG" else "BUY"
 
-                # 市价平仓
-                result = await self.client.place_market_order(
-                    market=market,
-                    side=close_side,
-                    size=size,
-                    reduce_only=True
+                # 市价平仓
+                sent_ms, sent_at = self.clock.time_ms(), time.perf_counter()
+                result = await client.place_market_order(
+                    market=market,
+                    side=close_side,
+                    size=size,
+                    reduce_only=True
+                )
+                self.history.record_order(
+                    sent_ms, client.l2_address, market, "close", close_side, "MARKET", size, None, result,
+                    (time.perf_counter() - sent_at) * 1000,
+                )
+
+                if result:
+                    self.exposure.closed(client.l2_address, market, size)
+                    reason = "点差满足" if spread_ok else "超时强平"
+                    return True, f"平仓成功 ({reason}): {size}"
+                else:
+                    return False, "平仓下单失败"
+
+        except Exception as e:
+            return False, f"平仓异常: {e}"
+
+    async def run_cycle(self) -> tuple[bool, str]:
+        """运行一个交易周期 (记录 trace，有下单的周期全部保留)"""
+        account = self.account_manager.get_current_account_name() if self.account_manager else self.client.l2_address[:10]
+        with tracer.start_trace("run_cycle", account=account, market=self.config.market) as root:
+            success, msg = await self._run_cycle()
+            if root:
+                root.set("result", msg[:120])
+        history = self.history
+        if history.enabled:
+            now = self.clock.time()
+            history.count_poll(int(now * 1000), self.client.l2_address, self.config.market, self._cycle_outcome)
+            history.maybe_flush(now)
+        # 流水线模式下 trace 由后台平仓任务结束
+        if root is None or not root.attributes.get("pipelined"):
+            tracer.finish(root, keep=root is not None and any(s.name == "open_position" for s in root.trace.spans))
+        return success, msg
+
+    async def _run_cycle(self) -> tuple[bool, str]:
+        """交易周期: 限速检查 -> 点差/厚度 -> 开仓 -> 平仓"""
+        market = self.config.market
+
+        # 流水线模式: 持仓数达到上限时等后台平仓
+        if len(self._inflight) >= self.config.max_open_positions:
+            self._cycle_outcome = "inflight_full"
+            return False, f"持仓已达上限: {len(self._inflight)}/{self.config.max_open_positions}"
+
+        # 1. 检查限速
+        with tracer.span("rate_check"):
+            can_trade, reason, usage = self._can_trade()
+        if not can_trade:
+            self._cycle_outcome = "rate_limited"
+            return False, f"限速中: {reason} ({usage})"
+
+        # 2. 获取订单簿 (同时用于点差和厚度检查)
+        with tracer.span("bbo_fetch"):
+            bbo = await self.client.get_bbo(market)
+        if not bbo:
+            self._cycle_outcome = "no_bbo"
+            market_data = self.client.market_data
+            if market_data is not None and market in market_data.last_reject:
+                return False, f"没有新鲜行情，暂停开仓: {market_data.last_reject[market]}"
+            return False, "无法获取订单簿"
+
+        # 计算点差 (整数 tick 精确比较，无需浮点容差)
+        if bbo.bid_ticks + bbo.ask_ticks <= 0:
+            self._cycle_outcome = "no_bbo"
+            return False, "无法计算点差"
+
+        rule = self._entry_rule_for(bbo.spec)
+        if not rule.spread.allows(bbo):
+            self._cycle_outcome = "spread"
+            return False, f"点差过大: {bbo.spread_percent():.4f}% > {self.config.spread_threshold_percent}%"
+
+        # 3. 检查订单簿厚度
+        if not rule.depth_ok(bbo):
+            self._cycle_outcome = "depth"
+            bid_usd = bbo.bid_size * bbo.bid
+            ask_usd = bbo.ask_size * bbo.ask
+            return False, f"订单簿不足: 买一=${bid_usd:.2f} 卖一=${ask_usd:.2f} (size: {bbo.bid_size:.6f}/{bbo.ask_size:.6f})"
+
+        log.info(f"条件满足! 点差={bbo.spread_percent():.4f}%, 开始开仓...")
+
+        # 记录启动到首次满足开仓条件的耗时
+        if not self._first_eligible_seen:
+            self._first_eligible_seen = True
+            elapsed_ms = (time.perf_counter() - _PROCESS_START) * 1000
+            metrics.set_gauge("startup_to_first_eligible_ms", elapsed_ms)
+            log.info(f"启动到首次满足开仓条件: {elapsed_ms:.0f}ms")
+
+        # 共享限速: 多个进程共用账号额度时，开仓前在后端占用名额
+        slot = None
+        if self.rate_backend.shared:
+            with tracer.span("rate_reserve"):
+                slot, reason = await self._reserve_shared_slot()
+            if slot is None:
+                self._cycle_outcome = "shared_limited"
+                return False, f"限速中 (共享): {reason}"
+
+        # 4. 开仓
+        opened_at_ms = self.clock.time_ms()
+        with tracer.span("open_position"):
+            success, msg, size = await self._open_position()
+        if not success:
+            self._cycle_outcome = "open_failed"
+            if slot:
+                await self._release_shared_slot(slot)
+            return False, f"开仓失败: {msg}"
+
+        self._cycle_outcome = "opened"
+        entry = (opened_at_ms, bbo.spread_percent(), size)
+
+        self._record_trade()
+        log.info(msg)
+
+        # 流水线模式: 平仓交给后台任务，立即返回评估下一次机会
+        if self._pipelined():
+            root = _current_span.get()
+            if root:
+                root.set("pipelined", True)
+            task = asyncio.create_task(self._finish_cycle_in_background(self.client, size, root, entry))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            return True, f"已开仓，后台平仓中 ({len(self._inflight)}/{self.config.max_open_positions})"
+
+        return await self._finish_cycle(self.client, entry=entry)
+
+    async def _finish_cycle(
+        self,
+        client: ParadexInteractiveClient,
+        size: Optional[str] = None,
+        entry: Optional[Tuple[int, float, Optional[str]]] = None,
+    ) -> tuple[bool, str]:
+        """开仓之后: 等待 -> 平仓 -> 更新统计；entry 为 (开仓时间 ms, 开仓点差 %, 开仓数量)，记入交易历史"""
+        with tracer.span("sleep"):
+            await self.clock.sleep(0.5)
+
+        # 5. 平仓
+        log.info("准备平仓...")
+        with tracer.span("close_position"):
+            success, msg = await self._close_position(client, size)
+        if success:
+            self._record_trade()
+            if self.rate_backend.shared:
+                await self._record_shared_trade(client)
+
+        log.info(msg)
+        if entry is not None:
+            opened_at_ms, spread_pct, open_size = entry
+            self.history.record_cycle(
+                opened_at_ms, client.l2_address, self.config.market, spread_pct, open_size,
+                success, msg, self.clock.time_ms() - opened_at_ms,
+            )
+
+        # 更新统计 (成交量和盈亏由成交账本计算，不再查询余额)
+        self.stats.runs += 1
+        self._save_state()
+
+        return True, "周期完成"
+
+    async def _finish_cycle_in_background(
+        self, client: ParadexInteractiveClient, size: str, root: Optional[Span],
+        entry: Optional[Tuple[int, float, Optional[str]]] = None,
+    ):
+        """流水线模式的后台平仓，结束时补全并提交本周期的 trace；期间固定客户端，防止被池淘汰关闭"""
+        if self.account_manager:
+            self.account_manager.pin(client)
+        try:
+            _, msg = await self._finish_cycle(client, size, entry)
+            log.info(f"后台平仓完成: {msg}")
+        except Exception as e:
+            log.error(f"后台平仓异常: {e}")
+        finally:
+            if self.account_manager:
+                self.account_manager.unpin(client)
+            if root:
+                root.end_ns = time.time_ns()
+                tracer.finish(root, keep=True)
+
+    async def run(self):
+        """主运行循环"""
+        log.info("=" * 50)
+        log.info("Jess-Para Sniper Bot (V27 Python API - 多账号版)")
+        log.info(f"市场: {self.config.market}")
+        log.info(f"点差阈值: {self.config.spread_threshold_percent}%")
+        log.info(f"订单簿最小厚度: ${self.config.min_order_book_size_usd}")
+
+        # 显示多账号信息
+        if self.account_manager:
+            stats = self.account_manager.get_all_stats()
+            log.info(f"多账号模式: 共 {stats['total_accounts']} 个账号")
+            if stats["total_accounts"] <= ACCOUNT_DETAIL_LOG_MAX:
+                for acc in stats["accounts"]:
+                    status = "🔴 已满" if acc["is_limited"] else "🟢 可用"
+                    log.info(f"  {acc['name']}: 今日 {acc['trades_today']}/{self.config.limits_per_day} {status}")
+            else:
+                limited = sum(1 for acc in stats["accounts"] if acc["is_limited"])
+                log.info(f"  🟢 可用 {stats['total_accounts'] - limited} 个, 🔴 已满 {limited} 个")
+            log.info(f"当前账号: {stats['current_account']}")
+        else:
+            log.info("单账号模式")
+
+        log.info("=" * 50)
+
+        # 初始认证 (bootstrap 已认证时直接复用 token)
+        if not await self.client.ensure_authenticated():
+            log.error("初始认证失败!")
+            await self._close_clients()
+            return
+
+        # 热重启: 对账并清掉残留的挂单和仓位，之后直接开始交易
+        await self.reconcile_on_start()
+
+        log.info("认证成功，开始监控...")
+        self.config.enabled = True
+
+        # 事件循环延迟监控 (虚拟时钟下没有意义)
+        lag_monitor = None
+        if self.clock.realtime:
+            lag_monitor = self._lag_monitor = LoopLagMonitor(threshold_ms=self.config.loop_lag_threshold_ms)
+            lag_monitor.start()
+
+        # 配置文件监视
+        config_task = None
+        if self._config_watcher:
+            self._config_watcher.mark_loaded()
+            config_task = asyncio.create_task(
+                self._config_watcher.watch(lambda: self.config, self._on_config_change)
+            )
+
+        # 低分配模式: 启动完成，冻结长期对象并接管垃圾回收
+        gc_control.start()
+
+        cycle_count = 0
+        last_status_time = self.clock.time()
+        last_stats_time = self.clock.time()
+        last_cleanup_time = self.clock.time()  # 上次清理检查时间
+
+        while not _shutdown_requested:
+            try:
+                if self._pending_config is not None:
+                    self._apply_pending_config()
+
+                if not self.config.enabled:
+                    log.info("机器人已暂停")
+                    await self.clock.sleep(1)
+                    continue
+
+                success, msg = await self.run_cycle()
+                cycle_count += 1
+
+                # 检查是否所有账号都用完
+                if "all_accounts_exhausted" in msg:
+                    log.warning("=" * 50)
+                    log.warning("所有账号今日交易额度已用完!")
+                    log.warning("明天将自动重置，或手动添加新账号")
+                    log.warning("=" * 50)
+                    # 清理后等待到明天凌晨
+                    await self._periodic_cleanup()
+                    await self._wait_until_tomorrow()
+                    continue
+
+                # 检查是否需要因 hour 限制切换账号
+                if "hour_switch" in msg and self.account_manager:
+                    switch_result = await self._switch_account_with_cleanup()
+
+                    if switch_result == "wait_hour":
+                        # 所有账号 hour 都满了，清理后等到最早的账号恢复
+                        await self._periodic_cleanup()
+                        await self._wait_for_next_account()
+
+                    elif switch_result == "wait_day":
+                        # 所有账号 day 都满了
+                        await self._periodic_cleanup()
+                        await self._wait_until_tomorrow()
+
+                    continue
+
+                # 检查是否达到 day 限制但还有其他账号可用
+                if "day_limit_wait" in msg and self.account_manager:
+                    # 当前账号 day 满了，尝试切换到 hour 未满的账号
+                    switch_result = await self._switch_account_with_cleanup()
+
+                    if switch_result == "wait_hour":
+                        await self._periodic_cleanup()
+                        await self._wait_for_next_account()
+
+                    elif switch_result == "wait_day":
+                        await self._periodic_cleanup()
+                        await self._wait_until_tomorrow()
+
+                    continue
+
+                if success:
+                    log.info(f"交易完成: {msg}")
+                    # 交易成功，重置清理计时器
+                    last_cleanup_time = self.clock.time()
+                    if self._pipelined():
+                        # 流水线模式: 只按每秒限速间隔，平仓在后台进行
+                        wait_s = 1 / self.config.limits_per_second
+                    else:
+                        wait_s = self.config.cycle_every_ms / 1000
+                    # 等待期间顺便同步成交账本 (按间隔节流)
+                    gc_control.between_cycles()
+                    await asyncio.gather(self._sync_ledger(), self.clock.sleep(wait_s))
+                else:
+                    # 每 10 秒输出一次状态日志
+                    if self.clock.time() - last_status_time >= 10:
+                        account_info = ""
+                        if self.account_manager:
+                            account_info = f"[{self.account_manager.get_current_account_name()}] "
+                        log.info(f"[监控中] {account_info}周期#{cycle_count} | {msg}")
+                        last_status_time = self.clock.time()
+                        await self._sync_ledger()
+                        metrics.export()
+                        tracer.flush()
+
+                    # 每 5 分钟输出一次多账号统计
+                    if self.account_manager and self.clock.time() - last_stats_time >= 300:
+                        self._log_account_stats()
+                        last_stats_time = self.clock.time()
+
+                    # 每 5 分钟执行一次定时清理检查 (当没有成功交易时)
+                    if self.clock.time() - last_cleanup_time >= 300:
+                        log.info("[定时检查] 5分钟未成功交易，检查并清理残留挂单和仓位...")
+                        await self._periodic_cleanup()
+                        last_cleanup_time = self.clock.time()
+
+                    gc_control.between_cycles()
+                    await self.clock.sleep(0.2)
+
+            except asyncio.CancelledError:
+                log.info("任务被取消，正在执行退出清理...")
+                break
+            except Exception as e:
+                log.error(f"循环异常: {e}")
+                await self.clock.sleep(1)
+
+        # 退出前执行清理
+        if _shutdown_requested:
+            log.info("收到退出信号，正在执行退出清理...")
+            await self._cleanup_on_exit()
+            await self._sync_ledger(force=True)
+
+        await self._drain_inflight()
+        log.info("机器人已停止")
+        if self.account_manager:
+            self.account_manager.save_state()
+        else:
+            self._save_state()
+
+        await self._close_clients()
+        await self.rate_backend.close()
+
+        if lag_monitor:
+            lag_monitor.stop()
+        gc_control.stop()
+        if config_task:
+            config_task.cancel()
+        # 等待状态文件、交易历史和 trace 写完
+        self.history.close()
+        tracer.flush()
+        await blocking.flush()
+
+    async def _close_clients(self):
+        """关闭复用的 HTTP 会话"""
+        clients = self.account_manager.open_clients() if self.account_manager else [self.client]
+        for client in clients:
+            await client.close()
+        if self.client.market_data is not None:
+            self.client.market_data.close()
+
+    def _log_account_stats(self):
+        """输出账号统计信息"""
+        if not self.account_manager:
+            return
+        stats = self.account_manager.get_all_stats()
+        log.info("--- 账号统计 ---")
+        total_trades = 0
+        detail = stats["total_accounts"] <= ACCOUNT_DETAIL_LOG_MAX
+        for acc in stats["accounts"]:
+            total_trades += acc["trades_today"]
+            if detail:
+                status = "满" if acc["is_limited"] else "可用"
+                log.info(f"  {acc['name']}: {acc['trades_today']}/{self.config.limits_per_day} [{status}]")
+        log.info(f"  总计: {total_trades} 笔交易")
+        if not detail:
+            log.info(f"  当前: {stats['current_account']}, 已加载客户端 {len(self.account_manager.clients)}/{stats['total_accounts']}")
+
+        totals = self.ledger.totals()
+        if totals["fills"]:
+            log.info(
+                f"  成交: {totals['fills']} 笔, 成交量 ${totals['volume']:,.2f}, "
+                f"手续费 {totals['fees']:.4f}, 已实现盈亏 {totals['realized']:+.4f}, 磨损 {totals['wear']:.4f}"
+            )
+
+        clock = self.client.clock
+        rtt = f"{clock.rtt_ms:.1f}ms" if clock.rtt_ms is not None else "未知"
+        log.info(f"  时钟偏移: {clock.offset_ms:+.1f}ms (RTT {rtt})")
+        lag = metrics.percentiles("loop_lag_ms")
+        if lag:
+            log.info(f"  事件循环延迟: p50={lag['p50']:.1f}ms p95={lag['p95']:.1f}ms p99={lag['p99']:.1f}ms")
+        market_data = self.client.market_data
+        if market_data is not None and market_data.cache_misses:
+            cache = market_data.cache_stats()
+            log.info(
+                f"  行情缓存: 命中率 {cache['hit_rate']:.1%} "
+                f"(复用 {cache['hits']}, 合并 {cache['coalesced']}, 请求 {cache['misses']})"
+            )
+        metrics.export()
+
+    async def _cleanup_on_exit(self):
+        """
+        退出时清理: 取消所有挂单并平掉所有仓位
+        全部清理完成后在持仓快照中标记正常退出，下次启动跳过对账
+        """
+        log.info("=" * 50)
+        log.info("开始退出清理流程...")
+        await self._drain_inflight()
+
+        failed = 0
+        if self.account_manager:
+            # 多账号模式: 清理所有已初始化的账号，以及持仓快照中还有记录的账号 (客户端可能已被淘汰)
+            manager = self.account_manager
+            indices = list(manager.clients)
+            for address in list(self.exposure.positions):
+                idx = manager.account_index(address)
+                if idx is not None and idx not in indices:
+                    indices.append(idx)
+
+            for idx in indices:
+                account_name = manager.accounts[idx].name or f"账号#{idx + 1}"
+                log.info(f"[{account_name}] 检查并清理...")
+                client, temporary = await manager.borrow_client(idx)
+                if client is None:
+                    failed += 1
+                    continue
+
+                try:
+                    # 确保认证有效
+                    if not await client.ensure_authenticated():
+                        log.warning(f"[{account_name}] 认证失败，跳过清理")
+                        failed += 1
+                        continue
+
+                    # 取消所有挂单
+                    log.info(f"[{account_name}] 取消所有挂单...")
+                    cancelled = await client.cancel_all_orders(self.config.market)
+
+                    # 平掉所有仓位
+                    log.info(f"[{account_name}] 平掉所有仓位...")
+                    closed, flat = await self._flatten_positions(client)
+                    if not flat:
+                        failed += 1
+
+                    log.info(f"[{account_name}] 清理完成: 取消 {cancelled} 个挂单, 平仓 {closed} 个仓位")
+
+                except Exception as e:
+                    failed += 1
+                    log.error(f"[{account_name}] 清理异常: {e}")
+                finally:
+                    if temporary:
+                        await client.close()
+        else:
+            # 单账号模式
+            try:
+                log.info("取消所有挂单...")
+                cancelled = await self.client.cancel_all_orders(self.config.market)
+
+                log.info("平掉所有仓位...")
+                closed, flat = await self._flatten_positions(self.client)
+                if not flat:
+                    failed += 1
+
+                log.info(f"清理完成: 取消 {cancelled} 个挂单, 平仓 {closed} 个仓位")
+
+            except Exception as e:
+                failed += 1
+                log.error(f"清理异常: {e}")
+
+        if failed or self.exposure.positions:
+            log.warning(f"{max(failed, len(self.exposure.positions))} 个账号清理失败，下次启动时对账")
+        else:
+            self.exposure.mark_clean()
+
+        log.info("退出清理完成")
+        log.info("=" * 50)
+
+    async def reconcile_on_start(self, max_concurrency: int = 16):
+        """
+        热重启对账: 并发核对各账号在交易所的挂单和持仓，残留的立即取消/平掉，之后直接开始交易，
+        不等定时清理或切换账号时才发现
+          - 上次正常退出 (已清理) 时只核对持仓快照中还有记录的账号
+          - 否则 (崩溃、强杀、首次运行) 还要核对当前账号和 24 小时内有交易的账号
+        """
+        started = time.perf_counter()
+        exposure = self.exposure
+        manager = self.account_manager
+
+        if manager:
+            targets = []
+            for address in exposure.positions:
+                idx = manager.account_index(address)
+                if idx is not None:
+                    targets.append(idx)
+            if not exposure.clean_exit:
+                cutoff = self.clock.time_ms() - 86400000
+                targets.append(manager.current_index)
+                targets.extend(i for i, state in manager.rate_states.items() if state.count_since(cutoff))
+            targets = sorted(set(targets))
+        else:
+            targets = [None] if exposure.positions or not exposure.clean_exit else []
+
+        if not targets:
+            log.info("[对账] 上次正常退出且没有持仓记录，跳过对账")
+        else:
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def check(index: Optional[int]) -> Optional[Tuple[int, int]]:
+                async with semaphore:
+                    if index is None:
+                        return await self._reconcile_client(self.client, self.client.l2_address[:10])
+                    client, temporary = await manager.borrow_client(index)
+                    if client is None:
+                        return None
+                    try:
+                        return await self._reconcile_client(client, manager.accounts[index].name or f"账号#{index + 1}")
+                    finally:
+                        if temporary:
+                            await client.close()
+
+            results = await asyncio.gather(*(check(i) for i in targets), return_exceptions=True)
+            done = [r for r in results if isinstance(r, tuple)]
+            cancelled = sum(r[0] for r in done)
+            closed = sum(r[1] for r in done)
+            failed = len(results) - len(done)
+            metrics.inc("reconcile_orders_cancelled", cancelled)
+            metrics.inc("reconcile_positions_closed", closed)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.set_gauge("startup_reconcile_ms", elapsed_ms)
+            summary = f"[对账] 核对 {len(targets)} 个账号，取消 {cancelled} 个挂单，平仓 {closed} 个仓位"
+            if failed:
+                summary += f"，{failed} 个账号失败"
+            log.info(f"{summary}，耗时 {elapsed_ms:.0f}ms")
+
+        # 运行中: 之后崩溃时下次启动需要对账
+        exposure.clean_exit = False
+        exposure.save()
+
+    async def _reconcile_client(self, client: ParadexInteractiveClient, name: str) -> Optional[Tuple[int, int]]:
+        """核对一个账号: 先取消挂单 (避免之后成交)，再查询持仓并平掉，与本地记录不一致时记录日志"""
+        market = self.config.market
+        account = client.l2_address
+        if not await client.ensure_authenticated():
+            log.warning(f"[对账] [{name}] 认证失败，跳过")
+            return None
+
+        orders = await client.get_open_orders(market)
+        if orders is None:
+            log.warning(f"[对账] [{name}] 查询挂单失败，跳过")
+            return None
+        cancelled = await client.cancel_all_orders(market, orders) if orders else 0
+
+        positions = await client.get_positions(market)
+        recorded = self.exposure.positions.get(account, {}).get(market)
+        if positions and recorded is None:
+            detail = ", ".join(f"{p.get('side')} {p.get('size')}" for p in positions)
+            log.warning(f"[对账] [{name}] 发现本地没有记录的仓位: {detail}")
+        elif recorded and not positions:
+            log.info(f"[对账] [{name}] 记录的仓位 {recorded['size']} 在交易所已不存在")
+
+        if positions is None:
+            log.warning(f"[对账] [{name}] 查询持仓失败，保留本地记录")
+            return None
+        closed, _ = await self._flatten_positions(client, positions)
+
+        if cancelled or closed:
+            log.info(f"[对账] [{name}] 取消 {cancelled} 个挂单，平仓 {closed} 个仓位")
+        return cancelled, closed
+
+    async def _flatten_positions(
+        self, client: ParadexInteractiveClient, positions: Optional[List[Dict]] = None,
+    ) -> Tuple[int, bool]:
+        """
+        平掉某账号在当前市场的所有仓位，按结果更新本地持仓视图，返回 (平仓数, 是否确认已无持仓)
+        只有查询成功且没有持仓、或全部平仓成功时才清除记录；查询失败时保留原记录，
+        部分平仓失败时按交易所剩余的持仓记录，之后的清理和下次启动对账继续处理
+        """
+        market = self.config.market
+        account = client.l2_address
+        if positions is None:
+            positions = await client.get_positions(market)
+        if positions is None:
+            return 0, False
+        if positions:
+            sent_ms = self.clock.time_ms()
+
+            def record(order: Dict, result: Optional[Dict], latency_ms: float):
+                self.history.record_order(
+                    sent_ms, account, order["market"], "cleanup", order["side"], "MARKET", order["size"], None,
+                    result, latency_ms,
                 )
 
-                if result:
-                    reason = "点差满足" if spread and spread <= self.config.close_spread_target else "超时强平"
-                    return True, f"平仓成功 ({reason}): {size}"
-                else:
-                    return False, "平仓下单失败"
+            closed = await client.close_all_positions(market, positions, record)
+        else:
+            closed = 0
+        if closed == len(positions):
+            self.exposure.reset(account)
+            return closed, True
+        remaining = await client.get_positions(market)
+        if remaining == []:
+            self.exposure.reset(account)
+            return closed, True
+        self.exposure.reset(account, remaining or positions, self.clock.time_ms())
+        return closed, False
+
+    async def _periodic_cleanup(self):
+        """
+        定时清理: 检查并清理当前账号的残留挂单和仓位
+        在没有成功交易、限速等待等情况下调用
+        """
+        log.info("[定时清理] 检查残留挂单和仓位...")
+        await self._drain_inflight()
+
+        try:
+            # 确保认证有效
+            if not await self.client.ensure_authenticated():
+                log.warning("[定时清理] 认证失败，跳过清理")
+                return
+
+            # 取消所有挂单
+            cancelled = await self.client.cancel_all_orders(self.config.market)
+            if cancelled > 0:
+                log.info(f"[定时清理] 已取消 {cancelled} 个残留挂单")
+
+            # 平掉所有仓位
+            closed, flat = await self._flatten_positions(self.client)
+            if closed > 0:
+                log.info(f"[定时清理] 已平掉 {closed} 个残留仓位")
+            if not flat:
+                log.warning("[定时清理] 未能确认仓位已全部平掉，保留持仓记录")
+            elif cancelled == 0 and closed == 0:
+                log.info("[定时清理] 无残留挂单或仓位")
 
         except Exception as e:
-            return False, f"平仓异常: {e}"
+            log.error(f"[定时清理] 清理异常: {e}")
 
-    async def run_cycle(self) -> tuple[bool, str]:
-        """运行一个交易周期"""
-        market = self.config.market
+    async def _wait_until_tomorrow(self):
+        """等待到明天凌晨"""
+        wait_seconds = self.clock.next_day_ms() / 1000 - self.clock.time()
+        log.info(f"等待 {wait_seconds/3600:.1f} 小时后重新开始...")
+        await self.clock.sleep(wait_seconds + 60)  # 多等 1 分钟确保日期变化
 
-        # 1. 检查限速
-        can_trade, reason, usage = self._can_trade()
-        if not can_trade:
-            return False, f"限速中: {reason} ({usage})"
+    async def _wait_for_next_account(self, warm_lead_s: float = 5.0):
+        """
+        等到最早恢复的账号可以交易
+        恢复前 warm_lead_s 秒预热该账号 (客户端、token、连接)，恢复后立即可下单
+        """
+        ready_at, index = self.account_manager.peek_next_available()
+        wait_s = max(0.0, ready_at / 1000 - self.clock.time())
+        name = self.account_manager.accounts[index].name or f"账号#{index + 1}"
+        metrics.set_gauge("next_account_wait_s", round(wait_s, 1))
+        log.info(f"等待 {wait_s:.0f} 秒后 {name} 恢复交易...")
 
-        # 2. 获取订单簿 (同时用于点差和厚度检查)
-        bbo = await self.client.get_bbo(market)
-        if not bbo:
-            return False, "无法获取订单簿"
+        if wait_s > warm_lead_s:
+            await self.clock.sleep(wait_s - warm_lead_s)
 
-        # 计算点差
-        mid = (bbo["bid"] + bbo["ask"]) / 2
-        spread = ((bbo["ask"] - bbo["bid"]) / mid) * 100 if mid > 0 else None
-        if spread is None:
-            return False, "无法计算点差"
+        try:
+            client = await self.account_manager.get_client_async(index)
+            if client and await client.ensure_authenticated():
+                await client.get_bbo(self.config.market)
+                log.info(f"[{name}] 已预热")
+        except Exception as e:
+            log.warning(f"[{name}] 预热失败: {e}")
 
-        # 使用 <= 判断，并添加小数精度容差
-        if spread > self.config.spread_threshold_percent + 0.00001:
-            return False, f"点差过大: {spread:.4f}% > {self.config.spread_threshold_percent}%"
+        remaining = ready_at / 1000 - self.clock.time()
+        if remaining > 0:
+            await self.clock.sleep(remaining)
 
-        # 3. 检查订单簿厚度
-        bid_usd = bbo["bid_size"] * bbo["bid"]
-        ask_usd = bbo["ask_size"] * bbo["ask"]
+    async def _switch_account_with_cleanup(self) -> str:
+        """
+        切换账号前执行清仓操作
+        返回:
+          - "switched": 成功切换
+          - "wait_hour": 需要等待小时重置
+          - "wait_day": 需要等待到明天
+        """
+        if not self.account_manager:
+            return "switched"
 
-        if bid_usd < self.config.min_order_book_size_usd or ask_usd < self.config.min_order_book_size_usd:
-            return False, f"订单簿不足: 买一=${bid_usd:.2f} 卖一=${ask_usd:.2f} (size: {bbo['bid_size']:.6f}/{bbo['ask_size']:.6f})"
+        current_account = self.account_manager.get_current_account_name()
+        log.info("=" * 50)
+        log.info(f"[{current_account}] 开始切换账号流程...")
 
-        log.info(f"条件满足! 点差={spread:.4f}%, 开始开仓...")
+        # 0. 等待后台平仓完成 (之后的限速状态和客户端都会切换)
+        await self._drain_inflight()
 
-        # 4. 开仓
-        success, msg = await self._open_position()
-        if not success:
-            return False, f"开仓失败: {msg}"
+        # 1. 取消所有挂单
+        log.info(f"[{current_account}] 取消所有挂单...")
+        await self.client.cancel_all_orders(self.config.market)
 
-        self._record_trade()
-        log.info(msg)
+        # 2. 平掉所有仓位
+        log.info(f"[{current_account}] 平掉所有仓位...")
+        _, flat = await self._flatten_positions(self.client)
+        if not flat:
+            log.warning(f"[{current_account}] 未能确认仓位已全部平掉，保留持仓记录，之后对账")
 
-        await asyncio.sleep(0.5)
+        # 3. 保存当前账号状态，同步该账号的成交
+        self.account_manager.save_state()
+        await self._sync_ledger(force=True)
 
-        # 5. 平仓
-        log.info("准备平仓...")
-        success, msg = await self._close_position()
-        if success:
-            self._record_trade()
+        # 4. 切换到下一个可用账号
+        result = self.account_manager.switch_to_next_available_account()
 
-        log.info(msg)
+        if result == "switched":
+            new_client = await self.account_manager.get_current_client_async()
+            if new_client:
+                self.client = new_client
+                self.rate_state = self.account_manager.get_current_rate_state()
 
-        # 更新统计
-        self.stats.runs += 1
-        balance = await self.client.get_balance()
-        if balance:
-            self.stats.total_volume += balance * 0.9
-        self._save_state()
+                new_account = self.account_manager.get_current_account_name()
+                log.info(f"已切换到 {new_account}")
 
-        return True, "周期完成"
+                # 认证新账号 (已预热时直接复用 token)
+                if await self.client.ensure_authenticated():
+                    log.info(f"[{new_account}] 认证成功")
+                else:
+                    log.error(f"[{new_account}] 认证失败!")
 
-    async def run(self):
-        """主运行循环"""
-        global _shutdown_requested
+            log.info("=" * 50)
+            return "switched"
 
-        log.info("=" * 50)
-        log.info("Jess-Para Sniper Bot (V27 Python API - 多账号版)")
-        log.info(f"市场: {self.config.market}")
-        log.info(f"点差阈值: {self.config.spread_threshold_percent}%")
-        log.info(f"订单簿最小厚度: ${self.config.min_order_book_size_usd}")
+        elif result == "all_hour_limited":
+            log.info("=" * 50)
+            return "wait_hour"
 
-        # 显示多账号信息
-        if self.account_manager:
-            stats = self.account_manager.get_all_stats()
-            log.info(f"多账号模式: 共 {stats['total_accounts']} 个账号")
-            for acc in stats["accounts"]:
-                status = "🔴 已满" if acc["is_limited"] else "🟢 可用"
-                log.info(f"  {acc['name']}: 今日 {acc['trades_today']}/{self.config.limits_per_day} {status}")
-            log.info(f"当前账号: {stats['current_account']}")
-        else:
-            log.info("单账号模式")
+        else:  # all_day_limited
+            log.info("=" * 50)
+            return "wait_day"
 
-        log.info("=" * 50)
 
-        # 初始认证
-        if not await self.client.authenticate_interactive():
-            log.error("初始认证失败!")
-            return
+# =============================================================================
+# 共享内存行情 (同机多进程共用一份 BBO)
+# =============================================================================
 
-        log.info("认证成功，开始监控...")
-        self.config.enabled = True
-        cycle_count = 0
-        last_status_time = time.time()
-        last_stats_time = time.time()
-        last_cleanup_time = time.time()  # 上次清理检查时间
+def shm_bbo_name(environment: str, market: str) -> str:
+    """共享内存段名称 (macOS 限制 31 字符)"""
+    return f"pp2_{'p' if environment == 'prod' else 't'}_{market}"[:31]
 
-        while not _shutdown_requested:
+
+# 临时替换 resource_tracker.register 是进程级的修改，多个线程同时挂载时需要串行
+_attach_lock = threading.Lock()
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    挂载已有共享内存但不登记到 resource_tracker
+    (Python < 3.13 会把挂载方也登记，挂载进程退出时误删发布方的共享内存)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    with _attach_lock:
+        original = shared_memory.resource_tracker.register
+        shared_memory.resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            shared_memory.resource_tracker.register = original
+
+
+def _pid_alive(pid: int) -> bool:
+    """进程是否还在 (无权限发信号也视为存活)"""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _spec_key(spec: MarketSpec) -> int:
+    """市场精度指纹，读写双方精度不一致时读取方拒绝使用"""
+    return zlib.crc32(f"{spec.tick_size}|{spec.size_increment}".encode())
+
+
+class ShmBBORing:
+    """
+    单个市场的 BBO 环形缓冲区 (multiprocessing.shared_memory)
+    一个发布进程写，任意多个同机进程读；读取只访问映射内存，不发请求也不进内核
+
+    布局 (全部为 int64):
+      头部 8 格: magic, version, capacity, head (已写入条数), publisher_pid, spec_key, 保留 x2
+      每个槽 8 格 (64 字节): seq, ts_ms, bid_ticks, ask_ticks, bid_lots, ask_lots, 保留 x2
+
+    每个槽是一个 seqlock: 写入前 seq 置为奇数，写完置为偶数；
+    读取前后 seq 不一致或为奇数说明读到了写了一半的数据 (torn read)，重试
+    """
+
+    MAGIC = 0x50503242424F      # "PP2BBO"
+    VERSION = 1
+    HEADER = 8
+    SLOT = 8
+    H_MAGIC, H_VERSION, H_CAPACITY, H_HEAD, H_PID, H_SPEC = range(6)
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf.cast("q")
+        self.owner = owner
+        self.name = shm.name
+        self.capacity = self._buf[self.H_CAPACITY]
+
+    @property
+    def publisher_pid(self) -> int:
+        return self._buf[self.H_PID]
+
+    @property
+    def head(self) -> int:
+        return self._buf[self.H_HEAD]
+
+    @classmethod
+    def create(cls, name: str, spec: MarketSpec, capacity: int = 64) -> 'ShmBBORing':
+        """
+        发布方创建 (已存在且大小一致时复用，已挂载的读取方无需重新挂载)
+        已存在的共享内存属于另一个仍在运行的发布进程时抛出 FileExistsError，不抢占
+        """
+        size = (cls.HEADER + capacity * cls.SLOT) * 8
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 先不登记地挂载检查归属，拒绝时本进程的 resource_tracker 不会在退出时删掉别人的共享内存
+            probe = _attach_untracked(name)
+            owner_pid = 0
+            if probe.size >= cls.HEADER * 8:
+                buf = probe.buf.cast("q")
+                if buf[cls.H_MAGIC] == cls.MAGIC:
+                    owner_pid = buf[cls.H_PID]
+                del buf
+            probe.close()
+            if owner_pid != os.getpid() and _pid_alive(owner_pid):
+                raise FileExistsError(f"共享内存行情 {name} 正由发布进程 {owner_pid} 使用")
+            shm = shared_memory.SharedMemory(name=name)
+            if shm.size < size:
+                shm.close()
+                shm.unlink()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        buf = shm.buf.cast("q")
+        buf[cls.H_CAPACITY] = capacity
+        buf[cls.H_PID] = os.getpid()
+        buf[cls.H_SPEC] = _spec_key(spec)
+        buf[cls.H_VERSION] = cls.VERSION
+        buf[cls.H_MAGIC] = cls.MAGIC
+        del buf
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> Optional['ShmBBORing']:
+        """读取方挂载，不存在或格式不符时返回 None"""
+        try:
+            shm = _attach_untracked(name)
+        except (FileNotFoundError, OSError):
+            return None
+        buf = shm.buf.cast("q")
+        valid = buf[cls.H_MAGIC] == cls.MAGIC and buf[cls.H_VERSION] == cls.VERSION
+        del buf
+        if not valid:
+            shm.close()
+            return None
+        return cls(shm, owner=False)
+
+    def publish(self, bbo: BBO, ts_ms: Optional[int] = None):
+        """写入一条 BBO (仅发布方调用)"""
+        buf = self._buf
+        n = buf[self.H_HEAD] + 1
+        base = self.HEADER + (n % self.capacity) * self.SLOT
+        seq = buf[base]
+        buf[base] = seq + 1                                     # 奇数: 写入中
+        buf[base + 1] = ts_ms if ts_ms is not None else int(time.time() * 1000)
+        buf[base + 2] = bbo.bid_ticks
+        buf[base + 3] = bbo.ask_ticks
+        buf[base + 4] = bbo.bid_lots
+        buf[base + 5] = bbo.ask_lots
+        buf[base + 6] = 0
+        buf[base] = seq + 2                                     # 偶数: 写入完成
+        buf[self.H_HEAD] = n
+
+    def read_latest(self, spec: MarketSpec, max_age_ms: int) -> Optional[BBO]:
+        """读取最新一条 BBO；无数据、精度不符、已过期或多次读到写了一半的数据时返回 None"""
+        buf = self._buf
+        if buf[self.H_SPEC] != _spec_key(spec):
+            return None
+        for _ in range(3):
+            n = buf[self.H_HEAD]
+            if n == 0:
+                return None
+            base = self.HEADER + (n % self.capacity) * self.SLOT
+            seq = buf[base]
+            if seq & 1:
+                continue
+            ts_ms = buf[base + 1]
+            bid_ticks = buf[base + 2]
+            ask_ticks = buf[base + 3]
+            bid_lots = buf[base + 4]
+            ask_lots = buf[base + 5]
+            if buf[base] != seq:
+                continue
+            if time.time() * 1000 - ts_ms > max_age_ms:
+                metrics.inc("shm_bbo_stale")
+                return None
+            return BBO(spec, bid_ticks, ask_ticks, bid_lots, ask_lots, ts_ms)
+        metrics.inc("shm_bbo_torn_reads")
+        return None
+
+    def close(self):
+        """关闭映射 (发布方同时删除共享内存)"""
+        self._buf.release()
+        self._shm.close()
+        if self.owner:
             try:
-                if not self.config.enabled:
-                    log.info("机器人已暂停")
-                    await asyncio.sleep(1)
-                    continue
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
 
-                success, msg = await self.run_cycle()
-                cycle_count += 1
 
-                # 检查是否所有账号都用完
-                if "all_accounts_exhausted" in msg:
-                    log.warning("=" * 50)
-                    log.warning("所有账号今日交易额度已用完!")
-                    log.warning("明天将自动重置，或手动添加新账号")
-                    log.warning("=" * 50)
-                    # 清理后等待到明天凌晨
-                    await self._periodic_cleanup()
-                    await self._wait_until_tomorrow()
+class ShmBBOReader:
+    """
+    读取方: 按市场挂载发布进程的环形缓冲区
+    发布进程尚未启动时每秒最多重试挂载一次；数据过期时调用方回退到 REST
+    发布进程更换 (头部 pid 变化) 或写入位置超过 max_age_ms 没有前进时重新挂载:
+    发布进程重启后会新建共享内存，旧的映射已被删除，继续读只能读到过期数据
+    """
+
+    name = "shm"
+
+    def __init__(self, environment: str, max_age_ms: int = 1000):
+        self.environment = environment
+        self.max_age_ms = max_age_ms
+        self._rings: Dict[str, ShmBBORing] = {}
+        self._next_attach: Dict[str, float] = {}
+        # 市场 -> [挂载时的发布进程 pid, 上次看到的写入位置, 写入位置最后一次前进的时间 (monotonic)]
+        self._progress: Dict[str, List] = {}
+
+    def read(self, market: str, spec: MarketSpec) -> Optional[BBO]:
+        """读取最新 BBO，不可用时返回 None"""
+        ring = self._rings.get(market)
+        if ring is not None and self._orphaned(market, ring):
+            log.info(f"共享内存行情已停止更新或发布进程已更换，重新挂载: {ring.name}")
+            self._detach(market)
+            ring = None
+        if ring is None:
+            now = time.monotonic()
+            if now < self._next_attach.get(market, 0):
+                return None
+            self._next_attach[market] = now + 1
+            ring = ShmBBORing.attach(shm_bbo_name(self.environment, market))
+            if ring is None:
+                return None
+            self._rings[market] = ring
+            self._progress[market] = [ring.publisher_pid, ring.head, now]
+            log.info(f"已挂载共享内存行情: {ring.name}")
+        bbo = ring.read_latest(spec, self.max_age_ms)
+        if bbo is not None:
+            metrics.inc("shm_bbo_hits")
+        return bbo
+
+    def _orphaned(self, market: str, ring: ShmBBORing) -> bool:
+        """发布进程已更换，或写入位置超过 max_age_ms 没有前进"""
+        progress = self._progress[market]
+        if ring.publisher_pid != progress[0]:
+            return True
+        head = ring.head
+        now = time.monotonic()
+        if head != progress[1]:
+            progress[1] = head
+            progress[2] = now
+            return False
+        return (now - progress[2]) * 1000 > self.max_age_ms
+
+    def _detach(self, market: str):
+        self._rings.pop(market).close()
+        del self._progress[market]
+
+    def close(self):
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
+        self._progress.clear()
+
+
+async def run_bbo_publisher(
+    account: AccountInfo,
+    environment: str,
+    markets: List[str],
+    poll_interval_s: float = 0.2,
+    recorder: Optional['BBORecorder'] = None,
+):
+    """
+    行情发布: 轮询各市场 orderbook，写入共享内存环形缓冲区
+    同机的所有 bot 进程 (SHM_BBO=1 或多进程模式的 worker) 从中读取；recorder 不为空时同时录制报价
+    """
+    client = ParadexInteractiveClient(account.l2_private_key, account.l2_address, environment)
+    rings: Dict[str, ShmBBORing] = {}
+    try:
+        while not _shutdown_requested:
+            for market in markets:
+                bbo = await client.get_bbo(market)
+                if bbo is None:
                     continue
+                ring = rings.get(market)
+                if ring is None:
+                    ring = rings[market] = ShmBBORing.create(shm_bbo_name(environment, market), bbo.spec)
+                    log.info(f"共享内存行情已发布: {ring.name}")
+                ring.publish(bbo, int(bbo.ts_ms))
+                if recorder is not None:
+                    recorder.record(market, bbo, int(bbo.ts_ms))
+            await asyncio.sleep(poll_interval_s)
+    finally:
+        for ring in rings.values():
+            ring.close()
+        await client.close()
+        if recorder is not None:
+            recorder.flush()
+            await blocking.flush()
 
-                # 检查是否需要因 hour 限制切换账号
-                if "hour_switch" in msg and self.account_manager:
-                    switch_result = await self._switch_account_with_cleanup()
 
-                    if switch_result == "wait_hour":
-                        # 所有账号 hour 都满了，清理后等待
-                        log.info("所有账号小时限制已满，执行清理后等待 10 分钟...")
-                        await self._periodic_cleanup()
-                        await asyncio.sleep(600)  # 等待 10 分钟
+# =============================================================================
+# 行情录制 (参数扫描回放用)
+# =============================================================================
 
-                    elif switch_result == "wait_day":
-                        # 所有账号 day 都满了
-                        await self._periodic_cleanup()
-                        await self._wait_until_tomorrow()
+def _append_text(filepath: str, text: str):
+    with open(filepath, "a") as f:
+        f.write(text)
 
-                    continue
 
-                # 检查是否达到 day 限制但还有其他账号可用
-                if "day_limit_wait" in msg and self.account_manager:
-                    # 当前账号 day 满了，尝试切换到 hour 未满的账号
-                    switch_result = await self._switch_account_with_cleanup()
+class BBORecorder:
+    """
+    行情录制: 发布进程把每个市场的报价追加到 CSV，供 sweep_sniper.py 回放
+      S,市场,tick_size,size_increment,min_notional      市场精度 (首次出现或变化时写一行)
+      B,ts_ms,市场,bid_ticks,ask_ticks,bid_lots,ask_lots  报价
+    报价不变时最多每 heartbeat_ms 写一行，回放时据此区分 "报价没变" 和 "没有行情"
+    写文件攒批交给后台写线程
+    """
 
-                    if switch_result == "wait_hour":
-                        log.info("所有账号小时限制已满，执行清理后等待 10 分钟...")
-                        await self._periodic_cleanup()
-                        await asyncio.sleep(600)
+    def __init__(self, filepath: str, heartbeat_ms: int = 1000, batch: int = 200):
+        self.filepath = filepath
+        self.heartbeat_ms = heartbeat_ms
+        self.batch = batch
+        self._specs: Dict[str, MarketSpec] = {}
+        self._last: Dict[str, Tuple[int, Tuple[int, int, int, int]]] = {}
+        self._lines: List[str] = []
+
+    def record(self, market: str, bbo: BBO, ts_ms: int):
+        spec = bbo.spec
+        if self._specs.get(market) is not spec:
+            self._specs[market] = spec
+            self._lines.append(f"S,{market},{spec.tick_size},{spec.size_increment},{spec.min_notional}")
+
+        quote = (bbo.bid_ticks, bbo.ask_ticks, bbo.bid_lots, bbo.ask_lots)
+        last = self._last.get(market)
+        if last is not None and last[1] == quote and ts_ms - last[0] < self.heartbeat_ms:
+            return
+        self._last[market] = (ts_ms, quote)
+        self._lines.append(f"B,{ts_ms},{market},{quote[0]},{quote[1]},{quote[2]},{quote[3]}")
+        if len(self._lines) >= self.batch:
+            self.flush()
 
-                    elif switch_result == "wait_day":
-                        await self._periodic_cleanup()
-                        await self._wait_until_tomorrow()
+    def flush(self):
+        if self._lines:
+            text = "\n".join(self._lines) + "\n"
+            self._lines = []
+            blocking.submit_call(_append_text, self.filepath, text, error_msg="写入行情录制失败")
 
-                    continue
 
-                if success:
-                    log.info(f"交易完成: {msg}")
-                    # 交易成功，重置清理计时器
-                    last_cleanup_time = time.time()
-                    await asyncio.sleep(self.config.cycle_every_ms / 1000)
-                else:
-                    # 每 10 秒输出一次状态日志
-                    if time.time() - last_status_time >= 10:
-                        account_info = ""
-                        if self.account_manager:
-                            account_info = f"[{self.account_manager.get_current_account_name()}] "
-                        log.info(f"[监控中] {account_info}周期#{cycle_count} | {msg}")
-                        last_status_time = time.time()
+class BBOTape:
+    """一个市场的录制报价，按时间升序存放在紧凑数组中"""
 
-                    # 每 5 分钟输出一次多账号统计
-                    if self.account_manager and time.time() - last_stats_time >= 300:
-                        self._log_account_stats()
-                        last_stats_time = time.time()
+    __slots__ = ("spec", "ts", "bid_ticks", "ask_ticks", "bid_lots", "ask_lots")
 
-                    # 每 5 分钟执行一次定时清理检查 (当没有成功交易时)
-                    if time.time() - last_cleanup_time >= 300:
-                        log.info("[定时检查] 5分钟未成功交易，检查并清理残留挂单和仓位...")
-                        await self._periodic_cleanup()
-                        last_cleanup_time = time.time()
+    def __init__(self, spec: MarketSpec):
+        self.spec = spec
+        self.ts = array("q")
+        self.bid_ticks = array("q")
+        self.ask_ticks = array("q")
+        self.bid_lots = array("q")
+        self.ask_lots = array("q")
 
-                    await asyncio.sleep(0.2)
+    def __len__(self) -> int:
+        return len(self.ts)
 
-            except asyncio.CancelledError:
-                log.info("任务被取消，正在执行退出清理...")
-                break
-            except Exception as e:
-                log.error(f"循环异常: {e}")
-                await asyncio.sleep(1)
+    def index_at(self, ts_ms: float, max_gap_ms: float = 2000) -> int:
+        """ts_ms 时刻有效的报价序号；之前没有报价或距上一条超过 max_gap_ms (录制中断) 时返回 -1"""
+        i = bisect.bisect_right(self.ts, ts_ms) - 1
+        if i < 0 or ts_ms - self.ts[i] > max_gap_ms:
+            return -1
+        return i
+
+    def bbo(self, i: int) -> BBO:
+        return BBO(self.spec, self.bid_ticks[i], self.ask_ticks[i], self.bid_lots[i], self.ask_lots[i], self.ts[i])
+
+
+def load_bbo_recording(filepath: str) -> Dict[str, BBOTape]:
+    """
+    读取行情录制文件，返回 市场 -> BBOTape
+    同一市场精度变化后的报价 (tick/lot 含义不同) 跳过，乱序的报价跳过
+    """
+    tapes: Dict[str, BBOTape] = {}
+    specs: Dict[str, MarketSpec] = {}
+    skipped = 0
+    with open(filepath) as f:
+        for line in f:
+            parts = line.rstrip("\n").split(",")
+            if parts[0] == "S" and len(parts) == 5:
+                specs[parts[1]] = MarketSpec(parts[1], parts[2], parts[3], parts[4])
+                if parts[1] not in tapes:
+                    tapes[parts[1]] = BBOTape(specs[parts[1]])
+            elif parts[0] == "B" and len(parts) == 7:
+                market, ts_ms = parts[2], int(parts[1])
+                tape = tapes.get(market)
+                if tape is None:
+                    skipped += 1
+                    continue
+                spec = specs[market]
+                changed = spec.tick_size != tape.spec.tick_size or spec.size_increment != tape.spec.size_increment
+                if changed or (tape.ts and ts_ms < tape.ts[-1]):
+                    skipped += 1
+                    continue
+                tape.ts.append(ts_ms)
+                tape.bid_ticks.append(int(parts[3]))
+                tape.ask_ticks.append(int(parts[4]))
+                tape.bid_lots.append(int(parts[5]))
+                tape.ask_lots.append(int(parts[6]))
+    if skipped:
+        log.warning(f"行情录制 {filepath}: 跳过 {skipped} 条报价 (精度变化或乱序)")
+    return tapes
 
-        # 退出前执行清理
-        if _shutdown_requested:
-            log.info("收到退出信号，正在执行退出清理...")
-            await self._cleanup_on_exit()
 
-        log.info("机器人已停止")
-        if self.account_manager:
-            self.account_manager.save_state()
-        else:
-            self._save_state()
+def bbo_recorder_from_env() -> Optional[BBORecorder]:
+    """BBO_RECORD_FILE: 行情发布时同时录制报价 (供 sweep_sniper.py 回放)"""
+    path = os.getenv("BBO_RECORD_FILE", "").strip()
+    if not path:
+        return None
+    log.info(f"行情录制: {path}")
+    return BBORecorder(path)
 
-    def _log_account_stats(self):
-        """输出账号统计信息"""
-        if not self.account_manager:
-            return
-        stats = self.account_manager.get_all_stats()
-        log.info("--- 账号统计 ---")
-        total_trades = 0
-        for acc in stats["accounts"]:
-            total_trades += acc["trades_today"]
-            status = "满" if acc["is_limited"] else "可用"
-            log.info(f"  {acc['name']}: {acc['trades_today']}/{self.config.limits_per_day} [{status}]")
-        log.info(f"  总计: {total_trades} 笔交易")
 
-    async def _cleanup_on_exit(self):
-        """
-        退出时清理: 取消所有挂单并平掉所有仓位
-        """
-        log.info("=" * 50)
-        log.info("开始退出清理流程...")
+# =============================================================================
+# 行情源管理 (推送行情 + REST 回退)
+# =============================================================================
 
-        if self.account_manager:
-            # 多账号模式: 清理所有已初始化的账号
-            for idx, client in self.account_manager.clients.items():
-                account_name = self.account_manager.accounts[idx].name or f"账号#{idx + 1}"
-                log.info(f"[{account_name}] 检查并清理...")
+PARADEX_WS_URLS = {
+    "prod": "wss://ws.api.prod.paradex.trade/v1",
+    "testnet": "wss://ws.api.testnet.paradex.trade/v1",
+}
 
-                try:
-                    # 确保认证有效
-                    if not await client.ensure_authenticated():
-                        log.warning(f"[{account_name}] 认证失败，跳过清理")
-                        continue
 
-                    # 取消所有挂单
-                    log.info(f"[{account_name}] 取消所有挂单...")
-                    cancelled = await client.cancel_all_orders(self.config.market)
+class WsBBOFeed:
+    """
+    WebSocket 推送行情 (bbo.{market} 频道)
+    后台任务维护连接，断线后按指数退避重连；read 只读内存中的最新报价，不发请求
 
-                    # 平掉所有仓位
-                    log.info(f"[{account_name}] 平掉所有仓位...")
-                    closed = await client.close_all_positions(self.config.market)
+    报价时间取该市场最后一次收到行情推送的时刻 (不用心跳: 服务端订阅卡住时连接层心跳仍会正常)
+    推送静默超过 SLA 时由 MarketDataManager 判定过期并回退 REST，行情平静时偶尔回退的代价只是一次 REST 请求
+    """
 
-                    log.info(f"[{account_name}] 清理完成: 取消 {cancelled} 个挂单, 平仓 {closed} 个仓位")
+    name = "ws"
+
+    def __init__(self, url: str, markets: List[str], heartbeat_s: float = 5):
+        self.url = url
+        self.markets = list(markets)
+        self.heartbeat_s = heartbeat_s
+        self.connected = False
+        self._quotes: Dict[str, Tuple[Dict[str, Any], float]] = {}  # 市场 -> (原始报价, 收到时间 ms)
+        self._parsed: Dict[str, BBO] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台连接任务 (需在事件循环中调用)"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def read(self, market: str, spec: MarketSpec) -> Optional[BBO]:
+        """最新报价，未连接或尚无数据时返回 None"""
+        if not self.connected:
+            return None
+        quote = self._quotes.get(market)
+        if quote is None:
+            return None
+        bbo = self._parsed.get(market)
+        if bbo is None or bbo.spec is not spec:
+            data, ts_ms = quote
+            try:
+                bbo = BBO.parse(spec, [data["bid"], data["bid_size"]], [data["ask"], data["ask_size"]], ts_ms)
+            except Exception as e:
+                log.debug(f"解析推送行情失败: {e}")
+                return None
+            self._parsed[market] = bbo
+        return bbo
 
-                except Exception as e:
-                    log.error(f"[{account_name}] 清理异常: {e}")
-        else:
-            # 单账号模式
+    async def _run(self):
+        backoff = 0.5
+        while not _shutdown_requested:
             try:
-                log.info("取消所有挂单...")
-                cancelled = await self.client.cancel_all_orders(self.config.market)
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, heartbeat=self.heartbeat_s, autoping=False) as ws:
+                        for i, market in enumerate(self.markets, 1):
+                            await ws.send_str(json_dumps({
+                                "jsonrpc": "2.0", "method": "subscribe",
+                                "params": {"channel": f"bbo.{market}"}, "id": i,
+                            }).decode())
+                        log.info(f"推送行情已连接: {self.url} ({', '.join(self.markets)})")
+                        self.connected = True
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                if self._on_message(msg.data):
+                                    backoff = 0.5
+                            elif msg.type == aiohttp.WSMsgType.PING:
+                                await ws.pong(msg.data)
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"推送行情连接异常: {e}")
+            finally:
+                self.connected = False
 
-                log.info("平掉所有仓位...")
-                closed = await self.client.close_all_positions(self.config.market)
+            if _shutdown_requested:
+                break
+            metrics.inc("ws_bbo_reconnects")
+            await asyncio.sleep(backoff * (1 + random.random() * 0.2))
+            backoff = min(backoff * 2, 30)
 
-                log.info(f"清理完成: 取消 {cancelled} 个挂单, 平仓 {closed} 个仓位")
+    def _on_message(self, raw: str) -> bool:
+        """处理一条消息，返回是否为行情更新"""
+        try:
+            data = json_loads(raw)
+        except ValueError:
+            return False
+        if data.get("method") != "subscription":
+            return False
+        params = data.get("params") or {}
+        channel = params.get("channel", "")
+        if not channel.startswith("bbo.") or not isinstance(params.get("data"), dict):
+            return False
+        market = channel[4:]
+        self._quotes[market] = (params["data"], time.time() * 1000)
+        self._parsed.pop(market, None)
+        metrics.inc("ws_bbo_updates")
+        return True
 
-            except Exception as e:
-                log.error(f"清理异常: {e}")
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.connected = False
 
-        log.info("退出清理完成")
-        log.info("=" * 50)
 
-    async def _periodic_cleanup(self):
-        """
-        定时清理: 检查并清理当前账号的残留挂单和仓位
-        在没有成功交易、限速等待等情况下调用
-        """
-        log.info("[定时清理] 检查残留挂单和仓位...")
+class MarketDataManager:
+    """
+    行情源管理: 主行情源 (WebSocket 推送或共享内存) + REST 回退，每个市场有新鲜度 SLA
+      - 主行情源新鲜时直接使用
+      - 主行情源过期或断开时切到 REST (failover)；连续 promote_after 次读到新鲜数据后切回
+      - REST 结果也超过 SLA (请求失败或过慢) 时返回 None，调用方拒绝开仓
+    多个账号共享一个实例，REST 请求使用调用方账号的客户端
+
+    REST 结果按市场缓存 cache_ttl_ms (从收到响应算起)，期间的读取直接复用；
+    同一市场已有请求在途时，并发的读取等待同一个请求，不重复发出
+    """
 
-        try:
-            # 确保认证有效
-            if not await self.client.ensure_authenticated():
-                log.warning("[定时清理] 认证失败，跳过清理")
-                return
+    PRIMARY = "primary"
+    REST = "rest"
 
-            # 取消所有挂单
-            cancelled = await self.client.cancel_all_orders(self.config.market)
-            if cancelled > 0:
-                log.info(f"[定时清理] 已取消 {cancelled} 个残留挂单")
+    def __init__(
+        self,
+        primary: Optional[Any] = None,
+        max_age_ms: float = 1000,
+        market_max_age_ms: Optional[Dict[str, float]] = None,
+        promote_after: int = 3,
+        cache_ttl_ms: float = 50,
+    ):
+        self.primary = primary
+        self.max_age_ms = max_age_ms
+        self.market_max_age_ms = dict(market_max_age_ms or {})
+        self.promote_after = promote_after
+        self._active: Dict[str, str] = {}          # 市场 -> 当前使用的行情源 (主行情源就绪前为 REST)
+        self._primary_streak: Dict[str, int] = {}  # 市场 -> 主行情源连续新鲜次数
+        self.last_reject: Dict[str, str] = {}      # 市场 -> 最近一次没有新鲜行情的原因
+        self.cache_ttl_ms = cache_ttl_ms
+        self._rest_cache: Dict[str, Tuple[BBO, float]] = {}      # 市场 -> (REST 结果, 过期时间 ms)
+        self._rest_inflight: Dict[str, asyncio.Future] = {}     # 市场 -> 在途的 REST 请求
+        self.cache_hits = 0
+        self.cache_coalesced = 0
+        self.cache_misses = 0
+
+    def sla_ms(self, market: str) -> float:
+        """某市场的新鲜度 SLA"""
+        return self.market_max_age_ms.get(market, self.max_age_ms)
+
+    def active_source(self, market: str) -> str:
+        return self._active.get(market, self.REST)
+
+    async def get_bbo(self, client: 'ParadexInteractiveClient', market: str, spec: MarketSpec) -> Optional[BBO]:
+        """返回满足 SLA 的 BBO，没有新鲜的行情源时返回 None"""
+        sla = self.sla_ms(market)
+        active = self.active_source(market)
+
+        if self.primary is not None:
+            bbo = self.primary.read(market, spec)
+            age = bbo.age_ms() if bbo is not None else None
+            if age is not None and age <= sla:
+                if active != self.PRIMARY:
+                    streak = self._primary_streak[market] = self._primary_streak.get(market, 0) + 1
+                    if streak >= self.promote_after:
+                        active = self._switch(market, self.PRIMARY, f"连续 {streak} 次新鲜")
+                if active == self.PRIMARY:
+                    return self._accept(market, bbo, self.primary.name, age)
+            else:
+                self._primary_streak[market] = 0
+                if active == self.PRIMARY:
+                    detail = "无数据" if age is None else f"年龄 {age:.0f}ms > {sla:.0f}ms"
+                    active = self._switch(market, self.REST, detail)
+
+        bbo = await self._fetch_rest(client, market, spec)
+        if bbo is None:
+            return self._reject(market, "REST 请求失败")
+        age = bbo.age_ms()
+        if age > sla:
+            return self._reject(market, f"REST 行情年龄 {age:.0f}ms > {sla:.0f}ms")
+        return self._accept(market, bbo, self.REST, age)
+
+    async def _fetch_rest(self, client: 'ParadexInteractiveClient', market: str, spec: MarketSpec) -> Optional[BBO]:
+        """REST 获取 BBO: 缓存未过期时直接返回，有在途请求时等待它，否则发出新请求"""
+        cached = self._rest_cache.get(market)
+        if cached is not None and cached[0].spec is spec and time.time() * 1000 < cached[1]:
+            self.cache_hits += 1
+            metrics.inc("bbo_cache_hits")
+            metrics.observe("bbo_cache_age_ms", cached[0].age_ms())
+            return cached[0]
+
+        inflight = self._rest_inflight.get(market)
+        if inflight is not None:
+            self.cache_coalesced += 1
+            metrics.inc("bbo_cache_coalesced")
+            # shield: 某个等待方被取消时不取消共享的请求
+            return await asyncio.shield(inflight)
+
+        self.cache_misses += 1
+        metrics.inc("bbo_cache_misses")
+        task = asyncio.ensure_future(client.fetch_bbo_rest(market, spec))
+        self._rest_inflight[market] = task
+        task.add_done_callback(lambda t: self._on_rest_done(market, t))
+        return await asyncio.shield(task)
+
+    def _on_rest_done(self, market: str, task: asyncio.Future):
+        """REST 请求结束: 清除在途标记，成功时写入缓存"""
+        if self._rest_inflight.get(market) is task:
+            del self._rest_inflight[market]
+        if task.cancelled() or task.exception() is not None:
+            return
+        bbo = task.result()
+        if bbo is not None and self.cache_ttl_ms > 0:
+            self._rest_cache[market] = (bbo, time.time() * 1000 + self.cache_ttl_ms)
+        metrics.set_gauge("bbo_cache_hit_rate", round(self.cache_stats()["hit_rate"], 4))
+
+    def cache_stats(self) -> Dict[str, float]:
+        """REST 缓存统计: 命中 (含合并) 占全部 REST 读取的比例"""
+        lookups = self.cache_hits + self.cache_coalesced + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "coalesced": self.cache_coalesced,
+            "misses": self.cache_misses,
+            "hit_rate": (self.cache_hits + self.cache_coalesced) / lookups if lookups else 0.0,
+        }
 
-            # 平掉所有仓位
-            closed = await self.client.close_all_positions(self.config.market)
-            if closed > 0:
-                log.info(f"[定时清理] 已平掉 {closed} 个残留仓位")
+    def _accept(self, market: str, bbo: BBO, source: str, age: float) -> BBO:
+        self.last_reject.pop(market, None)
+        metrics.inc(f"bbo_source_{source}")
+        metrics.observe("bbo_age_ms", age)
+        metrics.set_gauge(f"bbo_age_ms_{market}", round(age, 1))
+        return bbo
+
+    def _reject(self, market: str, reason: str) -> None:
+        metrics.inc("market_data_unavailable")
+        self.last_reject[market] = reason
+        log.debug(f"[{market}] 没有新鲜行情: {reason}")
+        return None
+
+    def _switch(self, market: str, source: str, detail: str) -> str:
+        self._active[market] = source
+        self._primary_streak[market] = 0
+        metrics.set_gauge(f"bbo_on_primary_{market}", 1 if source == self.PRIMARY else 0)
+        if source == self.PRIMARY:
+            metrics.inc("market_data_promotions")
+            log.info(f"[{market}] 主行情源 {self.primary.name} 可用 ({detail})，切换到主行情源")
+        else:
+            metrics.inc("market_data_failovers")
+            log.warning(f"[{market}] 主行情源 {self.primary.name} 过期 ({detail})，回退到 REST")
+        return source
 
-            if cancelled == 0 and closed == 0:
-                log.info("[定时清理] 无残留挂单或仓位")
+    def close(self):
+        if self.primary is not None:
+            self.primary.close()
 
-        except Exception as e:
-            log.error(f"[定时清理] 清理异常: {e}")
 
-    async def _wait_until_tomorrow(self):
-        """等待到明天凌晨"""
-        now = datetime.now()
-        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        wait_seconds = (tomorrow - now).total_seconds()
-        log.info(f"等待 {wait_seconds/3600:.1f} 小时后重新开始...")
-        await asyncio.sleep(wait_seconds + 60)  # 多等 1 分钟确保日期变化
+def _parse_market_max_age(value: str) -> Dict[str, float]:
+    """解析按市场的 SLA: BTC-USD-PERP:500,ETH-USD-PERP:800"""
+    result = {}
+    for item in value.split(","):
+        market, sep, ms = item.strip().rpartition(":")
+        if sep and market:
+            try:
+                result[market] = float(ms)
+            except ValueError:
+                log.warning(f"忽略无效的行情 SLA 配置: {item}")
+    return result
 
-    async def _switch_account_with_cleanup(self) -> str:
-        """
-        切换账号前执行清仓操作
-        返回:
-          - "switched": 成功切换
-          - "wait_hour": 需要等待小时重置
-          - "wait_day": 需要等待到明天
-        """
-        if not self.account_manager:
-            return "switched"
 
-        current_account = self.account_manager.get_current_account_name()
-        log.info("=" * 50)
-        log.info(f"[{current_account}] 开始切换账号流程...")
+def create_market_data(environment: str, markets: List[str], use_shm: bool = False) -> MarketDataManager:
+    """
+    按环境变量创建行情源管理
+      use_shm / SHM_BBO=1: 主行情源为同机发布进程的共享内存
+      WS_BBO=1: 主行情源为 WebSocket 推送 (WS_URL 可覆盖地址)
+      都未启用时只使用 REST，仍按 SLA 拒绝过期行情
+      BBO_CACHE_TTL_MS: REST 结果的复用时间 (默认 50ms，0 为不缓存，并发请求仍会合并)
+    """
+    max_age_ms = float(os.getenv("BBO_MAX_AGE_MS", "1000") or 1000)
+    market_max_age_ms = _parse_market_max_age(os.getenv("BBO_MAX_AGE_MS_BY_MARKET", ""))
+    reader_max_age_ms = max([max_age_ms] + list(market_max_age_ms.values()))
 
-        # 1. 取消所有挂单
-        log.info(f"[{current_account}] 取消所有挂单...")
-        await self.client.cancel_all_orders(self.config.market)
+    primary = None
+    if use_shm or os.getenv("SHM_BBO", "").strip() in ("1", "true", "yes"):
+        primary = ShmBBOReader(environment, max_age_ms=int(reader_max_age_ms))
+        log.info("已启用共享内存行情 (需先运行: python sniper_bot.py --publish-bbo)")
+    elif os.getenv("WS_BBO", "").strip() in ("1", "true", "yes"):
+        url = os.getenv("WS_URL", "").strip() or PARADEX_WS_URLS.get(environment, PARADEX_WS_URLS["prod"])
+        primary = WsBBOFeed(url, markets)
+        primary.start()
 
-        # 2. 平掉所有仓位
-        log.info(f"[{current_account}] 平掉所有仓位...")
-        await self.client.close_all_positions(self.config.market)
+    cache_ttl_ms = float(os.getenv("BBO_CACHE_TTL_MS", "50") or 0)
+    return MarketDataManager(primary, max_age_ms, market_max_age_ms, cache_ttl_ms=cache_ttl_ms)
 
-        # 3. 保存当前账号状态
-        self.account_manager.save_state()
 
-        # 4. 切换到下一个可用账号
-        result = self.account_manager.switch_to_next_available_account()
+# =============================================================================
+# 多进程分片 (supervisor)
+# =============================================================================
 
-        if result == "switched":
-            new_client = self.account_manager.get_current_client()
-            if new_client:
-                self.client = new_client
-                self.rate_state = self.account_manager.get_current_rate_state()
+def _configure_process_logging(tag: str):
+    """子进程日志加上进程标识"""
+    formatter = logging.Formatter(f"%(asctime)s [%(levelname)s] [{tag}] %(message)s", datefmt="%H:%M:%S")
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(formatter)
 
-                new_account = self.account_manager.get_current_account_name()
-                log.info(f"已切换到 {new_account}")
 
-                # 重新认证新账号
-                if await self.client.authenticate_interactive():
-                    log.info(f"[{new_account}] 认证成功")
-                else:
-                    log.error(f"[{new_account}] 认证失败!")
+def _feed_main(account: AccountInfo, environment: str, market: str, poll_interval_s: float):
+    """行情进程入口: 轮询 orderbook 并发布到共享内存"""
+    _configure_process_logging("FEED")
+    install_signal_handlers()
 
-            log.info("=" * 50)
-            return "switched"
+    try:
+        asyncio.run(run_bbo_publisher(account, environment, [market], poll_interval_s, bbo_recorder_from_env()))
+    except KeyboardInterrupt:
+        pass
+
+
+def _worker_main(
+    shard: int,
+    accounts: List[AccountInfo],
+    environment: str,
+    config: TradingConfig,
+    stats_queue,
+):
+    """worker 进程入口: 运行一个分片的账号"""
+    _configure_process_logging(f"W{shard}")
+    metrics.export_path = f"metrics.shard{shard}.json"
+    configure_tracing(shard)
+    configure_gc()
+    install_signal_handlers()
+
+    async def worker() -> int:
+        market_data = create_market_data(environment, [config.market], use_shm=True)
+        account_manager, client = await init_account_manager(
+            accounts, environment, state_file=f"account_states.shard{shard}.json", market_data=market_data
+        )
+        if not account_manager:
+            return 1
+
+        await bootstrap([client] + [c for c in account_manager.clients.values() if c is not client], config.market)
+
+        bot = SniperBot(
+            client, config, account_manager,
+            state_file=f"sniper_state.shard{shard}.json",
+            config_file=os.getenv("CONFIG_FILE", "trading_config.json"),
+            ledger_file=f"ledger.shard{shard}.json",
+            exposure_file=f"exposure.shard{shard}.json",
+            rate_backend=create_rate_backend(os.getenv("RATE_BACKEND", "")),
+            history_file=history_file_from_env(),
+        )
 
-        elif result == "all_hour_limited":
-            log.info("=" * 50)
-            return "wait_hour"
+        async def report():
+            while True:
+                stats = account_manager.get_all_stats()
+                stats_queue.put({
+                    "shard": shard,
+                    "runs": bot.stats.runs,
+                    "total_volume": bot.stats.total_volume,
+                    "trades_today": sum(a["trades_today"] for a in stats["accounts"]),
+                    "accounts": len(accounts),
+                    "current_account": stats["current_account"],
+                })
+                await asyncio.sleep(10)
+
+        reporter = asyncio.create_task(report())
+        try:
+            await bot.run()
+        finally:
+            reporter.cancel()
+            market_data.close()
+        return 0
 
-        else:  # all_day_limited
-            log.info("=" * 50)
-            return "wait_day"
+    try:
+        sys.exit(asyncio.run(worker()))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_supervisor(
+    accounts: List[AccountInfo],
+    environment: str,
+    config: TradingConfig,
+    num_workers: int,
+    poll_interval_s: float = 0.2,
+    shutdown_timeout_s: float = 90,
+    healthy_s: float = 300,
+):
+    """
+    多进程分片模式
+      - 账号按序号取模分到 num_workers 个 worker 进程，每个进程独立的事件循环和客户端
+      - 单个行情进程轮询 orderbook，写入共享内存环形缓冲区，所有 worker 直接读取
+      - worker 或行情进程崩溃后按指数退避重启，连续运行 healthy_s 秒后退避从头计算；
+        退出时等待各 worker 完成清理，并汇总统计
+    """
+    num_workers = min(num_workers, len(accounts))
+    ctx = multiprocessing.get_context("spawn")
+    stats_queue = ctx.Queue()
+    shards = [accounts[k::num_workers] for k in range(num_workers)]
+
+    log.info(f"多进程模式: {len(accounts)} 个账号分到 {num_workers} 个 worker")
+
+    def start_feed():
+        proc = ctx.Process(
+            target=_feed_main,
+            args=(accounts[0], environment, config.market, poll_interval_s),
+            name="sniper-feed",
+        )
+        proc.start()
+        return proc
+
+    def start_worker(k: int):
+        proc = ctx.Process(
+            target=_worker_main,
+            args=(k, shards[k], environment, config, stats_queue),
+            name=f"sniper-worker-{k}",
+        )
+        proc.start()
+        log.info(f"worker #{k} 已启动 (pid={proc.pid}, {len(shards[k])} 个账号)")
+        return proc
+
+    feed = start_feed()
+    workers = {k: start_worker(k) for k in range(num_workers)}
+    # 重启退避，键为 worker 序号或 "feed"
+    restart_counts: Dict[Any, int] = {k: 0 for k in range(num_workers)}
+    restart_counts["feed"] = 0
+    restart_at: Dict[Any, float] = {}
+    started_at: Dict[Any, float] = dict.fromkeys(restart_counts, time.time())
+    latest: Dict[int, Dict] = {}
+
+    def supervise(key: Any, proc, label: str, start: Callable, now: float):
+        """检查一个子进程: 退出后按指数退避重启，返回当前的进程对象"""
+        if proc.is_alive():
+            if restart_counts[key] and now - started_at[key] >= healthy_s:
+                restart_counts[key] = 0
+            return proc
+        if key not in restart_at:
+            restart_counts[key] += 1
+            delay = min(60, 2 ** restart_counts[key])
+            restart_at[key] = now + delay
+            log.warning(f"{label}退出 (exitcode={proc.exitcode})，{delay}s 后重启")
+        elif now >= restart_at[key]:
+            del restart_at[key]
+            started_at[key] = now
+            return start()
+        return proc
+
+    def drain_stats():
+        while True:
+            try:
+                item = stats_queue.get_nowait()
+            except Exception:
+                return
+            latest[item["shard"]] = item
+
+    def log_totals(title: str):
+        drain_stats()
+        runs = sum(x["runs"] for x in latest.values())
+        volume = sum(x["total_volume"] for x in latest.values())
+        trades = sum(x["trades_today"] for x in latest.values())
+        log.info(f"[{title}] {len(latest)}/{num_workers} 个 worker 上报: 今日 {trades} 笔, 周期 {runs}, 成交量 {volume:.2f}")
+
+    install_signal_handlers()
+    last_totals = time.time()
+
+    while not _shutdown_requested:
+        await asyncio.sleep(0.5)
+        drain_stats()
+        now = time.time()
+
+        feed = supervise("feed", feed, "行情进程", start_feed, now)
+        for k, proc in workers.items():
+            workers[k] = supervise(k, proc, f"worker #{k} ", lambda k=k: start_worker(k), now)
+
+        if now - last_totals >= 60:
+            log_totals("汇总")
+            last_totals = now
+
+    # 退出: 通知所有 worker 清理 (SIGTERM 触发与 Ctrl+C 相同的退出清理)，等待完成
+    log.info("正在停止所有 worker 并等待退出清理...")
+    for proc in workers.values():
+        if proc.is_alive():
+            proc.terminate()
+    deadline = time.time() + shutdown_timeout_s
+    for k, proc in workers.items():
+        await blocking.run(proc.join, max(0, deadline - time.time()))
+        if proc.is_alive():
+            log.warning(f"worker #{k} 清理超时，强制结束")
+            proc.kill()
+    feed.terminate()
+    await blocking.run(feed.join, 10)
+
+    log_totals("最终统计")
 
 
 # =============================================================================
@@ -1440,6 +5666,205 @@ def parse_accounts(accounts_str: str) -> List[AccountInfo]:
     return accounts
 
 
+def parse_accounts_file(filepath: str) -> List[AccountInfo]:
+    """
+    解析账号文件 (大量账号时使用，代替 PARADEX_ACCOUNTS)
+    每行: 私钥,地址[,名称]；空行和 # 开头的行忽略
+    只记录每行的字节偏移，私钥在创建客户端时再从文件读取
+    """
+    accounts = []
+    with open(filepath, "rb") as f:
+        offset = 0
+        for lineno, raw in enumerate(f, 1):
+            line = raw.decode().strip()
+            line_offset, offset = offset, offset + len(raw)
+            if not line or line.startswith("#"):
+                continue
+
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) not in (2, 3) or not parts[0].startswith("0x") or not parts[1].startswith("0x"):
+                log.warning(f"跳过账号文件第 {lineno} 行: 格式错误")
+                continue
+
+            accounts.append(AccountInfo(
+                l2_address=parts[1],
+                name=parts[2] if len(parts) == 3 and parts[2] else f"账号#{len(accounts) + 1}",
+                key_file=os.path.abspath(filepath),
+                key_offset=line_offset,
+            ))
+
+    return accounts
+
+
+def load_accounts() -> List[AccountInfo]:
+    """加载多账号配置: ACCOUNTS_FILE 优先，否则 PARADEX_ACCOUNTS"""
+    accounts_file = os.getenv("ACCOUNTS_FILE", "").strip()
+    if accounts_file:
+        accounts = parse_accounts_file(accounts_file)
+        log.info(f"已从 {accounts_file} 读取 {len(accounts)} 个账号")
+        return accounts
+    return parse_accounts(os.getenv("PARADEX_ACCOUNTS", ""))
+
+
+async def bootstrap(
+    clients: List[ParadexInteractiveClient],
+    market: str,
+    max_concurrency: int = 16,
+):
+    """
+    启动预热，缩短重启后到首单的时间:
+      - 从磁盘快照加载 /markets，随后后台刷新
+      - 所有账号并发认证 (首个认证同时完成时钟同步)
+      - 预先建立连接并拉取一次 BBO
+    """
+    if not clients:
+        return
+    started = time.perf_counter()
+
+    reference = clients[0].reference
+    reference.load_snapshot()
+
+    # 先同步一次时钟，避免每个账号认证时各自同步
+    clock = clients[0].clock
+    if not clock.precise:
+        await clock.sync()
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def warm(client: ParadexInteractiveClient) -> bool:
+        async with semaphore:
+            return await client.ensure_authenticated()
+
+    results = await asyncio.gather(*(warm(c) for c in clients), return_exceptions=True)
+    authed = sum(1 for r in results if r is True)
+
+    # 首个账号预先建立连接、刷新市场信息并拉取一次 BBO
+    primary = clients[0]
+    session = await primary._get_session()
+    if market in reference.markets:
+        reference.schedule_refresh(session)
+    await primary.get_bbo(market)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.set_gauge("startup_bootstrap_ms", elapsed_ms)
+    log.info(f"启动预热完成: {authed}/{len(clients)} 个账号认证成功，耗时 {elapsed_ms:.0f}ms")
+
+
+def load_trading_config(market: str, config_file: Optional[str] = None) -> TradingConfig:
+    """由环境变量创建交易配置，配置文件 (CONFIG_FILE) 中的字段优先"""
+    config = TradingConfig(market=market)
+
+    # 读取交易大小配置
+    fixed_size = os.getenv("FIXED_SIZE", "").strip()
+    if fixed_size:
+        config.fixed_size = fixed_size
+        log.info(f"使用固定交易大小: {fixed_size} BTC")
+    else:
+        open_size_percent = os.getenv("OPEN_SIZE_PERCENT", "")
+        if open_size_percent:
+            config.open_size_percent = int(open_size_percent)
+        log.info(f"使用余额百分比: {config.open_size_percent}%")
+
+    if config_file:
+        try:
+            data = _read_config_file(config_file)
+            if data is not None:
+                config = apply_config_overrides(config, data)
+                log.info(f"已加载配置文件: {config_file} (修改后自动生效)")
+        except (ValueError, json.JSONDecodeError) as e:
+            log.error(f"配置文件 {config_file} 无效，使用默认配置: {e}")
+
+    return config
+
+
+def configure_tracing(shard: Optional[int] = None):
+    """按环境变量配置周期追踪 (TRACE_FILE=off 关闭)；多进程模式下每个 worker 写自己的文件"""
+    path = os.getenv("TRACE_FILE", "traces.jsonl").strip()
+    if path.lower() in ("", "0", "off", "false", "none"):
+        path = ""
+    if path and shard is not None:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.shard{shard}{ext}"
+    tracer.configure(
+        path,
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+        max_mb=float(os.getenv("TRACE_MAX_MB", "20")),
+    )
+
+
+def history_file_from_env() -> str:
+    """HISTORY_DB: 交易历史库 (默认 history.db，off 关闭)；分片 worker 共用同一个库"""
+    path = os.getenv("HISTORY_DB", "history.db").strip()
+    return "" if path.lower() in ("", "off", "0", "false") else path
+
+
+def configure_gc():
+    """LOW_ALLOC=1: 启动后冻结长期对象，垃圾回收改在交易周期之间进行"""
+    gc_control.enabled = os.getenv("LOW_ALLOC", "").strip() in ("1", "true", "yes")
+
+
+def install_signal_handlers():
+    """注册信号处理器 (Ctrl+C / SIGTERM 退出，SIGUSR1 性能剖析)"""
+    def signal_handler(sig, frame):
+        global _shutdown_requested
+        log.info("\n收到 Ctrl+C 信号，准备退出...")
+        _shutdown_requested = True
+
+    # 注册信号处理器
+    signal.signal(signal.SIGINT, signal_handler)
+    # Windows 不支持 SIGTERM / SIGUSR1，只在非 Windows 上注册
+    if sys.platform != "win32":
+        signal.signal(signal.SIGTERM, signal_handler)
+        # kill -USR1 <pid>: 对运行中的进程做一次性能剖析
+        signal.signal(signal.SIGUSR1, lambda sig, frame: profiler.trigger())
+
+
+async def init_account_manager(
+    accounts: List[AccountInfo],
+    environment: str,
+    state_file: str = "account_states.json",
+    market_data: Optional[MarketDataManager] = None,
+) -> tuple[Optional[AccountManager], Optional[ParadexInteractiveClient]]:
+    """
+    创建账号管理器并恢复状态、并发加载账号客户端 (最多客户端池上限个)
+    market_data: 共享的行情源管理，之后懒加载的客户端也会使用
+    失败返回 (None, None)
+    """
+    account_manager = AccountManager(
+        accounts, environment, state_file=state_file,
+        max_live_clients=int(os.getenv("MAX_LIVE_CLIENTS", "32") or 32),
+    )
+    if market_data is not None:
+        account_manager.on_client_created = lambda c: setattr(c, "market_data", market_data)
+
+    # 重要: 先加载状态，恢复 current_index，然后再获取客户端
+    # 这样确保重启后使用正确的账号
+    # 其他分片 (或单进程模式) 的状态文件: 账号换了分片后按地址找回之前的交易记录
+    peer_files = [
+        path for path in ["account_states.json", *sorted(glob.glob("account_states.shard*.json"))]
+        if path != state_file
+    ]
+    account_manager.load_state(peer_files=peer_files)
+
+    # 检查当前账号是否已达到 hour 限制，如果是则尝试切换
+    if account_manager.is_account_hour_limited(account_manager.current_index):
+        log.info(f"当前账号 #{account_manager.current_index + 1} 已达小时限制，尝试切换...")
+        result = account_manager.switch_to_next_available_account()
+        if result == "all_day_limited":
+            log.error("所有账号今日额度已用完!")
+            return None, None
+
+    # 并发加载并预热账号
+    await account_manager.load_all_clients()
+    client = account_manager.get_current_client()
+
+    if not client:
+        log.error("无法初始化任何账号!")
+        return None, None
+
+    return account_manager, client
+
+
 async def main():
     # 加载环境变量
     load_dotenv()
@@ -1448,33 +5873,43 @@ async def main():
     market = os.getenv("MARKET", "BTC-USD-PERP")
 
     # 尝试加载多账号配置
-    accounts_str = os.getenv("PARADEX_ACCOUNTS", "")
-    accounts = parse_accounts(accounts_str)
+    accounts = load_accounts()
 
     account_manager = None
     client = None
 
-    if accounts:
-        # 多账号模式
-        log.info(f"检测到多账号配置: {len(accounts)} 个账号")
-        account_manager = AccountManager(accounts, environment)
+    # 行情发布模式: 只发布共享内存行情，不交易
+    if "--publish-bbo" in sys.argv:
+        publisher_account = accounts[0] if accounts else AccountInfo(
+            l2_private_key=os.getenv("PARADEX_L2_PRIVATE_KEY", ""),
+            l2_address=os.getenv("PARADEX_L2_ADDRESS", ""),
+        )
+        markets = [m.strip() for m in os.getenv("PUBLISH_MARKETS", market).split(",") if m.strip()]
+        install_signal_handlers()
+        log.info(f"行情发布模式: {', '.join(markets)}")
+        await run_bbo_publisher(publisher_account, environment, markets, recorder=bbo_recorder_from_env())
+        return
 
-        # 重要: 先加载状态，恢复 current_index，然后再获取客户端
-        # 这样确保重启后使用正确的账号
-        account_manager.load_state()
+    # 创建配置
+    config_file = os.getenv("CONFIG_FILE", "trading_config.json")
+    config = load_trading_config(market, config_file)
+    configure_tracing()
+    configure_gc()
 
-        # 检查当前账号是否已达到 hour 限制，如果是则尝试切换
-        if account_manager.is_account_hour_limited(account_manager.current_index):
-            log.info(f"当前账号 #{account_manager.current_index + 1} 已达小时限制，尝试切换...")
-            result = account_manager.switch_to_next_available_account()
-            if result == "all_day_limited":
-                log.error("所有账号今日额度已用完!")
-                sys.exit(1)
+    # 多进程分片模式
+    workers = int(os.getenv("WORKERS", "1") or 1)
+    if accounts and workers > 1:
+        await run_supervisor(accounts, environment, config, workers)
+        return
 
-        client = account_manager.get_current_client()
+    # 行情源: 共享内存 (SHM_BBO=1) 或推送行情 (WS_BBO=1)，过期时回退 REST
+    market_data = create_market_data(environment, [config.market])
 
-        if not client:
-            log.error("无法初始化任何账号!")
+    if accounts:
+        # 多账号模式
+        log.info(f"检测到多账号配置: {len(accounts)} 个账号")
+        account_manager, client = await init_account_manager(accounts, environment, market_data=market_data)
+        if not account_manager:
             sys.exit(1)
     else:
         # 单账号模式（向后兼容）
@@ -1483,7 +5918,7 @@ async def main():
 
         if not l2_private_key or not l2_address:
             log.error("请在 .env 文件中配置账号信息:")
-            log.error("  方式1 (多账号): PARADEX_ACCOUNTS=私钥1,地址1;私钥2,地址2")
+            log.error("  方式1 (多账号): PARADEX_ACCOUNTS=私钥1,地址1;私钥2,地址2 或 ACCOUNTS_FILE=accounts.txt")
             log.error("  方式2 (单账号): PARADEX_L2_PRIVATE_KEY 和 PARADEX_L2_ADDRESS")
             log.error("参考 .env.example 文件")
             sys.exit(1)
@@ -1494,35 +5929,24 @@ async def main():
             l2_address=l2_address,
             environment=environment
         )
+        client.market_data = market_data
 
-    # 创建配置
-    config = TradingConfig(market=market)
-
-    # 读取交易大小配置
-    fixed_size = os.getenv("FIXED_SIZE", "").strip()
-    if fixed_size:
-        config.fixed_size = fixed_size
-        log.info(f"使用固定交易大小: {fixed_size} BTC")
+    # 启动预热: 并发认证、市场信息快照、预建连接
+    if account_manager:
+        warm_clients = [client] + [c for c in account_manager.clients.values() if c is not client]
     else:
-        open_size_percent = os.getenv("OPEN_SIZE_PERCENT", "")
-        if open_size_percent:
-            config.open_size_percent = int(open_size_percent)
-        log.info(f"使用余额百分比: {config.open_size_percent}%")
+        warm_clients = [client]
 
-    # 创建并运行机器人
-    bot = SniperBot(client, config, account_manager)
+    await bootstrap(warm_clients, config.market)
 
-    # 设置信号处理器 (Ctrl+C)
-    def signal_handler(sig, frame):
-        global _shutdown_requested
-        log.info("\n收到 Ctrl+C 信号，准备退出...")
-        _shutdown_requested = True
+    # 创建并运行机器人
+    bot = SniperBot(
+        client, config, account_manager, config_file=config_file,
+        rate_backend=create_rate_backend(os.getenv("RATE_BACKEND", "")),
+        history_file=history_file_from_env(),
+    )
 
-    # 注册信号处理器
-    signal.signal(signal.SIGINT, signal_handler)
-    # Windows 不支持 SIGTERM，只在非 Windows 上注册
-    if sys.platform != "win32":
-        signal.signal(signal.SIGTERM, signal_handler)
+    install_signal_handlers()
 
     await bot.run()
 
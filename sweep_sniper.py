@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Sniper Bot 参数扫描
+用录制的行情 (发布进程设置 BBO_RECORD_FILE 录制) 回放评估一组 TradingConfig 候选:
+每个候选在虚拟时间里跑一遍真实的 SniperBot (与 run_cycle 相同的开仓、平仓、限速和账号轮换逻辑)，
+候选分布到多个进程并行，输出按排名排序的表
+
+    python sweep_sniper.py --data bbo_record.csv --grid spread_threshold_percent=0.002,0.004,0.008 --grid close_timeout_ms=1000,3000
+    python sweep_sniper.py --data bbo_record.csv --random 64 --range spread_threshold_percent=0.001:0.01 --range min_order_book_size_usd=100:2000
+    python sweep_sniper.py --data bbo_record.csv --config trading_config.json --grid limits_per_minute=10,30 --rank wear_rate
+
+网格 (--grid) 取所有组合；随机搜索 (--random N) 时 --range 在区间内均匀取值，--grid 的取值随机选一个
+回放使用模拟交易所的成交模型 (限价单按限价、市价单按对手价立即全部成交，手续费为 0)，结果用于比较候选，不代表真实收益
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import sniper_bot as sb
+import sim_sniper as sim
+
+
+# =============================================================================
+# 回放交易所
+# =============================================================================
+
+class ReplayExchange(sim.SimExchange):
+    """报价来自录制的行情 (虚拟时间对应录制时间)，下单和持仓沿用模拟交易所"""
+
+    def __init__(self, clock: sim.VirtualClock, tape: sb.BBOTape):
+        super().__init__(clock, seed=0, spec=tape.spec)
+        self.tape = tape
+        self._index = -2
+
+    def bbo(self) -> Optional[sb.BBO]:
+        """当前时刻有效的录制报价，录制中断期间返回 None (与拿不到行情一样处理)"""
+        i = self.tape.index_at(self.clock.time_ms())
+        if i != self._index:
+            self._index = i
+            self._bbo = self.tape.bbo(i) if i >= 0 else None
+        return self._bbo
+
+
+def count_opportunities(tape: sb.BBOTape, config: sb.TradingConfig) -> int:
+    """满足开仓条件 (点差 + 厚度) 的时段数: 报价从不满足变为满足记一次"""
+    rule = sb.EntryRule(tape.spec, config.spread_threshold_percent, config.min_order_book_size_usd)
+    count = 0
+    eligible = False
+    for i in range(len(tape)):
+        bbo = tape.bbo(i)
+        ok = rule.spread.allows(bbo) and rule.depth_ok(bbo)
+        if ok and not eligible:
+            count += 1
+        eligible = ok
+    return count
+
+
+# =============================================================================
+# 候选配置
+# =============================================================================
+
+# 不参与扫描的字段
+FIXED_FIELDS = ("market", "enabled")
+
+
+def _field_types() -> Dict[str, type]:
+    return {f.name: f.type for f in fields(sb.TradingConfig) if f.name not in FIXED_FIELDS}
+
+
+def _parse_value(name: str, text: str) -> Any:
+    kind = _field_types()[name]
+    return kind(text) if kind in (int, float) else text
+
+
+def _parse_assignment(text: str) -> Tuple[str, str]:
+    name, sep, values = text.partition("=")
+    name = name.strip()
+    if not sep or name not in _field_types():
+        raise ValueError(f"无效的参数: {text} (格式 字段=取值，字段为 TradingConfig 中可调的字段)")
+    return name, values
+
+
+def parse_grid(items: List[str]) -> Dict[str, List[Any]]:
+    """--grid 字段=v1,v2,..."""
+    grid = {}
+    for item in items:
+        name, values = _parse_assignment(item)
+        grid[name] = [_parse_value(name, v.strip()) for v in values.split(",") if v.strip()]
+    return grid
+
+
+def parse_ranges(items: List[str]) -> Dict[str, Tuple[Any, Any]]:
+    """--range 字段=最小值:最大值 (只支持数值字段)"""
+    ranges = {}
+    for item in items:
+        name, values = _parse_assignment(item)
+        low, sep, high = values.partition(":")
+        if not sep or _field_types()[name] not in (int, float):
+            raise ValueError(f"无效的区间: {item} (格式 数值字段=最小值:最大值)")
+        ranges[name] = (_parse_value(name, low), _parse_value(name, high))
+    return ranges
+
+
+def make_candidates(grid: Dict[str, List[Any]], ranges: Dict[str, Tuple[Any, Any]],
+                    samples: int, seed: int) -> List[Dict[str, Any]]:
+    """网格取所有组合；samples > 0 时随机搜索 (区间内均匀取值，网格取值随机选一个)，去掉重复的候选"""
+    if samples <= 0:
+        if ranges:
+            raise ValueError("--range 需要配合 --random 使用")
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+    rng = random.Random(seed)
+    candidates, seen = [], set()
+    for _ in range(samples * 10):
+        if len(candidates) >= samples:
+            break
+        candidate = {name: rng.choice(values) for name, values in grid.items()}
+        for name, (low, high) in ranges.items():
+            if isinstance(low, int) and isinstance(high, int):
+                candidate[name] = rng.randint(low, high)
+            else:
+                candidate[name] = round(rng.uniform(low, high), 6)
+        key = tuple(sorted(candidate.items()))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(candidate)
+    return candidates
+
+
+# =============================================================================
+# 评估 (进程池)
+# =============================================================================
+
+# 每个 worker 进程各自加载一次录制的行情
+_tape: Optional[sb.BBOTape] = None
+_base: Optional[sb.TradingConfig] = None
+_accounts = 1
+
+
+def _init_worker(data: str, market: str, base: sb.TradingConfig, accounts: int):
+    global _tape, _base, _accounts
+    _tape = sb.load_bbo_recording(data)[market]
+    _base = base
+    _accounts = accounts
+
+
+def evaluate(candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """在虚拟时间里用候选配置回放整段录制，返回捕获的机会、成交量和磨损"""
+    config = sb.apply_config_overrides(_base, candidate)
+    start_ms, end_ms = _tape.ts[0], _tape.ts[-1]
+    args = argparse.Namespace(
+        accounts=_accounts,
+        hours=(end_ms - start_ms) / 3600000,
+        seed=0,
+        size=config.fixed_size,
+        start=datetime.fromtimestamp(start_ms / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+        verbose=False,
+    )
+    result = sim.run_once(args, config, lambda clock: ReplayExchange(clock, _tape))
+    ledger = result["ledger"]
+    volume = ledger["volume"]
+    return {
+        "params": candidate,
+        "opportunities": count_opportunities(_tape, config),
+        "captured": result["opens"],
+        "orders": result["orders"],
+        "volume": volume,
+        "wear": ledger["wear"],
+        # 每 100 万美元成交量的磨损
+        "wear_rate": ledger["wear"] / volume * 1e6 if volume else float("inf"),
+        "wall_s": result["wall_s"],
+    }
+
+
+RANK_KEYS = {
+    "volume": lambda r: -r["volume"],
+    "captured": lambda r: -r["captured"],
+    "wear": lambda r: r["wear"],
+    "wear_rate": lambda r: r["wear_rate"],
+}
+
+
+def run_sweep(data: str, market: str, base: sb.TradingConfig, candidates: List[Dict[str, Any]],
+              accounts: int, workers: int) -> List[Dict[str, Any]]:
+    """候选分布到进程池并行评估"""
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data, market, base, accounts)) as pool:
+        futures = [pool.submit(evaluate, candidate) for candidate in candidates]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            print(f"\r已评估 {done}/{len(candidates)} ({time.perf_counter() - started:.1f}s)", end="", flush=True)
+    print()
+    return results
+
+
+def print_table(results: List[Dict[str, Any]], names: List[str], top: int):
+    header = "".join(f"{name:>26}" for name in names)
+    print(f"{'#':>4}{header} {'机会':>8} {'开仓':>8} {'成交量 $':>16} {'磨损 $':>12} {'磨损/百万':>10}")
+    for rank, row in enumerate(results[:top], 1):
+        values = "".join(f"{str(row['params'].get(name, '')):>26}" for name in names)
+        wear_rate = f"{row['wear_rate']:>10.2f}" if row["volume"] else f"{'-':>10}"
+        print(f"{rank:>4}{values} {row['opportunities']:>8} {row['captured']:>8} "
+              f"{row['volume']:>16,.2f} {row['wear']:>12.4f} {wear_rate}")
+
+
+def save_csv(filepath: str, results: List[Dict[str, Any]], names: List[str]):
+    columns = ["opportunities", "captured", "orders", "volume", "wear", "wear_rate"]
+    with open(filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank"] + names + columns)
+        for rank, row in enumerate(results, 1):
+            writer.writerow([rank] + [row["params"].get(n, "") for n in names] + [row[c] for c in columns])
+    print(f"全部结果已保存: {filepath}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sniper Bot 参数扫描 (回放录制的行情)")
+    parser.add_argument("--data", required=True, help="行情录制文件 (BBO_RECORD_FILE)")
+    parser.add_argument("--market", default="", help="回放的市场 (默认录制中的第一个)")
+    parser.add_argument("--config", help="基础配置文件 (TradingConfig 字段，JSON)，候选在此基础上修改")
+    parser.add_argument("--size", default="0.0009", help="基础配置的每笔开仓数量 (默认 0.0009)")
+    parser.add_argument("--grid", action="append", default=[], help="网格: 字段=v1,v2,... (可重复)")
+    parser.add_argument("--range", action="append", default=[], help="随机搜索区间: 字段=最小值:最大值 (可重复)")
+    parser.add_argument("--random", type=int, default=0, help="随机搜索的候选数 (0 为网格搜索)")
+    parser.add_argument("--seed", type=int, default=1, help="随机搜索的种子 (默认 1)")
+    parser.add_argument("--accounts", type=int, default=1, help="模拟账号数 (默认 1)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数 (默认 CPU 核数)")
+    parser.add_argument("--rank", choices=sorted(RANK_KEYS), default="volume", help="排名依据 (默认 volume)")
+    parser.add_argument("--top", type=int, default=20, help="输出前 N 名 (默认 20)")
+    parser.add_argument("--csv", help="全部结果另存为 CSV")
+    args = parser.parse_args()
+
+    tapes = sb.load_bbo_recording(args.data)
+    tapes = {market: tape for market, tape in tapes.items() if len(tape) >= 2}
+    if not tapes:
+        print(f"录制文件中没有可回放的报价: {args.data}")
+        return 1
+    market = args.market or next(iter(tapes))
+    if market not in tapes:
+        print(f"录制文件中没有 {market}，可选: {', '.join(tapes)}")
+        return 1
+    tape = tapes[market]
+    hours = (tape.ts[-1] - tape.ts[0]) / 3600000
+
+    base = sb.TradingConfig(market=market, fixed_size=args.size)
+    if args.config:
+        data = sb._read_config_file(args.config)
+        if data is None:
+            print(f"无法读取配置文件: {args.config}")
+            return 1
+        base = sb.apply_config_overrides(base, {k: v for k, v in data.items() if k not in FIXED_FIELDS})
+
+    try:
+        grid = parse_grid(args.grid)
+        candidates = make_candidates(grid, parse_ranges(args.range), args.random, args.seed)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    # 先在本进程校验，无效的组合 (如限速不递增) 不参与评估
+    valid = []
+    for candidate in candidates:
+        try:
+            sb.apply_config_overrides(base, candidate)
+            valid.append(candidate)
+        except ValueError as e:
+            print(f"跳过无效候选 {candidate}: {e}")
+    if not valid:
+        print("没有可评估的候选")
+        return 1
+
+    print(f"行情: {market}, {len(tape)} 条报价, {hours:.2f} 小时")
+    print(f"候选: {len(valid)} 个, 进程: {args.workers}, 账号: {args.accounts}")
+    results = run_sweep(args.data, market, base, valid, args.accounts, args.workers)
+    results.sort(key=RANK_KEYS[args.rank])
+
+    names = sorted({name for candidate in valid for name in candidate})
+    print()
+    print_table(results, names, args.top)
+    if args.csv:
+        save_csv(args.csv, results, names)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())